@@ -0,0 +1,359 @@
+"""
+Synthetic chain data.
+
+Simulates a chain of blocks and derives the content of `core.*`,
+`usp.boxes`, `bal.*` and `mtr.utxos*` from it, the way the watcher would:
+transactions spend existing boxes and create new ones, while balance diffs,
+checkpoints, unspent boxes and utxo counts all follow from that.
+
+Address activity follows a power law (a few addresses are involved in most
+transactions) and so do output values and token emissions, hence balances
+too. Output is reproducible for a given scale and seed.
+
+Rows are spooled to one temporary file per table and loaded with COPY,
+which is much faster than inserts. Constraints are best set afterwards.
+
+Usage:
+
+    with pg.connect(conn_str(dbname)) as conn:
+        load(conn, Scale(blocks=100_000), seed=0)
+"""
+import random
+import tempfile
+from collections import Counter
+from collections import defaultdict
+from hashlib import blake2b
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+import psycopg as pg
+
+GENESIS_TIMESTAMP = 1561978800000
+BLOCK_TIME_MS = 120_000
+
+# Coinbase reward, in nanoERG
+BLOCK_REWARD = 67_500_000_000
+FEE = 1_000_000
+FEE_ADDRESS = (
+    "2iHkR7CWvD1R4j1yZg5bkeDRQavjAaVPeTDFGGLZduHyfWMuYpmhHocX8GJoaieTx78FntzJbCBVL6rf"
+    "96ocJoZdmWBL2fci7NqWgAirppPQmZ7fN9V6z13Ay6brPriBKYqLp1bT2Fk4FkFLCfdPpe"
+)
+
+# Table columns, in loading order
+TABLES = {
+    "core.headers": ["height", "id", "parent_id", "timestamp"],
+    "core.transactions": ["id", "header_id", "height", "index"],
+    "core.outputs": [
+        "box_id",
+        "tx_id",
+        "header_id",
+        "creation_height",
+        "address",
+        "index",
+        "value",
+    ],
+    "core.inputs": ["box_id", "tx_id", "header_id", "index"],
+    "core.tokens": [
+        "id",
+        "box_id",
+        "emission_amount",
+        "name",
+        "description",
+        "decimals",
+        "standard",
+    ],
+    "core.box_assets": ["box_id", "token_id", "amount"],
+    "usp.boxes": ["box_id"],
+    "bal.erg": ["address", "value"],
+    "bal.erg_diffs": ["address", "height", "tx_id", "value"],
+    "bal.erg_checkpoints": ["address", "height", "value"],
+    "bal.tokens": ["address", "token_id", "value"],
+    "bal.tokens_diffs": ["address", "token_id", "height", "tx_id", "value"],
+    "bal.tokens_checkpoints": ["address", "token_id", "height", "value"],
+    "mtr.utxos": ["height", "value"],
+    "mtr.utxos_1h": ["timestamp", "height", "value"],
+    "mtr.utxos_24h": ["timestamp", "height", "value"],
+}
+
+
+class Scale(NamedTuple):
+    blocks: int = 100_000
+    addresses: int = 100_000
+    tokens: int = 1_000
+    # Average number of transactions per block, excluding coinbase
+    txs_per_block: int = 5
+    # Blocks between balance checkpoints
+    checkpoint_interval: int = 1000
+
+
+class Box(NamedTuple):
+    box_id: str
+    address: str
+    value: int
+    # (token_id, amount) pairs
+    assets: Tuple[Tuple[str, int], ...]
+
+
+def digest(*parts) -> str:
+    return blake2b(":".join(map(str, parts)).encode(), digest_size=32).hexdigest()
+
+
+def address(i: int) -> str:
+    """
+    Returns address with index i.
+
+    One in ten addresses is a contract, others are P2PK's.
+    """
+    h = digest("address", i)
+    if i % 10 == 0:
+        return "c" + h + digest("contract", i)
+    return "9" + h[:50]
+
+
+class Spool:
+    """
+    Temporary files of rows in COPY text format, one per table.
+    """
+
+    def __init__(self):
+        self._files = {table: tempfile.TemporaryFile("w+") for table in TABLES}
+
+    def write(self, table: str, *row):
+        self._files[table].write(
+            "\t".join("\\N" if v is None else str(v) for v in row) + "\n"
+        )
+
+    def copy(self, conn: pg.Connection, chunk_size: int = 1 << 20):
+        with conn.cursor() as cur:
+            for table, columns in TABLES.items():
+                f = self._files[table]
+                f.seek(0)
+                with cur.copy(f"copy {table} ({', '.join(columns)}) from stdin") as cp:
+                    while chunk := f.read(chunk_size):
+                        cp.write(chunk)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+
+class Chain:
+    """
+    Chain simulation, writing resulting rows to a spool.
+    """
+
+    def __init__(self, scale: Scale, seed: int, spool: Spool):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.spool = spool
+        self._addresses: Dict[int, str] = {}
+        # Unspent boxes, in no particular order
+        self.utxos: List[Box] = []
+        self.erg: Dict[str, int] = defaultdict(int)
+        self.tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        # Balances changed since last checkpoint
+        self.changed_erg = set()
+        self.changed_tokens = set()
+        self.n_boxes = 0
+        self.n_tokens = 0
+
+    def pick_address(self, skew: float = 4) -> str:
+        """
+        Returns a random address, lower indices being much more likely.
+        """
+        i = int(self.scale.addresses * self.rng.random() ** skew)
+        try:
+            return self._addresses[i]
+        except KeyError:
+            return self._addresses.setdefault(i, address(i))
+
+    def pareto(self, scale: float, alpha: float = 1.2) -> int:
+        return min(int(scale * self.rng.paretovariate(alpha)), 10**15)
+
+    def pop_utxo(self) -> Box:
+        utxos = self.utxos
+        i = self.rng.randrange(len(utxos))
+        utxos[i], utxos[-1] = utxos[-1], utxos[i]
+        return utxos.pop()
+
+    def run(self):
+        s = self.scale
+        # Blocks minting tokens, possibly more than once
+        mints = Counter(self.rng.choices(range(1, s.blocks), k=s.tokens))
+        timestamp = GENESIS_TIMESTAMP
+        prev_timestamp = None
+        prev_utxos = 0
+        for height in range(s.blocks):
+            header_id = digest("header", height)
+            parent_id = digest("header", height - 1)
+            self.spool.write("core.headers", height, header_id, parent_id, timestamp)
+            n_txs = max(self.rng.randint(0, 2 * s.txs_per_block), mints[height])
+            self.coinbase(height, header_id)
+            for index in range(1, n_txs + 1):
+                self.transaction(height, header_id, index, index <= mints[height])
+            if height % s.checkpoint_interval == 0:
+                self.checkpoint(height)
+            self.spool.write("mtr.utxos", height, len(self.utxos))
+            if prev_timestamp is not None:
+                for table, round_ms in [
+                    ("mtr.utxos_1h", 3_600_000),
+                    ("mtr.utxos_24h", 86_400_000),
+                ]:
+                    self.rollup(
+                        table, round_ms, height, timestamp, prev_timestamp, prev_utxos
+                    )
+            prev_timestamp, prev_utxos = timestamp, len(self.utxos)
+            timestamp += self.rng.randint(BLOCK_TIME_MS // 4, BLOCK_TIME_MS * 7 // 4)
+        self.finish()
+
+    def rollup(self, table, round_ms, height, timestamp, prev_timestamp, prev_utxos):
+        """
+        Writes utxo count at round hour/day, if reached by this block.
+
+        Value is that of previous block, unless exactly on the round hour/day.
+        """
+        if timestamp % round_ms == 0:
+            self.spool.write(table, timestamp, height, len(self.utxos))
+        elif timestamp // round_ms != prev_timestamp // round_ms:
+            self.spool.write(table, timestamp // round_ms * round_ms, height, prev_utxos)
+
+    def coinbase(self, height: int, header_id: str):
+        tx_id = digest("tx", height, 0)
+        self.spool.write("core.transactions", tx_id, header_id, height, 0)
+        # Miners are among the most active addresses
+        miner = self.pick_address(skew=8)
+        self.output(tx_id, header_id, height, 0, miner, BLOCK_REWARD, ())
+        self.diffs(height, tx_id, {miner: BLOCK_REWARD}, {})
+
+    def transaction(self, height: int, header_id: str, index: int, mint: bool):
+        rng = self.rng
+        tx_id = digest("tx", height, index)
+        self.spool.write("core.transactions", tx_id, header_id, height, index)
+
+        # There's always at least the coinbase box to spend
+        n_inputs = min(rng.randint(1, 3), len(self.utxos))
+        inputs = [self.pop_utxo() for _ in range(n_inputs)]
+        erg_diffs: Dict[str, int] = defaultdict(int)
+        token_diffs: Dict[Tuple[str, str], int] = defaultdict(int)
+        assets: Dict[str, int] = defaultdict(int)
+        for i, box in enumerate(inputs):
+            self.spool.write("core.inputs", box.box_id, tx_id, header_id, i)
+            erg_diffs[box.address] -= box.value
+            for token_id, amount in box.assets:
+                assets[token_id] += amount
+                token_diffs[(box.address, token_id)] -= amount
+
+        # Minted tokens get the id of the first input
+        minted = inputs[0].box_id if mint else None
+        if minted is not None:
+            assets[minted] = self.pareto(1e6)
+
+        # Recipients, possibly with change back to sender
+        recipients = [self.pick_address() for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.7:
+            recipients.append(inputs[0].address)
+        total = sum(box.value for box in inputs)
+        fee = FEE if total > FEE + len(recipients) else 0
+        weights = [rng.paretovariate(1.2) for _ in recipients]
+        values = [int((total - fee) * w / sum(weights)) for w in weights]
+        values[-1] += total - fee - sum(values)
+
+        # Each token goes to a single recipient
+        outputs_assets = [[] for _ in recipients]
+        for token_id, amount in assets.items():
+            outputs_assets[rng.randrange(len(recipients))].append((token_id, amount))
+
+        outputs = zip(recipients, values, outputs_assets)
+        for i, (addr, value, box_assets) in enumerate(outputs):
+            box_id = self.output(
+                tx_id, header_id, height, i, addr, value, tuple(box_assets)
+            )
+            if any(token_id == minted for token_id, _ in box_assets):
+                self.mint(minted, box_id, assets[minted])
+            erg_diffs[addr] += value
+            for token_id, amount in box_assets:
+                token_diffs[(addr, token_id)] += amount
+        if fee:
+            self.output(tx_id, header_id, height, len(recipients), FEE_ADDRESS, fee, ())
+            erg_diffs[FEE_ADDRESS] += fee
+        self.diffs(height, tx_id, erg_diffs, token_diffs)
+
+    def output(self, tx_id, header_id, height, index, addr, value, assets) -> str:
+        box_id = digest("box", self.n_boxes)
+        self.n_boxes += 1
+        self.spool.write(
+            "core.outputs", box_id, tx_id, header_id, height, addr, index, value
+        )
+        for token_id, amount in assets:
+            self.spool.write("core.box_assets", box_id, token_id, amount)
+        self.utxos.append(Box(box_id, addr, value, assets))
+        return box_id
+
+    def mint(self, token_id: str, box_id: str, amount: int):
+        n = self.n_tokens
+        self.n_tokens += 1
+        self.spool.write(
+            "core.tokens",
+            token_id,
+            box_id,
+            amount,
+            f"token {n}",
+            f"synthetic token {n}",
+            n % 10,
+            "EIP-004",
+        )
+
+    def diffs(self, height: int, tx_id: str, erg_diffs: Dict, token_diffs: Dict):
+        for addr, value in erg_diffs.items():
+            if value != 0:
+                self.spool.write("bal.erg_diffs", addr, height, tx_id, value)
+                self.erg[addr] += value
+                self.changed_erg.add(addr)
+        for (addr, token_id), value in token_diffs.items():
+            if value != 0:
+                self.spool.write(
+                    "bal.tokens_diffs", addr, token_id, height, tx_id, value
+                )
+                self.tokens[(addr, token_id)] += value
+                self.changed_tokens.add((addr, token_id))
+
+    def checkpoint(self, height: int):
+        """
+        Snapshot of balances changed since previous checkpoint, zero ones too.
+        """
+        for addr in self.changed_erg:
+            self.spool.write("bal.erg_checkpoints", addr, height, self.erg[addr])
+        for addr, token_id in self.changed_tokens:
+            value = self.tokens[(addr, token_id)]
+            self.spool.write("bal.tokens_checkpoints", addr, token_id, height, value)
+        self.changed_erg.clear()
+        self.changed_tokens.clear()
+
+    def finish(self):
+        for box in self.utxos:
+            self.spool.write("usp.boxes", box.box_id)
+        for addr, value in self.erg.items():
+            if value != 0:
+                self.spool.write("bal.erg", addr, value)
+        for (addr, token_id), value in self.tokens.items():
+            if value != 0:
+                self.spool.write("bal.tokens", addr, token_id, value)
+
+
+def load(conn: pg.Connection, scale: Scale, seed: int = 0):
+    """
+    Fills empty tables of an ErgoWatch db with a synthetic chain.
+
+    Commits and updates planner statistics.
+    """
+    spool = Spool()
+    try:
+        Chain(scale, seed, spool).run()
+        spool.copy(conn)
+    finally:
+        spool.close()
+    conn.commit()
+    conn.execute("analyze;")
+    conn.commit()
@@ -0,0 +1,447 @@
+"""
+Load testing harness.
+
+Creates a test database filled with a synthetic chain (see `bench.data`),
+boots the API against it with uvicorn and drives every route with a given
+number of concurrent clients. Latency percentiles and throughput per route
+are printed and written to a json file, to be compared with results of
+other commits (see `--baseline`).
+
+Route parameters are drawn at random from the generated data, so results
+mostly reflect db work rather than the response cache (disabled by default,
+see `--cache-size`).
+
+Needs the same `local.py` db settings as the tests. Usage (from within the
+api directory):
+
+    PYTHONPATH=src/tests python -m bench.load [options]
+
+Run with `--help` for options.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+import httpx
+import psycopg as pg
+
+from src.tests.db import CONSTRAINTS_PATH
+from src.tests.db import MockDB
+from src.tests.db import conn_str
+
+from .data import Scale
+from .data import load
+
+BENCH_DB_NAME = "ew_api_bench"
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+
+class Sample(NamedTuple):
+    """
+    Values to draw route parameters from.
+    """
+
+    p2pk_addresses: List[str]
+    addresses: List[str]
+    token_ids: List[str]
+    height: int
+    first_timestamp: int
+    last_timestamp: int
+
+
+def load_sample(dbname: str, size: int = 1000) -> Sample:
+    with pg.connect(conn_str(dbname)) as conn:
+        addresses = [
+            r[0]
+            for r in conn.execute(
+                "select address from bal.erg order by random() limit %s;", [size]
+            )
+        ]
+        token_ids = [r[0] for r in conn.execute("select id from core.tokens;")]
+        height, first_timestamp, last_timestamp = conn.execute(
+            "select max(height), min(timestamp), max(timestamp) from core.headers;"
+        ).fetchone()
+    p2pk_addresses = [a for a in addresses if a.startswith("9") and len(a) == 51]
+    return Sample(
+        p2pk_addresses, addresses, token_ids, height, first_timestamp, last_timestamp
+    )
+
+
+Request = Tuple[str, Dict | None]
+
+
+class Scenario(NamedTuple):
+    """
+    Route to benchmark, with a function making random requests for it.
+
+    Requests are made of a url (path and query string) and an optional json
+    body.
+    """
+
+    method: str
+    path: str
+    make: Callable[[random.Random, Sample], Request]
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def _timestamp(rng: random.Random, s: Sample) -> int:
+    return rng.randrange(s.first_timestamp, s.last_timestamp)
+
+
+SCENARIOS = [
+    Scenario("GET", "/sync_height", lambda rng, s: ("/sync_height", None)),
+    Scenario(
+        "GET",
+        "/addresses/{address}/balance",
+        lambda rng, s: (f"/addresses/{rng.choice(s.addresses)}/balance", None),
+    ),
+    Scenario(
+        "POST",
+        "/addresses/balances",
+        lambda rng, s: (
+            "/addresses/balances",
+            {"addresses": rng.sample(s.addresses, 100)},
+        ),
+    ),
+    Scenario(
+        "POST",
+        "/addresses/balances/at/height/{height}",
+        lambda rng, s: (
+            f"/addresses/balances/at/height/{rng.randrange(s.height)}",
+            {"addresses": rng.sample(s.addresses, 1000)},
+        ),
+    ),
+    Scenario(
+        "POST",
+        "/addresses/balances/at/timestamp/{timestamp}",
+        lambda rng, s: (
+            f"/addresses/balances/at/timestamp/{_timestamp(rng, s)}",
+            {"addresses": rng.sample(s.addresses, 1000)},
+        ),
+    ),
+    Scenario(
+        "GET",
+        "/addresses/{address}/balance/at/height/{height}",
+        lambda rng, s: (
+            f"/addresses/{rng.choice(s.addresses)}/balance/at/height/"
+            f"{rng.randrange(s.height)}",
+            None,
+        ),
+    ),
+    Scenario(
+        "GET",
+        "/addresses/{address}/balance/at/timestamp/{timestamp}",
+        lambda rng, s: (
+            f"/addresses/{rng.choice(s.addresses)}/balance/at/timestamp/"
+            f"{_timestamp(rng, s)}",
+            None,
+        ),
+    ),
+    Scenario(
+        "GET",
+        "/addresses/{address}/balance/history",
+        lambda rng, s: (
+            f"/addresses/{rng.choice(s.addresses)}/balance/history?timestamps=true",
+            None,
+        ),
+    ),
+    Scenario(
+        "GET",
+        "/metrics/utxos",
+        lambda rng, s: (f"/metrics/utxos?fr={_timestamp(rng, s)}&r=1h", None),
+    ),
+    Scenario(
+        "GET",
+        "/p2pk/count",
+        lambda rng, s: (f"/p2pk/count?bal_ge={rng.randrange(10 ** 9)}", None),
+    ),
+    Scenario(
+        "GET",
+        "/contracts/count",
+        lambda rng, s: (f"/contracts/count?bal_ge={rng.randrange(10 ** 9)}", None),
+    ),
+    Scenario(
+        "GET",
+        "/contracts/supply",
+        lambda rng, s: (
+            f"/contracts/supply?token_id={rng.choice(s.token_ids)}",
+            None,
+        ),
+    ),
+    Scenario(
+        "GET",
+        "/tokens/{token_id}",
+        lambda rng, s: (f"/tokens/{rng.choice(s.token_ids)}", None),
+    ),
+    Scenario(
+        "GET",
+        "/tokens/{token_id}/supply",
+        lambda rng, s: (f"/tokens/{rng.choice(s.token_ids)}/supply", None),
+    ),
+    Scenario(
+        "GET",
+        "/ranking/{p2pk_address}",
+        lambda rng, s: (f"/ranking/{rng.choice(s.p2pk_addresses)}", None),
+    ),
+]
+
+
+def uncovered_routes() -> List[str]:
+    """
+    Returns documented routes without a scenario.
+    """
+    from fastapi.routing import APIRoute
+
+    from src.main import app
+
+    covered = {s.name for s in SCENARIOS}
+    return [
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.include_in_schema
+        for method in sorted(route.methods)
+        if f"{method} {route.path}" not in covered
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(dbname: str, port: int, workers: int, cache_size: int):
+    env = dict(os.environ, POSTGRES_DB=dbname, CACHE_SIZE=str(cache_size))
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=SRC_DIR,
+        env=env,
+    )
+
+
+async def wait_for_server(client: httpx.AsyncClient, timeout: float = 60):
+    start = time.perf_counter()
+    while True:
+        try:
+            if (await client.get("/sync_height")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("API did not start in time")
+        await asyncio.sleep(0.2)
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], wall: float) -> Dict:
+    """
+    Returns stats of a scenario run, latencies in milliseconds.
+    """
+    ms = sorted(t * 1000 for t in latencies)
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "requests": len(ms),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput": len(ms) / wall,
+        "mean": statistics.fmean(ms),
+        "p50": q[49],
+        "p95": q[94],
+        "p99": q[98],
+        "max": ms[-1],
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    sample: Sample,
+    rng: random.Random,
+    concurrency: int,
+    requests: int,
+) -> Dict:
+    """
+    Sends `requests` requests from `concurrency` concurrent clients.
+    """
+    latencies = []
+    statuses: Dict[int, int] = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            url, body = scenario.make(rng, sample)
+            start = time.perf_counter()
+            response = await client.request(scenario.method, url, json=body)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+async def run(args, sample: Sample, port: int) -> Dict[str, Dict]:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+    ) as client:
+        await wait_for_server(client)
+        results = {}
+        for scenario in SCENARIOS:
+            if args.routes and not any(r in scenario.path for r in args.routes):
+                continue
+            # Warm up connections and statement caches
+            await run_scenario(
+                client, scenario, sample, rng, args.concurrency, args.concurrency
+            )
+            results[scenario.name] = await run_scenario(
+                client, scenario, sample, rng, args.concurrency, args.requests
+            )
+            print_row(scenario.name, results[scenario.name])
+        return results
+
+
+def print_header():
+    print(f"{'route':<56} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}  statuses")
+
+
+def print_row(name: str, stats: Dict):
+    print(
+        f"{name:<56} {stats['throughput']:>8.1f} {stats['p50']:>8.2f}"
+        f" {stats['p95']:>8.2f} {stats['p99']:>8.2f}  {stats['statuses']}"
+    )
+
+
+def compare(baseline: Dict, results: Dict, threshold: float) -> bool:
+    """
+    Prints changes relative to baseline results.
+
+    Returns False if p50 or p99 latencies, or throughput, of any route
+    regressed by more than `threshold` percent.
+    """
+    ok = True
+    print(f"\nCompared to {baseline.get('commit')} (%, positive is worse):")
+    print(f"{'route':<56} {'req/s':>8} {'p50':>8} {'p99':>8}")
+    for name, new in results.items():
+        old = baseline["routes"].get(name)
+        if old is None:
+            continue
+        changes = [
+            100 * (old["throughput"] - new["throughput"]) / old["throughput"],
+            100 * (new["p50"] - old["p50"]) / old["p50"],
+            100 * (new["p99"] - old["p99"]) / old["p99"],
+        ]
+        regressed = any(c > threshold for c in changes)
+        ok = ok and not regressed
+        flag = "  <-- regression" if regressed else ""
+        print(f"{name:<56} " + " ".join(f"{c:>+8.1f}" for c in changes) + flag)
+    return ok
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--blocks", type=int, default=Scale.blocks)
+    p.add_argument("--addresses", type=int, default=Scale.addresses)
+    p.add_argument("--tokens", type=int, default=Scale.tokens)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-c", "--concurrency", type=int, default=16)
+    p.add_argument("-n", "--requests", type=int, default=1000, help="per route")
+    p.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    p.add_argument("--cache-size", type=int, default=0, help="api response cache")
+    p.add_argument(
+        "--routes", nargs="*", help="only run routes with paths containing these"
+    )
+    p.add_argument("-o", "--output", default="bench_load.json")
+    p.add_argument("--baseline", help="results of a previous run to compare with")
+    p.add_argument(
+        "--threshold",
+        type=float,
+        default=10,
+        help="regression threshold in percent, exit with 1 if exceeded",
+    )
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    for name in uncovered_routes():
+        print(f"Warning: no scenario for {name}")
+    scale = Scale(blocks=args.blocks, addresses=args.addresses, tokens=args.tokens)
+    with MockDB(set_constraints=False, dbname=BENCH_DB_NAME):
+        with pg.connect(conn_str(BENCH_DB_NAME)) as conn:
+            start = time.perf_counter()
+            load(conn, scale, args.seed)
+            with open(CONSTRAINTS_PATH) as f:
+                conn.execute(f.read())
+            print(f"Loaded synthetic chain in {time.perf_counter() - start:.1f}s")
+        sample = load_sample(BENCH_DB_NAME)
+        port = free_port()
+        server = start_server(BENCH_DB_NAME, port, args.workers, args.cache_size)
+        try:
+            print_header()
+            results = asyncio.run(run(args, sample, port))
+        finally:
+            server.terminate()
+            server.wait()
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "settings": vars(args),
+        "routes": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
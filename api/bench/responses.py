@@ -0,0 +1,116 @@
+"""
+Response serialization benchmark.
+
+Compares requests/sec of FastAPI's default json path (response model
+validation + jsonable_encoder + json.dumps) with trusted routes rendered by
+orjson, for payloads shaped like those of hot endpoints.
+
+Requests are sent straight to the ASGI app, so no db or network is involved
+and only the serialization layer is measured.
+
+Usage (from within the api directory):
+
+    python -m bench.responses [n_requests]
+"""
+import asyncio
+import json
+import sys
+import time
+from typing import List
+
+from fastapi import FastAPI
+
+from src.api.responses import FastJSONResponse
+from src.api.responses import trusted
+from src.api.routes.metrics import HistoryRecord
+from src.api.routes.ranking import RankResponse
+
+N_RECORDS = 1000
+
+RECORDS = [
+    {"t": 1561978800000 + i * 120_000, "v": 1_000_000 + i} for i in range(N_RECORDS)
+]
+
+RANK = {
+    "above": {"rank": 1, "address": "9" + "a" * 50, "balance": 2_000_000_000},
+    "target": {"rank": 2, "address": "9" + "b" * 50, "balance": 1_000_000_000},
+    "under": {"rank": 3, "address": "9" + "c" * 50, "balance": 500_000_000},
+}
+
+
+def make_app(fast: bool) -> FastAPI:
+    if fast:
+        app = FastAPI(default_response_class=FastJSONResponse)
+        wrap = trusted
+    else:
+        app = FastAPI()
+        wrap = lambda func: func
+
+    @app.get("/records", response_model=List[HistoryRecord])
+    @wrap
+    async def records():
+        return RECORDS
+
+    @app.get("/rank", response_model=RankResponse)
+    @wrap
+    async def rank():
+        return RANK
+
+    return app
+
+
+async def request(app: FastAPI, path: str) -> bytes:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def run(app: FastAPI, path: str, n: int) -> float:
+    # Warm up
+    for _ in range(10):
+        await request(app, path)
+    start = time.perf_counter()
+    for _ in range(n):
+        await request(app, path)
+    return n / (time.perf_counter() - start)
+
+
+async def main(n: int):
+    default = make_app(fast=False)
+    fast = make_app(fast=True)
+    print(f"{'path':<10} {'default':>12} {'fast':>12} {'speedup':>8}")
+    for path in ["/records", "/rank"]:
+        # Both paths must send the same data
+        assert json.loads(await request(default, path)) == json.loads(
+            await request(fast, path)
+        )
+        before = await run(default, path, n)
+        after = await run(fast, path, n)
+        print(f"{path:<10} {before:>10.0f}/s {after:>10.0f}/s {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    asyncio.run(main(n))
@@ -0,0 +1,235 @@
+"""
+In-memory index of P2PK balances, for fast rankings.
+
+Balances are kept sorted in ascending order, with ties ordered by address,
+so ranks and neighbours are found through binary searches.
+
+The index is refreshed incrementally on each new head, using balance diffs
+to find which addresses changed. Rollbacks are detected by comparing recent
+header id's with those seen during the previous refresh.
+"""
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from .filters import ADDRESS_CLASSES
+from .filters import P2PK
+from .head import Head
+
+logger = logging.getLogger(__name__)
+
+# Number of recent blocks remembered to handle rollbacks.
+# Deeper rollbacks trigger a full reload.
+KEEP_BLOCKS = 100
+
+P2PK_FILTER = ADDRESS_CLASSES[P2PK]
+
+SELECT_HEAD = "select height, id from core.headers order by height desc limit 1;"
+
+SELECT_BALANCES = f"""
+    select address
+        , value
+    from bal.erg
+    where {P2PK_FILTER};
+"""
+
+SELECT_RECENT_BLOCKS = f"""
+    select h.height
+        , h.id
+        , array_remove(array_agg(distinct d.address), null) as addresses
+    from core.headers h
+    left join bal.erg_diffs d on d.height = h.height
+        and d.address like '9%' and length(d.address) = 51
+    where h.height >= $1
+    group by 1, 2
+    order by 1;
+"""
+
+SELECT_BALANCES_OF = """
+    select address
+        , value
+    from bal.erg
+    where address = any($1::text[]);
+"""
+
+
+class P2PKBalanceIndex:
+    def __init__(self, pool):
+        self._pool = pool
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # Sorted balances and matching addresses
+        self._values = array("q")
+        self._addresses: List[str] = []
+        self._balances: Dict[str, int] = {}
+        # Header id and P2PK addresses with a balance change, by height
+        self._blocks: Dict[int, Tuple[str, List[str]]] = {}
+        self.ready = False
+        # Head the index is in sync with
+        self.head: Head | None = None
+
+    def __len__(self):
+        return len(self._values)
+
+    def start(self):
+        """
+        Load index in the background.
+        """
+        self._task = asyncio.create_task(self.refresh())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def on_new_head(self, head: Head | None):
+        """
+        HeadTracker subscriber.
+        """
+        await self.refresh()
+
+    async def refresh(self):
+        async with self._lock:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    if self.ready and self._blocks:
+                        await self._update(conn)
+                    else:
+                        await self._load(conn)
+
+    def rank(self, address: str) -> dict | None:
+        """
+        Returns rank of given address along with its neighbours.
+
+        Ranks follow the `rank()` window function: addresses with equal
+        balances share the same rank. Neighbours are the first address of the
+        next higher and next lower balance.
+        """
+        value = self._balances.get(address)
+        if value is None:
+            return None
+        values = self._values
+        n = len(values)
+        # First index of higher balances
+        hi = bisect_right(values, value)
+        # First index of target balance
+        lo = bisect_left(values, value)
+        above = None
+        if hi < n:
+            above_value = values[hi]
+            above = {
+                "rank": n - bisect_right(values, above_value) + 1,
+                "address": self._addresses[hi],
+                "balance": above_value,
+            }
+        under = None
+        if lo > 0:
+            under_value = values[lo - 1]
+            under = {
+                "rank": n - lo + 1,
+                "address": self._addresses[bisect_left(values, under_value)],
+                "balance": under_value,
+            }
+        return {
+            "above": above,
+            "target": {
+                "rank": n - hi + 1,
+                "address": address,
+                "balance": value,
+            },
+            "under": under,
+        }
+
+    async def _load(self, conn):
+        logger.info("Loading P2PK balance index")
+        head = await self._fetch_head(conn)
+        rows = await conn.fetch(SELECT_BALANCES)
+        blocks = {}
+        if head is not None:
+            blocks = await self._fetch_blocks(conn, head.height - KEEP_BLOCKS + 1)
+        pairs = sorted((r["value"], r["address"]) for r in rows)
+        self._values = array("q", (v for v, _ in pairs))
+        self._addresses = [a for _, a in pairs]
+        self._balances = {a: v for v, a in pairs}
+        self._blocks = blocks
+        self.head = head
+        self.ready = True
+        logger.info(f"Loaded {len(self)} P2PK balances")
+
+    async def _update(self, conn):
+        head = await self._fetch_head(conn)
+        if head == self.head:
+            return
+        oldest = min(self._blocks)
+        chain = await self._fetch_blocks(conn, oldest)
+
+        # First remembered block that isn't part of the chain anymore
+        fork_height = None
+        for height in sorted(self._blocks):
+            if height not in chain or chain[height][0] != self._blocks[height][0]:
+                fork_height = height
+                break
+        if fork_height == oldest:
+            # Rolled back further than what we remember
+            await self._load(conn)
+            return
+
+        last_valid = self.head.height if fork_height is None else fork_height - 1
+        changed = set()
+        for height, (_, addresses) in self._blocks.items():
+            if height > last_valid:
+                changed.update(addresses)
+        for height, (_, addresses) in chain.items():
+            if height > last_valid:
+                changed.update(addresses)
+
+        rows = await conn.fetch(SELECT_BALANCES_OF, list(changed))
+        new_balances = {r["address"]: r["value"] for r in rows}
+
+        # Apply changes without yielding to the event loop
+        for address in changed:
+            self._remove(address)
+            value = new_balances.get(address)
+            if value is not None:
+                self._insert(address, value)
+        if head is not None:
+            chain = {h: b for h, b in chain.items() if h > head.height - KEEP_BLOCKS}
+        self._blocks = chain
+        self.head = head
+
+    async def _fetch_head(self, conn) -> Head | None:
+        row = await conn.fetchrow(SELECT_HEAD)
+        if row is None:
+            return None
+        return Head(row["height"], row["id"])
+
+    async def _fetch_blocks(self, conn, since: int) -> Dict[int, Tuple[str, List[str]]]:
+        rows = await conn.fetch(SELECT_RECENT_BLOCKS, since)
+        return {r["height"]: (r["id"], r["addresses"]) for r in rows}
+
+    def _insert(self, address: str, value: int):
+        lo = bisect_left(self._values, value)
+        hi = bisect_right(self._values, value, lo)
+        index = bisect_left(self._addresses, address, lo, hi)
+        self._values.insert(index, value)
+        self._addresses.insert(index, address)
+        self._balances[address] = value
+
+    def _remove(self, address: str):
+        value = self._balances.pop(address, None)
+        if value is None:
+            return
+        lo = bisect_left(self._values, value)
+        hi = bisect_right(self._values, value, lo)
+        index = bisect_left(self._addresses, address, lo, hi)
+        del self._values[index]
+        del self._addresses[index]
@@ -0,0 +1,114 @@
+"""
+In-process response cache.
+
+Data served by the API only changes when the watcher includes or rolls back
+a block, so route results are cached per sync head and dropped whenever
+the head changes.
+
+Identical requests arriving while a result is still being computed (e.g. all
+dashboards refreshing on a new block) share that single computation instead
+of each running the same queries.
+"""
+import asyncio
+from collections import OrderedDict
+from functools import wraps
+from typing import Any
+from typing import Dict
+from typing import Hashable
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .head import Head
+
+
+class ResponseCache:
+    """
+    Bounded LRU mapping of (route, params, head) keys to route results.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self._maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        # Computations in progress, by key
+        self.inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    async def on_new_head(self, head: Head | None):
+        """
+        HeadTracker subscriber, invalidates all entries.
+        """
+        self.clear()
+
+
+def cached(func):
+    """
+    Cache route results for the current sync head.
+
+    Decorated routes must take a `request` parameter. Cache keys are made
+    of the route, its normalized parameters (as parsed by FastAPI, so
+    ordering and defaults do not matter) and the current head. Exceptions
+    (e.g. 404's) and streamed responses are not cached.
+
+    Concurrent calls with the same key await the same computation. It runs
+    in its own task, so it carries on if the request that started it gets
+    cancelled.
+    """
+
+    @wraps(func)
+    async def wrapper(*args, request: Request, **kwargs):
+        head = request.app.state.head.head
+        if head is None:
+            return await func(*args, request=request, **kwargs)
+        cache: ResponseCache = request.app.state.cache
+        key = (func.__module__, func.__qualname__, tuple(sorted(kwargs.items())), head)
+        hit, value = cache.get(key)
+        if hit:
+            return value
+        task = cache.inflight.get(key)
+        if task is not None:
+            cache.coalesced += 1
+            value = await asyncio.shield(task)
+            if isinstance(value, StreamingResponse):
+                # Streams can only be consumed once
+                return await func(*args, request=request, **kwargs)
+            return value
+
+        async def compute():
+            try:
+                value = await func(*args, request=request, **kwargs)
+                if not isinstance(value, StreamingResponse):
+                    cache.set(key, value)
+                return value
+            finally:
+                del cache.inflight[key]
+
+        task = asyncio.create_task(compute())
+        cache.inflight[key] = task
+        return await asyncio.shield(task)
+
+    return wrapper
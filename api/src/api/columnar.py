@@ -0,0 +1,115 @@
+"""
+Columnar binary responses for time series.
+
+Clients can ask for an Arrow IPC stream or msgpack instead of json through
+the Accept header. Columns are aggregated into arrays by Postgres and
+handed over to the encoders as is, without building objects for each row.
+"""
+from enum import Enum
+from typing import Dict
+from typing import List
+
+import msgpack
+import pyarrow as pa
+from fastapi import Request
+from fastapi import Response
+
+from . import timing
+
+
+class ColumnarFormat(str, Enum):
+    arrow = "application/vnd.apache.arrow.stream"
+    msgpack = "application/msgpack"
+
+
+MEDIA_TYPES = {
+    "application/vnd.apache.arrow.stream": ColumnarFormat.arrow,
+    "application/msgpack": ColumnarFormat.msgpack,
+    "application/x-msgpack": ColumnarFormat.msgpack,
+}
+
+# Media ranges that select the default json representation
+JSON_MEDIA_TYPES = {"application/json", "application/*", "*/*"}
+
+
+def negotiate(request: Request) -> ColumnarFormat | None:
+    """
+    Returns the columnar format preferred by the Accept header, if any.
+
+    Returns `None` when json is preferred, or when no Accept header is set.
+    Can be used as a route dependency.
+    """
+    header = request.headers.get("accept")
+    if header is None:
+        return None
+    ranges = []
+    for item in header.split(","):
+        media_type, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0
+        if q > 0:
+            ranges.append((q, media_type.lower()))
+    # Stable sort keeps header order for equal weights
+    for _, media_type in sorted(ranges, key=lambda r: -r[0]):
+        if media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+        if media_type in JSON_MEDIA_TYPES:
+            return None
+    return None
+
+
+def columns_query(query: str, columns: Dict[str, str], order_by: str) -> str:
+    """
+    Wraps `query` to return each column as an array.
+
+    `columns` maps names of the returned arrays to columns of `query`.
+    Also returns the number of rows as `n`.
+    """
+    arrays = ", ".join(
+        f"array_agg({v} order by {order_by}) as {k}" for k, v in columns.items()
+    )
+    return f"""
+        with q as ({query.strip().rstrip(";")})
+        select count(*) as n
+            , {arrays}
+        from q;
+    """
+
+
+def encode_arrow(columns: Dict[str, List[int]]) -> bytes:
+    batch = pa.record_batch(
+        [pa.array(values, type=pa.int64()) for values in columns.values()],
+        names=list(columns),
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(columns: Dict[str, List[int]]) -> bytes:
+    return msgpack.packb(columns)
+
+
+ENCODERS = {
+    ColumnarFormat.arrow: encode_arrow,
+    ColumnarFormat.msgpack: encode_msgpack,
+}
+
+
+def columnar_response(columns: Dict[str, List[int] | None], format: ColumnarFormat):
+    """
+    Returns a response with given integer columns encoded in requested format.
+
+    Columns are expected to be of equal length, `None` for empty ones.
+    """
+    columns = {k: [] if v is None else v for k, v in columns.items()}
+    with timing.timed(timing.SERIALIZE):
+        content = ENCODERS[format](columns)
+    return Response(content=content, media_type=format.value)
@@ -0,0 +1,98 @@
+"""
+Conditional requests support.
+
+Responses only change when the sync head does, so ETags are derived from
+the head and the request itself. Matching If-None-Match headers are answered
+with a 304 before any db work is done.
+
+Some historical queries can never change once far enough from the head
+(i.e. past the finality depth). Their ETags don't depend on the head and
+they are marked as immutable.
+"""
+import re
+from hashlib import blake2b
+
+from fastapi import Request
+from fastapi import Response
+
+from .columnar import negotiate
+from .head import Head
+
+IMMUTABLE_MAX_AGE = 31536000  # 1 year
+
+# Paths of historical queries, with the queried height as named group.
+HISTORICAL_PATHS = [
+    re.compile(r"/addresses/[^/]+/balance/at/height/(?P<height>\d+)"),
+]
+
+
+def historical_height(path: str) -> int | None:
+    """
+    Returns queried height if path is that of a historical query.
+    """
+    for pattern in HISTORICAL_PATHS:
+        match = pattern.fullmatch(path)
+        if match is not None:
+            return int(match["height"])
+    return None
+
+
+def make_etag(request: Request, head: Head | None) -> str:
+    """
+    Returns a strong ETag for given request and head.
+
+    Query parameters are sorted, so their order doesn't matter. The
+    negotiated response format is included, so representations of a same
+    resource get distinct tags. Pass `None` as head for immutable resources.
+    """
+    query = sorted(request.query_params.multi_items())
+    key = f"{request.url.path}?{query}"
+    columnar = negotiate(request)
+    if columnar is not None:
+        key += f"#{columnar.value}"
+    if head is not None:
+        key += f"@{head.header_id}"
+    digest = blake2b(key.encode(), digest_size=8).hexdigest()
+    if head is None:
+        return f'"{digest}"'
+    return f'"{head.height}-{digest}"'
+
+
+def if_none_match(request: Request) -> set[str]:
+    """
+    Returns set of ETags listed in If-None-Match header, ignoring weakness.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return set()
+    return {
+        tag.strip().removeprefix("W/")
+        for tag in header.split(",")
+        if tag.strip()
+    }
+
+
+async def conditional_requests(request: Request, call_next):
+    """
+    Middleware adding ETags to successful GET responses and answering
+    matching conditional requests with a 304.
+    """
+    head = request.app.state.head.head
+    if request.method != "GET" or head is None:
+        return await call_next(request)
+
+    height = historical_height(request.scope["path"])
+    finality_depth = request.app.state.finality_depth
+    immutable = height is not None and height <= head.height - finality_depth
+    etag = make_etag(request, None if immutable else head)
+    headers = {"ETag": etag, "Vary": "Accept"}
+    if immutable:
+        headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+
+    if etag in if_none_match(request):
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
@@ -0,0 +1,82 @@
+"""
+Predicate compiler for address and balance filters.
+
+Turns a set of address classes, an optional token and a list of optional
+filters into a fixed where clause. Optional filters test nullable
+parameters (e.g. `$2::bigint is null or value >= $2::bigint`), so a single
+statement covers every combination of provided filters and its plan can be
+reused across all of them.
+"""
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+
+# Address classes
+P2PK = "p2pk"
+CONTRACTS = "contracts"
+
+ADDRESS_CLASSES = {
+    P2PK: "address like '9%' and length(address) = 51",
+    CONTRACTS: "(address not like '9%' or length(address) <> 51)",
+}
+
+
+class Filter(NamedTuple):
+    """
+    Optional filter, applied only when its parameter is not null.
+
+    The predicate refers to the parameter as `{p}`.
+    """
+
+    name: str
+    type: str
+    predicate: str
+
+
+BAL_GE = Filter("bal_ge", "bigint", "value >= {p}")
+BAL_LT = Filter("bal_lt", "bigint", "value < {p}")
+EXCLUDED_ADDRESSES = Filter("excluded_addresses", "text[]", "address <> all({p})")
+
+
+class Predicate(NamedTuple):
+    """
+    Compiled where clause, along with names of its positional parameters.
+    """
+
+    sql: str
+    params: List[str]
+
+    def args(self, **values) -> list:
+        """
+        Returns positional arguments from named values.
+
+        Missing values are passed as nulls, disabling corresponding filters.
+        Null values of parameters not in the predicate are ignored.
+        """
+        unknown = {k for k, v in values.items() if v is not None} - set(self.params)
+        assert not unknown, unknown
+        return [values.get(name) for name in self.params]
+
+
+def compile_predicate(
+    address_classes: Iterable[str],
+    token: bool,
+    filters: Iterable[Filter] = (),
+) -> Predicate:
+    """
+    Returns where clause selecting addresses of any of given classes.
+
+    Token id comes first when `token` is set, followed by filters in the
+    given order.
+    """
+    params = []
+    classes = " or ".join(f"({ADDRESS_CLASSES[c]})" for c in sorted(address_classes))
+    conditions = [f"({classes})"]
+    if token:
+        params.append("token_id")
+        conditions.append(f"token_id = ${len(params)}")
+    for f in filters:
+        params.append(f.name)
+        p = f"${len(params)}::{f.type}"
+        conditions.append(f"({p} is null or {f.predicate.format(p=p)})")
+    return Predicate(" and ".join(conditions), params)
@@ -0,0 +1,138 @@
+"""
+Keeps track of the current sync head (last block included by the watcher).
+
+The watcher sends a notification on the `ew_blocks` channel each time it
+includes or rolls back a block. A dedicated connection listens to it, so the
+head is known without querying the database.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Awaitable
+from typing import Callable
+from typing import List
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "ew_blocks"
+
+# Queued in place of a head when the listening connection is lost
+_DISCONNECTED = object()
+
+
+@dataclass(frozen=True)
+class Head:
+    height: int
+    header_id: str
+
+
+Subscriber = Callable[[Head | None], Awaitable[None]]
+
+
+def parse_notification(payload: str) -> Head:
+    """
+    Returns the head resulting from a watcher notification.
+    """
+    event = json.loads(payload)
+    if event["event"] == "include":
+        return Head(event["height"], event["header_id"])
+    elif event["event"] == "rollback":
+        return Head(event["height"] - 1, event["parent_id"])
+    raise ValueError(f"Unknown event: {event['event']}")
+
+
+class HeadTracker:
+    """
+    Listens to watcher notifications and notifies subscribers when the head changes.
+
+    Changes include new blocks as well as rollbacks, hence a head is
+    identified by both its height and header id.
+    """
+
+    def __init__(self, pool, dsn: str, retry_interval: float = 5.0):
+        self._pool = pool
+        self._dsn = dsn
+        self._retry_interval = retry_interval
+        self._subscribers: List[Subscriber] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self.head: Head | None = None
+
+    @property
+    def height(self) -> int | None:
+        return None if self.head is None else self.head.height
+
+    def subscribe(self, callback: Subscriber):
+        """
+        Register a coroutine function to be awaited with the new head on changes.
+        """
+        self._subscribers.append(callback)
+
+    async def start(self):
+        self.head = await self._fetch_head()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _fetch_head(self) -> Head | None:
+        query = "select height, id from core.headers order by height desc limit 1;"
+        async with self._pool.acquire() as conn:
+            row = await conn.fetchrow(query)
+        if row is None:
+            return None
+        return Head(row["height"], row["id"])
+
+    def _on_notification(self, conn, pid, channel, payload):
+        try:
+            self._queue.put_nowait(parse_notification(payload))
+        except Exception:
+            logger.exception(f"Ignoring invalid notification: {payload}")
+
+    def _on_termination(self, conn):
+        self._queue.put_nowait(_DISCONNECTED)
+
+    async def _listen(self):
+        """
+        Process notifications, reconnecting whenever the connection is lost.
+        """
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._dsn)
+                conn.add_termination_listener(self._on_termination)
+                await conn.add_listener(CHANNEL, self._on_notification)
+                # Blocks may have been processed while not listening
+                await self._set_head(await self._fetch_head())
+                while True:
+                    head = await self._queue.get()
+                    if head is _DISCONNECTED:
+                        break
+                    await self._set_head(head)
+            except Exception:
+                logger.exception("Lost connection listening to sync head")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    conn.remove_termination_listener(self._on_termination)
+                    await conn.close()
+            logger.warning(f"Reconnecting in {self._retry_interval} seconds")
+            await asyncio.sleep(self._retry_interval)
+
+    async def _set_head(self, head: Head | None):
+        if head == self.head:
+            return
+        self.head = head
+        for callback in self._subscribers:
+            try:
+                await callback(head)
+            except Exception:
+                logger.exception("Head subscriber failed")
@@ -0,0 +1,322 @@
+"""
+Prometheus metrics about the API itself.
+
+Exposed on a dedicated endpoint (see `metrics_endpoint`), not to be confused
+with the `/metrics` data routes.
+
+Collected on the hot path:
+ - request counts and latencies per route template (`record_requests` middleware)
+ - db query durations per registered query name (connection query logger)
+ - pool acquisition times (`InstrumentedPool`)
+
+Pool, cache and head values are read from app state at scrape time only.
+
+The same middleware adds a `Server-Timing` header to responses, splitting
+time spent waiting for pool connections, running queries and serializing
+(see `timing`). Requests slower than `app.state.slow_request_threshold`
+(seconds, if set) are logged. When `app.state.explain_slow_requests` is set,
+the slowest query of such requests is also run through
+`EXPLAIN (ANALYZE, BUFFERS)` and its plan logged.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from fastapi import FastAPI
+from fastapi import Request
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.core import GaugeMetricFamily
+from starlette.routing import Match
+
+from . import timing
+from .queries import REGISTRY as QUERIES
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = CollectorRegistry(auto_describe=True)
+
+REQUESTS = Counter(
+    "ew_api_requests",
+    "Requests handled, by route template, method and status code",
+    ["route", "method", "status"],
+    registry=REGISTRY,
+)
+REQUEST_DURATION = Histogram(
+    "ew_api_request_duration_seconds",
+    "Time spent handling requests, by route template",
+    ["route"],
+    registry=REGISTRY,
+)
+QUERY_DURATION = Histogram(
+    "ew_api_query_duration_seconds",
+    "Time spent running db queries, by registered query name",
+    ["query"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    registry=REGISTRY,
+)
+ACQUIRE_DURATION = Histogram(
+    "ew_api_pool_acquire_duration_seconds",
+    "Time spent waiting for a pool connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+    registry=REGISTRY,
+)
+
+# Label of requests not matching any route
+UNMATCHED = "unmatched"
+# Label of queries not in the query registry
+OTHER = "other"
+
+# Registered query names, by statement text
+_query_names: Dict[str, str] = {}
+# Route templates, by endpoint
+_route_paths: Dict[object, str] = {}
+
+
+def query_name(sql: str) -> str:
+    """
+    Returns name of registered query, ignoring its variant.
+    """
+    if not _query_names:
+        _query_names.update({sql: key[0] for key, sql in QUERIES.items()})
+    return _query_names.get(sql, OTHER)
+
+
+def _observe_query(record):
+    QUERY_DURATION.labels(query_name(record.query)).observe(record.elapsed)
+    timing.add_query(record)
+
+
+def instrument_connection(conn):
+    """
+    Times all queries run on given connection. Call from pool's `init`.
+    """
+    conn.add_query_logger(_observe_query)
+
+
+class _AcquireContext:
+    def __init__(self, pool: "InstrumentedPool", timeout: float | None):
+        self._pool = pool
+        self._timeout = timeout
+        self._conn = None
+
+    async def _acquire(self):
+        start = time.perf_counter()
+        self._pool.waiting += 1
+        try:
+            return await self._pool.pool.acquire(timeout=self._timeout)
+        finally:
+            self._pool.waiting -= 1
+            elapsed = time.perf_counter() - start
+            ACQUIRE_DURATION.observe(elapsed)
+            timing.add(timing.ACQUIRE, elapsed)
+
+    async def __aenter__(self):
+        self._conn = await self._acquire()
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        conn, self._conn = self._conn, None
+        await self._pool.pool.release(conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class InstrumentedPool:
+    """
+    asyncpg pool wrapper keeping track of connection acquisitions.
+
+    Supports both `async with pool.acquire()` and `await pool.acquire()`.
+    Anything else is forwarded to the wrapped pool.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        # Number of acquisitions waiting for a connection
+        self.waiting = 0
+
+    def acquire(self, *, timeout: float | None = None) -> _AcquireContext:
+        return _AcquireContext(self, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+class StateCollector:
+    """
+    Collects pool, cache and head values from app state at scrape time.
+    """
+
+    def __init__(self, app: FastAPI):
+        self._app = app
+        # Sync height at time of last response
+        self.last_served_height: int | None = None
+
+    def collect(self):
+        state = self._app.state
+        pool = getattr(state, "db", None)
+        if isinstance(pool, InstrumentedPool):
+            size = pool.get_size()
+            idle = pool.get_idle_size()
+            yield GaugeMetricFamily(
+                "ew_api_pool_size", "Open pool connections", value=size
+            )
+            yield GaugeMetricFamily(
+                "ew_api_pool_in_use", "Acquired pool connections", value=size - idle
+            )
+            yield GaugeMetricFamily(
+                "ew_api_pool_waiting",
+                "Acquisitions waiting for a pool connection",
+                value=pool.waiting,
+            )
+        cache = getattr(state, "cache", None)
+        if cache is not None:
+            yield CounterMetricFamily(
+                "ew_api_cache_hits", "Response cache hits", value=cache.hits
+            )
+            yield CounterMetricFamily(
+                "ew_api_cache_misses", "Response cache misses", value=cache.misses
+            )
+            yield CounterMetricFamily(
+                "ew_api_cache_coalesced",
+                "Cache misses served by an identical computation in progress",
+                value=cache.coalesced,
+            )
+            lookups = cache.hits + cache.misses
+            yield GaugeMetricFamily(
+                "ew_api_cache_hit_ratio",
+                "Share of cache lookups that were hits",
+                value=cache.hits / lookups if lookups else 0,
+            )
+            yield GaugeMetricFamily(
+                "ew_api_cache_entries", "Cached responses", value=len(cache)
+            )
+        head = getattr(state, "head", None)
+        if head is not None and head.height is not None:
+            yield GaugeMetricFamily(
+                "ew_api_head_height", "Current sync height", value=head.height
+            )
+        if self.last_served_height is not None:
+            yield GaugeMetricFamily(
+                "ew_api_last_served_height",
+                "Sync height at time of last response",
+                value=self.last_served_height,
+            )
+
+
+def route_label(request: Request) -> str:
+    """
+    Returns path template of route handling the request.
+
+    Templates keep label cardinality bounded, unlike actual paths.
+    """
+    scope = request.scope
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        try:
+            return _route_paths[endpoint]
+        except KeyError:
+            pass
+    # Endpoint is unknown when a middleware answered early (e.g. 304's)
+    for route in request.app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            if endpoint is not None:
+                _route_paths[endpoint] = route.path
+            return route.path
+    return UNMATCHED
+
+
+# Pending EXPLAIN tasks
+_explains = set()
+
+
+async def explain(pool, query):
+    """
+    Logs plan of given asyncpg LoggedQuery, as obtained by running it again.
+
+    Runs in a read only transaction that gets rolled back.
+    """
+    sql = f"explain (analyze, buffers) {query.query}"
+    try:
+        async with pool.acquire() as conn:
+            tr = conn.transaction(readonly=True)
+            await tr.start()
+            try:
+                rows = await conn.fetch(sql, *query.args)
+            finally:
+                await tr.rollback()
+    except Exception:
+        logger.exception(f"Could not explain query: {query.query}")
+        return
+    plan = "\n".join(row[0] for row in rows)
+    logger.warning(
+        f"Plan of slow query ({query.elapsed * 1000:.0f} ms, args {query.args}):"
+        f"\n{query.query}\n{plan}"
+    )
+
+
+def log_slow_request(
+    request: Request, route: str, timings: timing.RequestTimings, elapsed: float
+):
+    params = {**request.path_params, **request.query_params}
+    logger.warning(
+        f"Slow request ({elapsed * 1000:.0f} ms): {request.method} {route} {params}"
+        f" - {timings.server_timing(elapsed)}"
+    )
+    query = timings.slowest_query
+    if query is not None and getattr(request.app.state, "explain_slow_requests", False):
+        task = asyncio.create_task(explain(request.app.state.db, query))
+        _explains.add(task)
+        task.add_done_callback(_explains.discard)
+
+
+def record_requests(collector: StateCollector):
+    """
+    Returns middleware counting and timing requests.
+    """
+
+    async def middleware(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            with timing.collect() as timings:
+                response = await call_next(request)
+            status = response.status_code
+            elapsed = time.perf_counter() - start
+            response.headers["Server-Timing"] = timings.server_timing(elapsed)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            route = route_label(request)
+            REQUESTS.labels(route, request.method, status).inc()
+            REQUEST_DURATION.labels(route).observe(elapsed)
+            head = getattr(request.app.state, "head", None)
+            if head is not None and head.height is not None:
+                collector.last_served_height = head.height
+            threshold = getattr(request.app.state, "slow_request_threshold", None)
+            if threshold is not None and elapsed >= threshold:
+                log_slow_request(request, route, timings, elapsed)
+
+    return middleware
+
+
+def instrument(app: FastAPI, path: str):
+    """
+    Adds request metrics middleware and exposition endpoint to app.
+    """
+    collector = StateCollector(app)
+    REGISTRY.register(collector)
+    app.middleware("http")(record_requests(collector))
+
+    async def metrics_endpoint():
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+    app.add_api_route(path, metrics_endpoint, include_in_schema=False)
@@ -0,0 +1,56 @@
+"""
+JSON documents assembled by Postgres.
+
+Wrapping a query with one of the helpers below makes Postgres return its
+rows as a single JSON document, which is then sent as is. This avoids
+building and serializing Python objects for each row.
+
+Wrapped queries return two columns: the number of rows `n` and the
+document itself `doc`.
+"""
+from typing import Dict
+
+from fastapi import Response
+
+
+def records_query(query: str, fields: Dict[str, str], order_by: str) -> str:
+    """
+    Wraps `query` to return its rows as an array of json objects.
+
+    `fields` maps keys of the json objects to columns of `query`.
+    """
+    pairs = ", ".join(f"'{k}', {v}" for k, v in fields.items())
+    return f"""
+        with q as ({query.strip().rstrip(";")})
+        select count(*) as n
+            , coalesce(
+                json_agg(json_build_object({pairs}) order by {order_by}),
+                '[]'
+            )::text as doc
+        from q;
+    """
+
+
+def arrays_query(query: str, fields: Dict[str, str], order_by: str) -> str:
+    """
+    Wraps `query` to return its rows as a json object of flat arrays.
+
+    `fields` maps keys of the json object to columns of `query`.
+    """
+    arrays = ", ".join(
+        f"'{k}', coalesce(json_agg({v} order by {order_by}), '[]')"
+        for k, v in fields.items()
+    )
+    return f"""
+        with q as ({query.strip().rstrip(";")})
+        select count(*) as n
+            , json_build_object({arrays})::text as doc
+        from q;
+    """
+
+
+def json_response(doc: str) -> Response:
+    """
+    Returns a response with given JSON document as body.
+    """
+    return Response(content=doc, media_type="application/json")
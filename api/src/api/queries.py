@@ -0,0 +1,715 @@
+"""
+Query registry.
+
+Every query used by routes is declared here once, with a fixed statement
+text per variant (ERG or token, resolution, response shape, etc.). All
+registered statements are prepared when a pool connection is created (see
+`init_connection`) and kept in the connection's statement cache, so requests
+skip parsing and planning, including the first one on a fresh connection.
+
+Routes use the typed functions of this module instead of building sql.
+Queries meant to be streamed are returned as a `BoundQuery` to be run
+through a cursor.
+"""
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+import asyncpg
+from asyncpg import Record
+
+from . import columnar
+from . import pgjson
+from .filters import ADDRESS_CLASSES
+from .filters import BAL_GE
+from .filters import BAL_LT
+from .filters import CONTRACTS
+from .filters import EXCLUDED_ADDRESSES
+from .filters import P2PK
+from .filters import Predicate
+from .filters import compile_predicate
+
+Key = Tuple
+
+REGISTRY: Dict[Key, str] = {}
+
+
+def register(key: Key, sql: str) -> Key:
+    assert key not in REGISTRY, key
+    REGISTRY[key] = sql
+    return key
+
+
+class Connection(asyncpg.Connection):
+    """
+    Connection able to prepare statements into its statement cache.
+    """
+
+    async def prepare_cached(self, query: str):
+        """
+        Prepares given query as if it had been run, without running it.
+
+        Unlike `prepare()`, the statement ends up in the connection's
+        statement cache, so it is reused by subsequent calls with the same
+        query text. Statements returned by `prepare()` can't be used once the
+        connection has been released to the pool.
+        """
+        await self._get_statement(query, None)
+
+
+def statement_cache_size() -> int:
+    """
+    Statement cache size fitting all registered statements, with some room
+    for queries run outside the registry. Pass to `create_pool`.
+    """
+    return len(REGISTRY) + 100
+
+
+async def init_connection(conn: Connection):
+    """
+    Prepares all registered statements. Pass as `init` to `create_pool`.
+    """
+    for sql in REGISTRY.values():
+        await conn.prepare_cached(sql)
+
+
+class BoundQuery(NamedTuple):
+    """
+    Registered statement along with its arguments.
+    """
+
+    key: Key
+    args: list
+
+    def cursor(self, conn: Connection, prefetch: int):
+        return conn.cursor(REGISTRY[self.key], *self.args, prefetch=prefetch)
+
+
+# Response shapes of history queries
+ROWS = "rows"
+RECORDS = "records"
+ARRAYS = "arrays"
+COLUMNS = "columns"
+
+def _schema(token: bool) -> str:
+    return "tokens" if token else "erg"
+
+
+# ---------------------------------------------------------------------------
+# Addresses
+# ---------------------------------------------------------------------------
+
+# Height targets of historical balance queries, given $2
+TARGETS = {
+    "height": "select $2::int as height",
+    "timestamp": """
+            select height
+            from core.headers
+            where timestamp <= $2
+            order by height desc
+            limit 1
+    """,
+}
+
+for token in (False, True):
+    register(
+        ("address_balance", token),
+        f"""
+            select value
+            from bal.{_schema(token)}
+            where address = $1
+                {'and token_id = $2' if token else ''};
+        """,
+    )
+
+
+def _balance_at_sql(target: str, token: bool) -> str:
+    """
+    Balance of address $1 at height given by `target`.
+
+    Starts from last balance checkpoint prior to target height and adds diffs
+    since then, so only a limited number of diffs are ever summed.
+    Token id, if any, is expected as $3.
+    """
+    schema = _schema(token)
+    token_filter = "and token_id = $3" if token else ""
+    return f"""
+        with target as (
+            {target}
+        ), checkpoint as (
+            select height
+                , value
+            from bal.{schema}_checkpoints
+            where address = $1
+                {token_filter}
+                and height <= (select height from target)
+            order by height desc
+            limit 1
+        )
+        select sum(value) as value
+        from (
+            select value
+            from checkpoint
+            union all
+            select value
+            from bal.{schema}_diffs
+            where address = $1
+                {token_filter}
+                and height <= (select height from target)
+                and height > coalesce((select height from checkpoint), -1)
+        ) sq;
+    """
+
+
+def _balances_at_sql(target: str, token: bool) -> str:
+    """
+    Balances of addresses $1 at height given by `target`.
+
+    Same as `_balance_at_sql`, for many addresses at once.
+    Addresses without any diffs get a zero balance.
+    Token id, if any, is expected as $3.
+    """
+    schema = _schema(token)
+    token_filter = "and token_id = $3" if token else ""
+    return f"""
+        with target as (
+            {target}
+        )
+        select a.address
+            , coalesce(cp.value, 0) + coalesce(df.value, 0) as value
+        from (select distinct unnest($1::text[]) as address) a
+        left join lateral (
+            select height
+                , value
+            from bal.{schema}_checkpoints
+            where address = a.address
+                {token_filter}
+                and height <= (select height from target)
+            order by height desc
+            limit 1
+        ) cp on true
+        left join lateral (
+            select sum(value) as value
+            from bal.{schema}_diffs
+            where address = a.address
+                {token_filter}
+                and height <= (select height from target)
+                and height > coalesce(cp.height, -1)
+        ) df on true;
+    """
+
+
+for target, target_sql in TARGETS.items():
+    for token in (False, True):
+        register(("balance_at", target, token), _balance_at_sql(target_sql, token))
+        register(("balances_at", target, token), _balances_at_sql(target_sql, token))
+
+for token_filter in (False, True):
+    register(
+        ("address_balances", token_filter),
+        f"""
+            select address
+                , null as token_id
+                , value
+            from bal.erg
+            where address = any($1)
+            union all
+            select address
+                , token_id
+                , value
+            from bal.tokens
+            where address = any($1)
+                {'and token_id = any($2)' if token_filter else ''};
+        """,
+    )
+
+
+def balance_history_columns(timestamps: bool) -> List[str]:
+    return ["height", "timestamp", "balance"] if timestamps else ["height", "balance"]
+
+
+def _balance_history_sql(token: bool, timestamps: bool, desc: bool) -> str:
+    """
+    Offset based balance history.
+
+    Expects address, limit and offset as $1, $2 and $3 and, for tokens,
+    token id as $4.
+    """
+    return f"""
+        select d.height
+            {', h.timestamp' if timestamps else ''}
+            , (sum(d.value) over (order by d.height))::bigint as balance
+        from bal.{_schema(token)}_diffs d
+        join core.headers h on h.height = d.height
+        where d.address = $1
+            {'and token_id = $4' if token else ''}
+        order by 1 {'desc' if desc else ''}
+        limit $2 offset $3;
+    """
+
+
+def _balance_history_page_sql(token: bool, timestamps: bool, desc: bool) -> str:
+    """
+    Balance diffs of a cursor based balance history page, grouped by height.
+
+    Expects address, lower and upper height bounds (exclusive, nullable),
+    limit and, for tokens, token id as $1 to $5.
+    """
+    return f"""
+        select d.height
+            {', h.timestamp' if timestamps else ''}
+            , sum(d.value) as value
+        from bal.{_schema(token)}_diffs d
+        {'join core.headers h on h.height = d.height' if timestamps else ''}
+        where d.address = $1
+            {'and d.token_id = $5' if token else ''}
+            and d.height > coalesce($2::int, -1)
+            and d.height < coalesce($3::int, 2147483647)
+        group by d.height {', h.timestamp' if timestamps else ''}
+        order by d.height {'desc' if desc else ''}
+        limit $4;
+    """
+
+
+for token in (False, True):
+    register(
+        ("balance_history_exists", token),
+        f"""
+            select exists (
+                select *
+                from bal.{_schema(token)}_diffs
+                where address = $1
+                    {'and token_id = $2' if token else ''}
+            );
+        """,
+    )
+    for timestamps in (False, True):
+        for desc in (False, True):
+            sql = _balance_history_sql(token, timestamps, desc)
+            columns = balance_history_columns(timestamps)
+            order_by = f"height {'desc' if desc else ''}"
+            plural = {f"{c}s": c for c in columns}
+            register(("balance_history", ROWS, token, timestamps, desc), sql)
+            register(
+                ("balance_history", RECORDS, token, timestamps, desc),
+                pgjson.records_query(sql, {c: c for c in columns}, order_by),
+            )
+            register(
+                ("balance_history", ARRAYS, token, timestamps, desc),
+                pgjson.arrays_query(sql, plural, order_by),
+            )
+            register(
+                ("balance_history", COLUMNS, token, timestamps, desc),
+                columnar.columns_query(sql, plural, order_by),
+            )
+            register(
+                ("balance_history_page", token, timestamps, desc),
+                _balance_history_page_sql(token, timestamps, desc),
+            )
+
+
+async def address_balance(
+    conn: Connection, address: str, token_id: str | None
+) -> int | None:
+    """
+    Current ERG or token balance of an address, `None` if not found.
+    """
+    args = [address] if token_id is None else [address, token_id]
+    sql = REGISTRY[("address_balance", token_id is not None)]
+    return await conn.fetchval(sql, *args)
+
+
+async def balance_at(
+    conn: Connection, address: str, target: str, value: int, token_id: str | None
+) -> int | None:
+    """
+    ERG or token balance of an address at given height or timestamp.
+
+    `target` is one of "height" or "timestamp". Returns `None` if the address
+    has no diffs up to then.
+    """
+    opt_args = [] if token_id is None else [token_id]
+    sql = REGISTRY[("balance_at", target, token_id is not None)]
+    return await conn.fetchval(sql, address, value, *opt_args)
+
+
+def balances_at(
+    addresses: List[str], target: str, value: int, token_id: str | None
+) -> BoundQuery:
+    """
+    ERG or token balances of many addresses at given height or timestamp.
+
+    `target` is one of "height" or "timestamp". Yields address and value.
+    """
+    opt_args = [] if token_id is None else [token_id]
+    return BoundQuery(
+        ("balances_at", target, token_id is not None),
+        [addresses, value, *opt_args],
+    )
+
+
+async def address_balances(
+    conn: Connection, addresses: List[str], token_ids: List[str] | None
+) -> List[Record]:
+    """
+    Current ERG and token balances of many addresses.
+
+    ERG balances have a null `token_id`.
+    """
+    args = [addresses] if token_ids is None else [addresses, token_ids]
+    sql = REGISTRY[("address_balances", token_ids is not None)]
+    return await conn.fetch(sql, *args)
+
+
+async def balance_history_exists(
+    conn: Connection, address: str, token_id: str | None
+) -> bool:
+    args = [address] if token_id is None else [address, token_id]
+    sql = REGISTRY[("balance_history_exists", token_id is not None)]
+    return await conn.fetchval(sql, *args)
+
+
+def _balance_history_key(shape, token_id, timestamps, desc) -> Key:
+    return ("balance_history", shape, token_id is not None, timestamps, desc)
+
+
+async def balance_history(
+    conn: Connection,
+    shape: str,
+    address: str,
+    token_id: str | None,
+    timestamps: bool,
+    desc: bool,
+    limit: int | None,
+    offset: int,
+) -> Record:
+    """
+    Offset based balance history, as a json document (`RECORDS` or `ARRAYS`)
+    or as arrays (`COLUMNS`), along with the number of records `n`.
+    """
+    opt_args = [] if token_id is None else [token_id]
+    sql = REGISTRY[_balance_history_key(shape, token_id, timestamps, desc)]
+    return await conn.fetchrow(sql, address, limit, offset, *opt_args)
+
+
+def balance_history_rows(
+    address: str,
+    token_id: str | None,
+    timestamps: bool,
+    desc: bool,
+    limit: int | None,
+    offset: int,
+) -> BoundQuery:
+    """
+    Offset based balance history, one row per record.
+    """
+    opt_args = [] if token_id is None else [token_id]
+    return BoundQuery(
+        _balance_history_key(ROWS, token_id, timestamps, desc),
+        [address, limit, offset, *opt_args],
+    )
+
+
+async def balance_history_page(
+    conn: Connection,
+    address: str,
+    token_id: str | None,
+    timestamps: bool,
+    desc: bool,
+    after_height: int | None,
+    before_height: int | None,
+    limit: int,
+) -> List[Record]:
+    """
+    Balance diffs by height, between given (exclusive) heights.
+    """
+    opt_args = [] if token_id is None else [token_id]
+    sql = REGISTRY[("balance_history_page", token_id is not None, timestamps, desc)]
+    args = [address, after_height, before_height, limit, *opt_args]
+    return await conn.fetch(sql, *args)
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+# Rounding of timestamps and rollup tables by time resolution
+RESOLUTIONS = {
+    "block": (None, None),
+    "1h": (3_600_000, "mtr.utxos_1h"),
+    "24h": (86_400_000, "mtr.utxos_24h"),
+}
+
+
+def _utxo_count_last_sql(resolution: str) -> str:
+    round_ms, _ = RESOLUTIONS[resolution]
+    if round_ms is None:
+        return """
+            select h.timestamp
+                , m.value
+            from mtr.utxos m
+            join core.headers h on h.height = m.height
+            order by h.height desc
+            limit 1;
+        """
+    return f"""
+        with last_ts as (
+            select timestamp / {round_ms} * {round_ms} as timestamp
+            from core.headers
+            order by 1 desc
+            limit 1
+        )
+        select last_ts.timestamp
+            , m.value
+        from mtr.utxos m
+        join core.headers h on h.height = m.height, last_ts
+        where h.timestamp <= last_ts.timestamp
+        order by h.height desc
+        limit 1;
+    """
+
+
+def _utxo_counts_sql(resolution: str) -> str:
+    """
+    Records with timestamps between $1 and $2.
+
+    Columns are aliased as in `HistoryRecord`.
+    """
+    _, table = RESOLUTIONS[resolution]
+    if table is None:
+        return """
+            select h.timestamp as t
+                , m.value as v
+            from mtr.utxos m
+            join core.headers h on h.height = m.height
+            where h.timestamp >= $1 and h.timestamp <= $2
+            order by h.height;
+        """
+    return f"""
+        select timestamp as t
+            , value as v
+        from {table}
+        where timestamp >= $1 and timestamp <= $2
+        order by timestamp;
+    """
+
+
+for resolution in RESOLUTIONS:
+    sql = _utxo_counts_sql(resolution)
+    fields = {"t": "t", "v": "v"}
+    register(("utxo_count_last", resolution), _utxo_count_last_sql(resolution))
+    register(("utxo_counts", ROWS, resolution), sql)
+    # Block timestamps increase with height, so t is a valid order for blocks
+    register(
+        ("utxo_counts", RECORDS, resolution),
+        pgjson.records_query(sql, fields, order_by="t"),
+    )
+    register(
+        ("utxo_counts", COLUMNS, resolution),
+        columnar.columns_query(sql, fields, order_by="t"),
+    )
+
+
+async def utxo_count_last(conn: Connection, resolution: str) -> Record | None:
+    """
+    Last utxo count (timestamp, value) at given resolution.
+    """
+    return await conn.fetchrow(REGISTRY[("utxo_count_last", resolution)])
+
+
+async def utxo_counts(
+    conn: Connection, shape: str, resolution: str, fr: int, to: int
+) -> Record:
+    """
+    Utxo counts within time window, as a json document (`RECORDS`) or as
+    arrays (`COLUMNS`), along with the number of records `n`.
+    """
+    sql = REGISTRY[("utxo_counts", shape, resolution)]
+    return await conn.fetchrow(sql, fr, to)
+
+
+def utxo_count_rows(resolution: str, fr: int, to: int) -> BoundQuery:
+    """
+    Utxo counts within time window, one row per record.
+    """
+    return BoundQuery(("utxo_counts", ROWS, resolution), [fr, to])
+
+
+# ---------------------------------------------------------------------------
+# P2PK and contract addresses
+# ---------------------------------------------------------------------------
+
+# Coinbase and fee contracts
+EXCLUDED_FROM_SUPPLY = [
+    "2Z4YBkDsDvQj8BX7xiySFewjitqp2ge9c99jfes2whbtKitZTxdBYqbrVZUvZvKv6aqn9by4kp3LE1c26LCyosFnVnm6b6U1JYvWpYmL2ZnixJbXLjWAWuBThV1D6dLpqZJYQHYDznJCk49g5TUiS4q8khpag2aNmHwREV7JSsypHdHLgJT7MGaw51aJfNubyzSKxZ4AJXFS27EfXwyCLzW1K6GVqwkJtCoPvrcLqmqwacAWJPkmh78nke9H4oT88XmSbRt2n9aWZjosiZCafZ4osUDxmZcc5QVEeTWn8drSraY3eFKe8Mu9MSCcVU",
+    "4L1ktFSzm3SH1UioDuUf5hyaraHird4D2dEACwQ1qHGjSKtA6KaNvSzRCZXZGf9jkfNAEC1SrYaZmCuvb2BKiXk5zW9xuvrXFT7FdNe2KqbymiZvo5UQLAm5jQY8ZBRhTZ4AFtZa1UF5nd4aofwPiL7YkJuyiL5hDHMZL1ZnyL746tHmRYMjAhCgE7d698dRhkdSeVy",
+]
+
+# Compiled predicates of registered count and supply statements
+PREDICATES: Dict[Key, Predicate] = {}
+
+for address_class in ADDRESS_CLASSES:
+    for token in (False, True):
+        key = ("address_count", address_class, token)
+        PREDICATES[key] = compile_predicate([address_class], token, [BAL_GE, BAL_LT])
+        register(
+            key,
+            f"""
+                select count(*) as cnt
+                from bal.{_schema(token)}
+                where {PREDICATES[key].sql};
+            """,
+        )
+
+for token in (False, True):
+    key = ("address_supply", CONTRACTS, token)
+    PREDICATES[key] = compile_predicate([CONTRACTS], token, [EXCLUDED_ADDRESSES])
+    register(
+        key,
+        f"""
+            select sum(value) as value
+            from bal.{_schema(token)}
+            where {PREDICATES[key].sql};
+        """,
+    )
+
+register(
+    ("p2pk_rank",),
+    f"""
+        with ranked_p2pk as (
+            select rank() over (order by value desc)
+                , address
+                , value
+            from bal.erg
+            where {ADDRESS_CLASSES[P2PK]}
+            order by address desc
+        ), target as (
+            select rank
+                , address
+                , value
+            from ranked_p2pk
+            where address = $1
+        )
+        -- Target address
+        select 'target' as label
+            , rank
+            , value
+            , address
+        from target
+        union
+        -- First higher ranked
+        select * from (
+            select 'above' as label
+                , p.rank
+                , p.value
+                , p.address
+            from ranked_p2pk p, target t
+            where p.rank < t.rank
+            order by p.rank desc, p.address
+            limit 1
+        ) above
+        union
+        -- First lower ranked
+        select * from (
+            select 'under' as label
+                , p.rank
+                , p.value
+                , p.address
+            from ranked_p2pk p, target t
+            where p.rank > t.rank
+            order by p.rank, p.address
+            limit 1
+        ) under;
+    """,
+)
+
+
+async def address_count(
+    conn: Connection,
+    address_class: str,
+    token_id: str | None,
+    bal_ge: int | None,
+    bal_lt: int | None,
+) -> int:
+    """
+    Number of P2PK or contract addresses, optionally within a balance range.
+    """
+    key = ("address_count", address_class, token_id is not None)
+    args = PREDICATES[key].args(token_id=token_id, bal_ge=bal_ge, bal_lt=bal_lt)
+    return await conn.fetchval(REGISTRY[key], *args)
+
+
+async def contracts_supply(conn: Connection, token_id: str | None) -> int | None:
+    """
+    Current supply in contract addresses, excluding coinbase and fees.
+    """
+    key = ("address_supply", CONTRACTS, token_id is not None)
+    args = PREDICATES[key].args(
+        token_id=token_id, excluded_addresses=EXCLUDED_FROM_SUPPLY
+    )
+    return await conn.fetchval(REGISTRY[key], *args)
+
+
+async def p2pk_rank(conn: Connection, address: str) -> List[Record]:
+    """
+    Rank of a P2PK address along with next higher and lower ones.
+
+    Rows are labelled "target", "above" and "under".
+    """
+    return await conn.fetch(REGISTRY[("p2pk_rank",)], address)
+
+
+# ---------------------------------------------------------------------------
+# Tokens
+# ---------------------------------------------------------------------------
+
+register(
+    ("token_details",),
+    """
+        select id as token_id
+            , emission_amount
+            , name
+            , description
+            , coalesce(decimals, 0) as decimals
+            , standard
+        from core.tokens
+        where id = $1;
+    """,
+)
+
+register(
+    ("token_supply",),
+    """
+        select
+        (
+            select emission_amount
+            from core.tokens
+            where id = $1
+        ) as emitted
+        ,
+        (
+            select array[coalesce(sum(value), 0)
+                , coalesce(
+                    sum(value) filter (
+                        where address not like '9%' or length(address) <> 51
+                    ),
+                    0
+                )
+            ] as total_and_contracts
+            from bal.tokens
+            where token_id = $1
+        );
+    """,
+)
+
+
+async def token_details(conn: Connection, token_id: str) -> Record | None:
+    return await conn.fetchrow(REGISTRY[("token_details",)], token_id)
+
+
+async def token_supply(conn: Connection, token_id: str) -> Record:
+    """
+    Token emission and (total, in contracts) supply.
+    """
+    return await conn.fetchrow(REGISTRY[("token_supply",)], token_id)
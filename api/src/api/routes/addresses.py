@@ -1,19 +1,60 @@
+import base64
+import json
+from typing import Dict
+from typing import List
+
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import HTTPException
 from fastapi import Path
 from fastapi import Query
 from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from pydantic import conlist
 
+from .. import queries
+from ..cache import cached
+from ..columnar import ColumnarFormat
+from ..columnar import columnar_response
+from ..columnar import negotiate
 from ..models import Address
 from ..models import TokenID
+from ..pgjson import json_response
+from ..responses import trusted
+from ..streaming import StreamFormat
+from ..streaming import iter_chunks
+from ..streaming import stream_rows
 
 addresses_router = r = APIRouter()
 
 
 DETAIL_404 = "No balance found"
 
+# Max number of addresses in batch requests
+BATCH_SIZE_LIMIT = 1000
+# Max number of addresses in streamed batch requests
+STREAMED_BATCH_SIZE_LIMIT = 10_000
+# Max number of records in non-streamed balance history
+HISTORY_LIMIT = 10_000
+
+
+class BalancesRequest(BaseModel):
+    addresses: conlist(Address, min_items=1, max_items=BATCH_SIZE_LIMIT)
+    token_ids: None | List[TokenID] = None
+
+
+class AddressBalances(BaseModel):
+    erg: int
+    tokens: Dict[str, int]
+
+
+class HistoricalBalancesRequest(BaseModel):
+    addresses: conlist(Address, min_items=1, max_items=STREAMED_BATCH_SIZE_LIMIT)
+
 
 @r.get("/{address}/balance", response_model=int)
+@cached
 async def address_balance(
     request: Request,
     address: Address,
@@ -22,90 +63,116 @@ async def address_balance(
     """
     Current ERG or token balance of an address.
     """
-    args = [address]
-    query = """
-        select value
-        from bal.erg
-        where address = $1;
-    """
-    if token_id is not None:
-        args.append(token_id)
-        query = """
-            select value
-            from bal.tokens
-            where address = $1
-                and token_id = $2;
-        """
     async with request.app.state.db.acquire() as conn:
-        row = await conn.fetchrow(query, *args)
-        if row is None:
-            raise HTTPException(status_code=404, detail=DETAIL_404)
-        return row["value"]
+        value = await queries.address_balance(conn, address, token_id)
+    if value is None:
+        raise HTTPException(status_code=404, detail=DETAIL_404)
+    return value
+
+
+@r.post("/balances", response_model=Dict[str, AddressBalances])
+async def address_balances(
+    request: Request,
+    body: BalancesRequest,
+):
+    """
+    Current ERG and token balances of many addresses at once.
+
+    Token balances are limited to `token_ids`, if provided.
+    Unknown addresses have zero balances.
+    """
+    async with request.app.state.db.acquire() as conn:
+        rows = await queries.address_balances(conn, body.addresses, body.token_ids)
+    res = {address: {"erg": 0, "tokens": {}} for address in body.addresses}
+    for row in rows:
+        if row["token_id"] is None:
+            res[row["address"]]["erg"] = row["value"]
+        else:
+            res[row["address"]]["tokens"][row["token_id"]] = row["value"]
+    return res
+
+
+def stream_balances(request: Request, query: queries.BoundQuery) -> StreamingResponse:
+    """
+    Streams balances as a json object keyed by address.
+    """
+
+    async def generate():
+        yield "{"
+        sep = ""
+        async for chunk in iter_chunks(request, query):
+            yield sep + ",".join(
+                f'{json.dumps(row["address"])}:{row["value"]}' for row in chunk
+            )
+            sep = ","
+        yield "}"
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+@r.post("/balances/at/height/{height}", response_model=Dict[str, int])
+async def address_balances_at_height(
+    request: Request,
+    body: HistoricalBalancesRequest,
+    height: int = Path(None, ge=0),
+    token_id: TokenID = Query(None, description="Optional token id"),
+):
+    """
+    ERG or token balances of many addresses at given height.
+    """
+    query = queries.balances_at(body.addresses, "height", height, token_id)
+    return stream_balances(request, query)
+
+
+@r.post("/balances/at/timestamp/{timestamp}", response_model=Dict[str, int])
+async def address_balances_at_timestamp(
+    request: Request,
+    body: HistoricalBalancesRequest,
+    timestamp: int = Path(..., gt=0),
+    token_id: TokenID = Query(None, description="Optional token id"),
+):
+    """
+    ERG or token balances of many addresses at given timestamp.
+    """
+    query = queries.balances_at(body.addresses, "timestamp", timestamp, token_id)
+    return stream_balances(request, query)
 
 
 @r.get("/{address}/balance/at/height/{height}", response_model=int)
+@cached
 async def address_balance_at_height(
     request: Request,
     address: Address,
     height: int = Path(None, ge=0),
     token_id: TokenID = Query(None, description="Optional token id"),
 ):
-    opt_args = []
-    query = """
-        select sum(value) as value
-        from bal.erg_diffs
-        where address = $1 and height <= $2
-    """
-    if token_id is not None:
-        opt_args = [token_id]
-        query = """
-            select sum(value) as value
-            from bal.tokens_diffs
-            where address = $1
-                and height <= $2
-                and token_id = $3
-        """
     async with request.app.state.db.acquire() as conn:
-        row = await conn.fetchrow(query, address, height, *opt_args)
-        value = row["value"]
+        value = await queries.balance_at(conn, address, "height", height, token_id)
     if value is None:
         raise HTTPException(status_code=404, detail=DETAIL_404)
     return value
 
 
 @r.get("/{address}/balance/at/timestamp/{timestamp}", response_model=int)
+@cached
 async def address_balance_at_timestamp(
     request: Request,
     address: Address,
     timestamp: int = Path(..., gt=0),
     token_id: TokenID = Query(None, description="Optional token id"),
 ):
-    opt_args = []
-    query = """
-        select sum(d.value) as value
-        from bal.erg_diffs d
-        join core.headers h on h.height = d.height
-        where d.address = $1 and h.timestamp <= $2
-    """
-    if token_id is not None:
-        opt_args = [token_id]
-        query = """
-            select sum(value) as value
-            from bal.tokens_diffs d
-            join core.headers h on h.height = d.height
-            where address = $1
-                and h.timestamp <= $2
-                and token_id = $3
-        """
     async with request.app.state.db.acquire() as conn:
-        row = await conn.fetchrow(query, address, timestamp, *opt_args)
-        value = row["value"]
+        value = await queries.balance_at(
+            conn, address, "timestamp", timestamp, token_id
+        )
     if value is None:
         raise HTTPException(status_code=404, detail=DETAIL_404)
     return value
 
 
 @r.get("/{address}/balance/history")
+@trusted
+@cached
 async def address_balance_history(
     request: Request,
     address: Address,
@@ -114,40 +181,216 @@ async def address_balance_history(
         False, description="Include timestamps in addition to block heights"
     ),
     flat: bool | None = Query(True, description="Return data as flat arrays."),
-    limit: int | None = Query(50, gt=0, le=10000),
+    limit: int | None = Query(
+        None,
+        gt=0,
+        description=f"Defaults to 50, at most {HISTORY_LIMIT} unless streaming",
+    ),
     offset: int | None = Query(0, ge=0),
     desc: bool | None = Query(True, description="Most recent first"),
+    after_height: int | None = Query(
+        None, ge=0, description="Only include heights above this one"
+    ),
+    before_height: int | None = Query(
+        None, ge=0, description="Only include heights below this one"
+    ),
+    cursor: str | None = Query(
+        None,
+        description="Cursor of next page, as returned by previous one. Pass an empty value to get a first page.",
+    ),
+    format: StreamFormat | None = Query(
+        None, description="Stream full history as NDJSON or CSV"
+    ),
+    columnar: ColumnarFormat | None = Depends(negotiate),
 ):
     """
     ERG or token balance history of an address.
+
+    Passing any of `after_height`, `before_height` or `cursor` enables cursor
+    based pagination. Responses then include a `cursor` to be passed along
+    with the same parameters to get the next page (`null` on last page).
+    Unlike `offset`, the cost of a page does not depend on its depth.
+
+    Passing a `format` streams records as NDJSON or CSV instead. There is
+    no limit on the number of records in that mode.
+
+    Offset based histories are also available as Arrow streams or msgpack
+    (see `Accept` header), with `heights`, `timestamps` and `balances`
+    columns.
     """
-    query = f"""
-        select d.height
-            {', h.timestamp' if timestamps else ''}
-            , sum(d.value) over (order by d.height) as balance
-        from bal.{'erg' if token_id is None else 'tokens'}_diffs d
-        join core.headers h on h.height = d.height
-        where d.address = $1
-            {'' if token_id is None else 'and token_id = $4'}
-        order by 1 {'desc' if desc else ''}
-        limit $2 offset $3;
-    """
-    opt_args = [] if token_id is None else [token_id]
+    if format is not None:
+        if after_height is not None or before_height is not None or cursor is not None:
+            raise HTTPException(
+                status_code=422,
+                detail="Parameter `format` cannot be used with cursor based pagination",
+            )
+        return await _balance_history_stream(
+            request, address, token_id, timestamps, limit, offset, desc, format
+        )
+    if limit is None:
+        limit = 50
+    if limit > HISTORY_LIMIT:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Parameter `limit` cannot be higher than {HISTORY_LIMIT}",
+        )
+    if after_height is not None or before_height is not None or cursor is not None:
+        if offset:
+            raise HTTPException(
+                status_code=422,
+                detail="Parameter `offset` cannot be used with cursor based pagination",
+            )
+        return await _balance_history_page(
+            request,
+            address,
+            token_id,
+            timestamps,
+            flat,
+            limit,
+            desc,
+            after_height,
+            before_height,
+            cursor,
+        )
+    # Document is assembled by Postgres
+    if columnar is not None:
+        shape = queries.COLUMNS
+    elif flat:
+        shape = queries.ARRAYS
+    else:
+        shape = queries.RECORDS
     async with request.app.state.db.acquire() as conn:
-        rows = await conn.fetch(query, address, limit, offset, *opt_args)
-    if not rows:
+        row = await queries.balance_history(
+            conn, shape, address, token_id, timestamps, desc, limit, offset
+        )
+    if row["n"] == 0:
         raise HTTPException(status_code=404, detail=DETAIL_404)
+    if columnar is not None:
+        columns = queries.balance_history_columns(timestamps)
+        return columnar_response({f"{c}s": row[f"{c}s"] for c in columns}, columnar)
+    return json_response(row["doc"])
+
+
+async def _balance_history_stream(
+    request: Request,
+    address: Address,
+    token_id: TokenID | None,
+    timestamps: bool,
+    limit: int | None,
+    offset: int,
+    desc: bool,
+    format: StreamFormat,
+):
+    """
+    Streamed balance history.
+
+    Unknown addresses are checked for upfront, since errors can't be
+    reported once streaming has started.
+    """
+    async with request.app.state.db.acquire() as conn:
+        if not await queries.balance_history_exists(conn, address, token_id):
+            raise HTTPException(status_code=404, detail=DETAIL_404)
+    query = queries.balance_history_rows(
+        address, token_id, timestamps, desc, limit, offset
+    )
+    columns = queries.balance_history_columns(timestamps)
+    return stream_rows(request, query, format, columns)
+
+
+def encode_cursor(height: int, desc: bool) -> str:
+    """
+    Returns opaque cursor pointing past given height.
+    """
+    payload = json.dumps({"h": height, "desc": desc}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, desc: bool) -> int:
+    """
+    Returns height from cursor.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        height = payload["h"]
+        assert isinstance(height, int)
+        assert payload["desc"] == desc
+    except Exception:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    return height
+
+
+async def _balance_history_page(
+    request: Request,
+    address: str,
+    token_id: str | None,
+    timestamps: bool,
+    flat: bool,
+    limit: int,
+    desc: bool,
+    after_height: int | None,
+    before_height: int | None,
+    cursor: str | None,
+):
+    """
+    Cursor based balance history.
+
+    Seeks the page's diffs through the (address, height) index and derives
+    balances from that of the first height of the page.
+    """
+    if cursor:
+        # Cursor moves the bound we're paging towards
+        if desc:
+            before_height = decode_cursor(cursor, desc)
+        else:
+            after_height = decode_cursor(cursor, desc)
+    async with request.app.state.db.acquire() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            rows = await queries.balance_history_page(
+                conn,
+                address,
+                token_id,
+                timestamps,
+                desc,
+                after_height,
+                before_height,
+                limit + 1,
+            )
+            if not rows and not cursor:
+                # Distinguish empty pages from unknown addresses
+                if not await queries.balance_history_exists(conn, address, token_id):
+                    raise HTTPException(status_code=404, detail=DETAIL_404)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1]["height"], desc)
+            if rows:
+                # Balance at first height of page (desc) or prior to it (asc)
+                anchor_height = rows[0]["height"] - (0 if desc else 1)
+                anchor = await queries.balance_at(
+                    conn, address, "height", anchor_height, token_id
+                )
+    balances = []
+    balance = int(anchor or 0) if rows else 0
+    for row in rows:
+        if desc:
+            balances.append(balance)
+            balance -= int(row["value"])
+        else:
+            balance += int(row["value"])
+            balances.append(balance)
     if flat:
+        res = {"heights": [r["height"] for r in rows]}
         if timestamps:
-            return {
-                "heights": [r["height"] for r in rows],
-                "timestamps": [r["timestamp"] for r in rows],
-                "balances": [r["balance"] for r in rows],
-            }
-        else:
-            return {
-                "heights": [r["height"] for r in rows],
-                "balances": [r["balance"] for r in rows],
-            }
-    else:
-        return rows
+            res["timestamps"] = [r["timestamp"] for r in rows]
+        res["balances"] = balances
+        res["cursor"] = next_cursor
+        return res
+    records = []
+    for row, balance in zip(rows, balances):
+        record = {"height": row["height"]}
+        if timestamps:
+            record["timestamp"] = row["timestamp"]
+        record["balance"] = balance
+        records.append(record)
+    return {"records": records, "cursor": next_cursor}
@@ -8,6 +8,8 @@ GENESIS_TIMESTAMP = 1561978800000
 BLOCK_TIME_MS = 120_000
 HOUR_MS = 3_600_000
 DAY_MS = 86_400_000
+# Upper bound for open ended time windows
+MAX_TIMESTAMP = 2**63 - 1
 
 
 class TimeResolution(str, Enum):
@@ -21,15 +23,25 @@ class HistoryRecord(BaseModel):
     v: int
 
 
-def generate_time_window_limits(limit: int) -> Dict[TimeResolution, int]:
+def generate_time_window_limits(
+    limit: int, rollup_limit: int | None = None
+) -> Dict[TimeResolution, int]:
+    """
+    Returns max time window size for each resolution.
+
+    Hourly and daily records are read from rollup tables and can be given
+    a higher `rollup_limit`. Defaults to `limit` if omitted.
+    """
+    if rollup_limit is None:
+        rollup_limit = limit
     return {
         TimeResolution.block: BLOCK_TIME_MS * limit,
-        TimeResolution.hourly: HOUR_MS * limit,
-        TimeResolution.daily: DAY_MS * limit,
+        TimeResolution.hourly: HOUR_MS * rollup_limit,
+        TimeResolution.daily: DAY_MS * rollup_limit,
     }
 
 
-TimeWindowLimits = generate_time_window_limits(1000)
+TimeWindowLimits = generate_time_window_limits(1000, rollup_limit=10_000)
 
 from .utxos import utxos_router
 
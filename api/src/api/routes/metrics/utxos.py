@@ -1,24 +1,39 @@
 from typing import List
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import HTTPException
 from fastapi import Query
 from fastapi import Request
 
+from ... import queries
+from ...cache import cached
+from ...columnar import ColumnarFormat
+from ...columnar import columnar_response
+from ...columnar import negotiate
+from ...pgjson import json_response
+from ...responses import trusted
+from ...streaming import StreamFormat
+from ...streaming import stream_rows
+
 utxos_router = r = APIRouter()
 
 from . import GENESIS_TIMESTAMP
 from . import TimeResolution
 from . import TimeWindowLimits
 from . import HistoryRecord
-from . import HOUR_MS
-from . import DAY_MS
+from . import MAX_TIMESTAMP
 
 
 @r.get(
     "",
     response_model=List[HistoryRecord],
-    description=f"UTxO counts",
+    description=(
+        "UTxO counts. Also available as Arrow streams or msgpack "
+        "(see `Accept` header), with `t` and `v` columns."
+    ),
 )
+@trusted
+@cached
 async def count_history(
     request: Request,
     fr: int = Query(
@@ -35,54 +50,44 @@ async def count_history(
         default=TimeResolution.block,
         description="Time window resolution",
     ),
+    format: StreamFormat = Query(
+        default=None,
+        description="Stream records as NDJSON or CSV, without any time window limit",
+    ),
+    columnar: ColumnarFormat | None = Depends(negotiate),
 ):
+    if format is not None:
+        return _stream_fr_to(request, fr, to, r, format)
     if fr is not None and to is not None:
-        return await _count_fr_to(request, fr, to, r)
+        return await _count_fr_to(request, fr, to, r, columnar)
     time_interval_limit = TimeWindowLimits[r]
     if (fr, to) == (None, None):
-        return await _count_last(request, r)
+        return await _count_last(request, r, columnar)
     if fr is not None:
         to = fr + time_interval_limit
     else:
         fr = to - time_interval_limit
-    return await _count_fr_to(request, fr, to, r)
+    return await _count_fr_to(request, fr, to, r, columnar)
 
 
-async def _count_last(request: Request, r: TimeResolution):
-    if r == TimeResolution.block:
-        query = """
-            select h.timestamp
-                , m.value
-            from mtr.utxos m
-            join core.headers h on h.height = m.height
-            order by h.height desc
-            limit 1;
-        """
-    else:
-        round_ms = DAY_MS
-        if r == TimeResolution.hourly:
-            round_ms = HOUR_MS
-        query = f"""
-            with last_ts as (
-                select timestamp / {round_ms} * {round_ms} as timestamp
-                from core.headers
-                order by 1 desc
-                limit 1
-            )
-            select last_ts.timestamp
-                , m.value
-            from mtr.utxos m
-            join core.headers h on h.height = m.height, last_ts
-            where h.timestamp <= last_ts.timestamp
-            order by h.height desc 
-            limit 1;
-        """
+async def _count_last(
+    request: Request, r: TimeResolution, columnar: ColumnarFormat | None = None
+):
     async with request.app.state.db.acquire() as conn:
-        row = await conn.fetchrow(query)
+        row = await queries.utxo_count_last(conn, r.value)
+    if columnar is not None:
+        columns = {"t": [row["timestamp"]], "v": [row["value"]]}
+        return columnar_response(columns, columnar)
     return [{"t": row["timestamp"], "v": row["value"]}]
 
 
-async def _count_fr_to(request: Request, fr: int, to: int, r: TimeResolution):
+async def _count_fr_to(
+    request: Request,
+    fr: int,
+    to: int,
+    r: TimeResolution,
+    columnar: ColumnarFormat | None = None,
+):
     time_interval_limit = TimeWindowLimits[r]
     if fr > to:
         raise HTTPException(
@@ -94,49 +99,29 @@ async def _count_fr_to(request: Request, fr: int, to: int, r: TimeResolution):
             status_code=422,
             detail=f"Time window is limited to {time_interval_limit} for {r} resolution",
         )
-    if r == TimeResolution.block:
-        query = """
-            select h.timestamp
-                , m.value
-            from mtr.utxos m
-            join core.headers h on h.height = m.height
-            where h.timestamp >= $1 and h.timestamp <= $2
-            order by h.height;
-        """
-    else:
-        round_ms = DAY_MS
-        if r == TimeResolution.hourly:
-            round_ms = HOUR_MS
-        query = f"""
-            with tagged as (
-                select h.timestamp
-                    , m.value
-                    , lag(m.value) over w as previous_value
-                    , h.timestamp / {round_ms} - lag(h.timestamp / {round_ms}) over w = 1 as first_of_day
-                from mtr.utxos m
-                join core.headers h on h.height = m.height
-                -- Include 1 record prior to fr to ensure a previous value is always available
-                where h.height >= (
-                        select height-1
-                        from core.headers
-                        where timestamp >= $1
-                        order by 1
-                        limit 1
-                    )
-                    and h.timestamp <= $2
-                window w as (order by h.height)
-            )
-            select timestamp / {round_ms} * {round_ms} as timestamp
-                , case
-                    when timestamp % {round_ms} = 0 then value
-                    else previous_value
-                end as value
-            from tagged
-            where (first_of_day or timestamp % {round_ms} = 0)
-                -- In case the height-1 record we included turns out to have a round timestamp
-                and timestamp >= $1
-            order by 1;
-        """
+    shape = queries.RECORDS if columnar is None else queries.COLUMNS
     async with request.app.state.db.acquire() as conn:
-        rows = await conn.fetch(query, fr, to)
-    return [{"t": r["timestamp"], "v": r["value"]} for r in rows]
+        row = await queries.utxo_counts(conn, shape, r.value, fr, to)
+    if columnar is not None:
+        return columnar_response({"t": row["t"], "v": row["v"]}, columnar)
+    return json_response(row["doc"])
+
+
+def _stream_fr_to(
+    request: Request,
+    fr: int | None,
+    to: int | None,
+    r: TimeResolution,
+    format: StreamFormat,
+):
+    if fr is not None and to is not None and fr > to:
+        raise HTTPException(
+            status_code=422,
+            detail="Parameter `fr` cannot be higher than `to`",
+        )
+    if fr is None:
+        fr = GENESIS_TIMESTAMP
+    if to is None:
+        to = MAX_TIMESTAMP
+    query = queries.utxo_count_rows(r.value, fr, to)
+    return stream_rows(request, query, format, ["t", "v"])
@@ -3,12 +3,15 @@ from fastapi import Query
 from fastapi import Request
 
 
+from .. import queries
+from ..cache import cached
 from ..models import TokenID
 
 p2pk_router = r = APIRouter()
 
 
 @r.get("/count", response_model=int, name="Number of P2PK addresses")
+@cached
 async def get_p2pk_address_count(
     request: Request,
     token_id: TokenID = Query(None, description="Optional token id"),
@@ -26,23 +29,7 @@ async def get_p2pk_address_count(
     """
     Current P2PK addresses count.
     """
-    query = f"""
-        select count(*) as cnt
-        from bal.erg
-        where address like '9%' and length(address) = 51
-    """
-    args = []
-    if token_id is not None:
-        args.append(token_id)
-        query = query.replace("bal.erg", "bal.tokens")
-        query += f" and token_id = $1"
-    if bal_ge is not None:
-        args.append(bal_ge)
-        query += f" and value >= ${len(args)}"
-    if bal_lt is not None:
-        args.append(bal_lt)
-        query += f" and value < ${len(args)}"
-
     async with request.app.state.db.acquire() as conn:
-        res = await conn.fetchrow(query, *args)
-        return res["cnt"]
+        return await queries.address_count(
+            conn, queries.P2PK, token_id, bal_ge, bal_lt
+        )
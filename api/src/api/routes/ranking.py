@@ -4,6 +4,10 @@ from fastapi import Request
 from pydantic import BaseModel
 from pydantic import constr
 
+from .. import queries
+from ..cache import cached
+from ..responses import trusted
+
 
 ranking_router = r = APIRouter()
 
@@ -24,6 +28,8 @@ class RankResponse(BaseModel):
 
 
 @r.get("/{p2pk_address}", response_model=RankResponse, name="P2PK address rank")
+@trusted
+@cached
 async def p2pk_address_rank(
     request: Request,
     p2pk_address: P2PKAddress,
@@ -32,62 +38,22 @@ async def p2pk_address_rank(
     Get the rank of a P2PK address by current balance.
     Includes next and previous addresses as well.
     """
-    query = f"""
-        with ranked_p2pk as (
-            select rank() over (order by value desc)
-                , address
-                , value
-            from bal.erg
-            where address like '9%'
-                and length(address) = 51
-            order by address desc
-        ), target as (
-            select rank
-                , address
-                , value
-            from ranked_p2pk
-            where address = $1
-        )
-        -- Target address
-        select 'target' as label
-            , rank
-            , value
-            , address
-        from target
-        union
-        -- First higher ranked
-        select * from (
-            select 'above' as label
-                , p.rank
-                , p.value
-                , p.address
-            from ranked_p2pk p, target t
-            where p.rank < t.rank
-            order by p.rank desc, p.address
-            limit 1
-        ) above
-        union
-        -- First lower ranked
-        select * from (
-            select 'under' as label
-                , p.rank
-                , p.value
-                , p.address
-            from ranked_p2pk p, target t
-            where p.rank > t.rank
-            order by p.rank, p.address
-            limit 1
-        ) under
-    """
+    # Use in-memory index when in sync with current head
+    index = request.app.state.p2pk_index
+    if index.ready and index.head == request.app.state.head.head:
+        res = index.rank(p2pk_address)
+        if res is None:
+            raise HTTPException(status_code=404, detail="Address not found")
+        return res
     async with request.app.state.db.acquire() as conn:
-        rows = await conn.fetch(query, p2pk_address)
+        rows = await queries.p2pk_rank(conn, p2pk_address)
         if not rows:
             raise HTTPException(status_code=404, detail="Address not found")
-        return {
-            row["label"]: {
+        res = {"above": None, "target": None, "under": None}
+        for row in rows:
+            res[row["label"]] = {
                 "rank": row["rank"],
                 "address": row["address"],
                 "balance": row["value"],
             }
-            for row in rows
-        }
+        return res
@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from fastapi import HTTPException
 from fastapi import Request
 from pydantic import BaseModel
 
@@ -11,9 +12,10 @@ class Status(BaseModel):
 
 @r.get("/sync_height", response_model=Status)
 async def sync_height(request: Request):
-    query = "select height from core.headers order by 1 desc limit 1;"
-    async with request.app.state.db.acquire() as conn:
-        row = await conn.fetchrow(query)
-        return {
-            "height": row["height"],
-        }
+    # Kept up to date by watcher notifications, no need to query the db
+    height = request.app.state.head.height
+    if height is None:
+        raise HTTPException(status_code=404, detail="No blocks found")
+    return {
+        "height": height,
+    }
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Streamed responses for large result sets.
+
+Rows are pulled through a server-side cursor and encoded as they arrive,
+so memory use stays flat regardless of the size of the result set.
+"""
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator
+from typing import Callable
+from typing import List
+
+from asyncpg import Record
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .queries import BoundQuery
+
+# Number of rows fetched and encoded at once
+CHUNK_SIZE = 1000
+
+
+class StreamFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    StreamFormat.ndjson: "application/x-ndjson",
+    StreamFormat.csv: "text/csv",
+}
+
+
+async def iter_chunks(
+    request: Request, query: BoundQuery
+) -> AsyncIterator[List[Record]]:
+    """
+    Yields lists of up to `CHUNK_SIZE` rows returned by given query.
+
+    The connection is held until the last chunk has been consumed.
+    """
+    async with request.app.state.db.acquire() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            chunk = []
+            async for row in query.cursor(conn, prefetch=CHUNK_SIZE):
+                chunk.append(row)
+                if len(chunk) == CHUNK_SIZE:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+
+def encode_ndjson(rows: List[Record], columns: List[str]) -> str:
+    return "".join(json.dumps({c: r[c] for c in columns}) + "\n" for r in rows)
+
+
+def encode_csv(rows: List[Record], columns: List[str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([r[c] for c in columns] for r in rows)
+    return buffer.getvalue()
+
+
+ENCODERS: dict[StreamFormat, Callable[[List[Record], List[str]], str]] = {
+    StreamFormat.ndjson: encode_ndjson,
+    StreamFormat.csv: encode_csv,
+}
+
+
+def stream_rows(
+    request: Request,
+    query: BoundQuery,
+    format: StreamFormat,
+    columns: List[str],
+) -> StreamingResponse:
+    """
+    Streams rows of given query as NDJSON or CSV.
+
+    Only listed `columns` are included, in that order. CSV output starts
+    with a header line.
+    """
+    encode = ENCODERS[format]
+
+    async def generate():
+        if format == StreamFormat.csv:
+            yield ",".join(columns) + "\n"
+        async for chunk in iter_chunks(request, query):
+            yield encode(chunk, columns)
+
+    return StreamingResponse(generate(), media_type=MEDIA_TYPES[format])
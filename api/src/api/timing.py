@@ -0,0 +1,85 @@
+"""
+Per request timings.
+
+Time spent waiting for pool connections, running db queries and serializing
+responses is accumulated into the current request's `RequestTimings`, held
+in a context variable. Tasks spawned while handling a request (e.g. cached
+computations) inherit it.
+
+Outside of requests, nothing is recorded.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+ACQUIRE = "acquire"
+DB = "db"
+SERIALIZE = "serialize"
+
+
+class RequestTimings:
+    """
+    Durations (in seconds) spent in each phase of a request.
+    """
+
+    __slots__ = ("durations", "slowest_query")
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {ACQUIRE: 0.0, DB: 0.0, SERIALIZE: 0.0}
+        # asyncpg LoggedQuery record of slowest query
+        self.slowest_query = None
+
+    def server_timing(self, total: float) -> str:
+        """
+        Returns value of a Server-Timing header, durations in milliseconds.
+        """
+        metrics = [*self.durations.items(), ("total", total)]
+        return ", ".join(f"{name};dur={dur * 1000:.2f}" for name, dur in metrics)
+
+
+_timings: ContextVar[RequestTimings | None] = ContextVar("timings", default=None)
+
+
+@contextmanager
+def collect():
+    """
+    Collects timings of the with block, yielding a RequestTimings.
+    """
+    timings = RequestTimings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def add(phase: str, duration: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.durations[phase] += duration
+
+
+def add_query(record):
+    """
+    Records an asyncpg LoggedQuery.
+    """
+    timings = _timings.get()
+    if timings is None:
+        return
+    timings.durations[DB] += record.elapsed
+    slowest = timings.slowest_query
+    if slowest is None or record.elapsed > slowest.elapsed:
+        timings.slowest_query = record
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    Adds duration of the with block to given phase.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(phase, time.perf_counter() - t0)
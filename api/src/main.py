@@ -12,6 +12,17 @@ try:
     from api.routes.tokens import tokens_router
     from api.routes.status import status_router
     from api.routes.metrics import metrics_router
+    from api.balance_index import P2PKBalanceIndex
+    from api.cache import ResponseCache
+    from api.conditional import conditional_requests
+    from api.head import HeadTracker
+    from api.monitoring import InstrumentedPool
+    from api.monitoring import instrument
+    from api.monitoring import instrument_connection
+    from api.queries import Connection
+    from api.queries import init_connection
+    from api.queries import statement_cache_size
+    from api.responses import FastJSONResponse
 except ImportError:
     # When running pytest
     from .api.routes.addresses import addresses_router
@@ -21,6 +32,17 @@ except ImportError:
     from .api.routes.tokens import tokens_router
     from .api.routes.status import status_router
     from .api.routes.metrics import metrics_router
+    from .api.balance_index import P2PKBalanceIndex
+    from .api.cache import ResponseCache
+    from .api.conditional import conditional_requests
+    from .api.head import HeadTracker
+    from .api.monitoring import InstrumentedPool
+    from .api.monitoring import instrument
+    from .api.monitoring import instrument_connection
+    from .api.queries import Connection
+    from .api.queries import init_connection
+    from .api.queries import statement_cache_size
+    from .api.responses import FastJSONResponse
 
 root_path = "/api/v0"
 description = f"""
@@ -43,10 +65,10 @@ Endpoints under `/metrics` take the following query parameters to define a time
 - `to`: last timestamp of time window
 - `r`: resolution of time window, one of `block`, `1h` or `24h`
 
-The distance between `fr` and `to` should not exceed 1000 times the resolution size, allowing for the following time windows:
+The distance between `fr` and `to` should not exceed 1000 times the resolution size for `block` level records and 10,000 times for `1h` and `24h` ones, allowing for the following time windows:
 - `block`: 120,000 ms * 1000 (~1.4 days, assuming 120 second blocks)
-- `1h`: 3,600,000 ms * 1000 (~41 days)
-- `24h`: 86,400,000 ms * 1000 (~2.7 years)
+- `1h`: 3,600,000 ms * 10,000 (~1.1 years)
+- `24h`: 86,400,000 ms * 10,000 (~27 years)
 
 If `r` is omitted, default `block` level is used.
 
@@ -84,6 +106,7 @@ app = FastAPI(
     description=description,
     openapi_tags=tags_metadata,
     root_path=root_path,
+    default_response_class=FastJSONResponse,
 )
 
 if "DEVMODE" in os.environ:
@@ -95,6 +118,16 @@ if "DEVMODE" in os.environ:
         allow_headers=["*"],
     )
 
+app.middleware("http")(conditional_requests)
+
+# Prometheus metrics, kept apart from the /metrics data routes
+instrument(app, "/internal/metrics")
+
+
+async def setup_connection(conn: Connection):
+    await init_connection(conn)
+    instrument_connection(conn)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -104,7 +137,34 @@ async def startup_event():
     user = os.getenv("POSTGRES_USER", "ergo")
     pw = os.getenv("POSTGRES_PASSWORD")
     dsn = f"postgresql://{user}:{pw}@{host}:{port}/{db}"
-    app.state.db = await asyncpg.create_pool(dsn)
+    # Registered queries are prepared on each new connection
+    pool = await asyncpg.create_pool(
+        dsn,
+        connection_class=Connection,
+        init=setup_connection,
+        statement_cache_size=statement_cache_size(),
+    )
+    app.state.db = InstrumentedPool(pool)
+    app.state.cache = ResponseCache(maxsize=int(os.getenv("CACHE_SIZE", "10000")))
+    app.state.head = HeadTracker(app.state.db, dsn)
+    app.state.head.subscribe(app.state.cache.on_new_head)
+    app.state.p2pk_index = P2PKBalanceIndex(app.state.db)
+    app.state.head.subscribe(app.state.p2pk_index.on_new_head)
+    app.state.finality_depth = int(os.getenv("FINALITY_DEPTH", "720"))
+    slow_request_ms = os.getenv("SLOW_REQUEST_MS")
+    app.state.slow_request_threshold = (
+        None if slow_request_ms is None else int(slow_request_ms) / 1000
+    )
+    app.state.explain_slow_requests = "DEVMODE" in os.environ
+    await app.state.head.start()
+    app.state.p2pk_index.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await app.state.head.stop()
+    await app.state.p2pk_index.stop()
+    await app.state.db.close()
 
 
 app.include_router(status_router, tags=["status"])
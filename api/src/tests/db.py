@@ -1,3 +1,4 @@
+import hashlib
 import os
 from pathlib import Path
 import platform
@@ -14,7 +15,13 @@ from local import DB_HOST, DB_PORT, DB_USER, DB_PASS
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
+# Each pytest-xdist worker uses its own db (and templates)
 TEST_DB_NAME = "ew_api_pytest"
+if "PYTEST_XDIST_WORKER" in os.environ:
+    TEST_DB_NAME += f"_{os.environ['PYTEST_XDIST_WORKER']}"
+
+# Template dbs known to exist
+_templates = set()
 
 os.environ["POSTGRES_HOST"] = DB_HOST
 os.environ["POSTGRES_PORT"] = str(DB_PORT)
@@ -38,32 +45,91 @@ def conn_str(dbname: str) -> str:
     return f"host={DB_HOST} port={DB_PORT} dbname={dbname} user={DB_USER} password={DB_PASS}"
 
 
+def drop_db(dbname: str):
+    with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                SQL("drop database if exists {} with (force);").format(
+                    Identifier(dbname)
+                )
+            )
+
+
+def create_template(prefix: str, sql: str) -> str:
+    """
+    Return name of a template db initialized with given sql.
+
+    Templates are named after a hash of their sql and kept between sessions,
+    so they only get created again when the sql changes. Stale templates
+    with the same prefix are dropped then.
+    """
+    digest = hashlib.sha1(sql.encode()).hexdigest()[:12]
+    dbname = f"{prefix}_{digest}"
+    if dbname in _templates:
+        return dbname
+    with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "select datname from pg_database where datname ~ %s;",
+                [f"^{prefix}_[0-9a-f]{{12}}(_init)?$"],
+            )
+            existing = [row[0] for row in cur.fetchall()]
+    for name in existing:
+        if name != dbname:
+            drop_db(name)
+    if dbname not in existing:
+        # Initialize under another name first, so an interrupted session
+        # does not leave a partially initialized template behind.
+        init_dbname = f"{dbname}_init"
+        with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(SQL("create database {};").format(Identifier(init_dbname)))
+        with pg.connect(conn_str(init_dbname)) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+        with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    SQL("alter database {} rename to {};").format(
+                        Identifier(init_dbname), Identifier(dbname)
+                    )
+                )
+    _templates.add(dbname)
+    return dbname
+
+
 class MockDB:
-    def __init__(self, set_constraints: bool = True, sql: str = None):
-        self._dbname: str = TEST_DB_NAME
+    """
+    Creates a test db as a copy of a template db holding the schema,
+    then loads given sql into it.
+    """
+
+    def __init__(
+        self, set_constraints: bool = True, sql: str = None, dbname: str = TEST_DB_NAME
+    ):
+        self._dbname: str = dbname
+        variant = "constrained" if set_constraints else "unconstrained"
+        self._template_prefix: str = f"{dbname}_template_{variant}"
         with open(SCHEMA_PATH) as f:
-            self._sql = f.read()
+            self._template_sql = f.read()
         if set_constraints:
             with open(CONSTRAINTS_PATH) as f:
-                self._sql += f.read()
-        if sql is not None:
-            self._sql += sql
+                self._template_sql += f.read()
+        self._sql = sql
 
     def _create_db(self):
-        with pg.connect(conn_str("postgres"), autocommit=True) as conn:
-            with conn.cursor() as cur:
-                cur.execute(SQL("create database {};").format(Identifier(self._dbname)))
-
-    def _drop_db(self):
+        template = create_template(self._template_prefix, self._template_sql)
         with pg.connect(conn_str("postgres"), autocommit=True) as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    SQL("drop database {} with (force);").format(
-                        Identifier(self._dbname)
+                    SQL("create database {} template {};").format(
+                        Identifier(self._dbname), Identifier(template)
                     )
                 )
 
     def _init_db(self):
+        if self._sql is None:
+            return
         with pg.connect(conn_str(self._dbname)) as conn:
             with conn.cursor() as cur:
                 cur.execute(self._sql)
@@ -74,4 +140,4 @@ class MockDB:
         return self._dbname
 
     def __exit__(self, exception_type, exception_value, traceback):
-        self._drop_db()
+        drop_db(self._dbname)
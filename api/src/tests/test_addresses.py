@@ -1,3 +1,5 @@
+import msgpack
+import pyarrow as pa
 import pytest
 
 from fastapi.testclient import TestClient
@@ -35,6 +37,16 @@ def client():
         ('addr1', '{TOKEN_B}', 800),
         ('addr2', '{TOKEN_A}', 200);
 
+        -- checkpoints every 20 blocks
+        insert into bal.erg_checkpoints (address, height, value) values
+        ('addr1', 20, 3000),
+        ('addr2', 20, 2000);
+
+        insert into bal.tokens_checkpoints (address, token_id, height, value) values
+        ('addr1', '{TOKEN_A}', 20, 300),
+        ('addr1', '{TOKEN_B}', 20, 800),
+        ('addr2', '{TOKEN_A}', 20, 200);
+
         insert into core.headers (height, id, parent_id, timestamp) values 
         (10, 'header10', 'header09', 1567123456789),
         (20, 'header20', 'header19', 1568123456789),
@@ -505,3 +517,243 @@ class TestBalanceHistory:
         response = client.get(url)
         assert response.status_code == 404
         assert response.json()["detail"] == "No balance found"
+
+
+class TestBalanceHistoryCursor:
+    url = "/addresses/addr1/balance/history"
+
+    def test_pages_desc(self, client):
+        response = client.get(self.url + "?cursor=&limit=2")
+        assert response.status_code == 200
+        page = response.json()
+        assert page["heights"] == [30, 20]
+        assert page["balances"] == [4000, 3000]
+        assert page["cursor"] is not None
+
+        response = client.get(self.url + f"?cursor={page['cursor']}&limit=2")
+        assert response.status_code == 200
+        assert response.json() == {
+            "heights": [10],
+            "balances": [5000],
+            "cursor": None,
+        }
+
+    def test_pages_asc(self, client):
+        url = self.url + f"?desc=false&limit=1&token_id={TOKEN_A}&timestamps=true"
+        response = client.get(url + "&after_height=10")
+        assert response.status_code == 200
+        page = response.json()
+        assert page["heights"] == [20]
+        assert page["timestamps"] == [1568123456789]
+        assert page["balances"] == [300]
+
+        response = client.get(url + f"&after_height=10&cursor={page['cursor']}")
+        assert response.status_code == 200
+        page = response.json()
+        assert page["heights"] == [30]
+        assert page["balances"] == [400]
+        assert page["cursor"] is None
+
+    def test_height_bounds(self, client):
+        response = client.get(self.url + "?after_height=10&before_height=30")
+        assert response.status_code == 200
+        assert response.json() == {
+            "heights": [20],
+            "balances": [3000],
+            "cursor": None,
+        }
+
+    def test_empty_page(self, client):
+        response = client.get(self.url + "?after_height=30")
+        assert response.status_code == 200
+        assert response.json() == {
+            "heights": [],
+            "balances": [],
+            "cursor": None,
+        }
+
+    def test_nested(self, client):
+        response = client.get(self.url + "?before_height=30&flat=false")
+        assert response.status_code == 200
+        assert response.json() == {
+            "records": [
+                {"height": 20, "balance": 3000},
+                {"height": 10, "balance": 5000},
+            ],
+            "cursor": None,
+        }
+
+    def test_unknown_address(self, client):
+        response = client.get("/addresses/unknownaddress/balance/history?cursor=")
+        assert response.status_code == 404
+
+    def test_invalid_cursor(self, client):
+        response = client.get(self.url + "?cursor=notacursor")
+        assert response.status_code == 422
+        assert response.json()["detail"] == "Invalid cursor"
+
+    def test_cursor_direction_must_match(self, client):
+        response = client.get(self.url + "?cursor=&limit=1")
+        cursor = response.json()["cursor"]
+        response = client.get(self.url + f"?cursor={cursor}&limit=1&desc=false")
+        assert response.status_code == 422
+
+    def test_offset_not_allowed(self, client):
+        response = client.get(self.url + "?cursor=&offset=1")
+        assert response.status_code == 422
+
+
+class TestBatchBalances:
+    url = "/addresses/balances"
+
+    def test_balances(self, client):
+        response = client.post(
+            self.url, json={"addresses": ["addr1", "addr2", "unknownaddress"]}
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "addr1": {"erg": 4000, "tokens": {TOKEN_A: 400, TOKEN_B: 800}},
+            "addr2": {"erg": 2000, "tokens": {TOKEN_A: 200}},
+            "unknownaddress": {"erg": 0, "tokens": {}},
+        }
+
+    def test_token_ids(self, client):
+        response = client.post(
+            self.url,
+            json={"addresses": ["addr1", "addr2"], "token_ids": [TOKEN_B, TOKEN_X]},
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "addr1": {"erg": 4000, "tokens": {TOKEN_B: 800}},
+            "addr2": {"erg": 2000, "tokens": {}},
+        }
+
+    def test_empty_list(self, client):
+        response = client.post(self.url, json={"addresses": []})
+        assert response.status_code == 422
+
+    def test_too_many_addresses(self, client):
+        addresses = [f"addr{i}" for i in range(1001)]
+        response = client.post(self.url, json={"addresses": addresses})
+        assert response.status_code == 422
+
+
+class TestBalanceHistoryStream:
+    url = "/addresses/addr1/balance/history"
+
+    def test_ndjson(self, client):
+        response = client.get(self.url + "?format=ndjson")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.text.splitlines() == [
+            '{"height": 30, "balance": 4000}',
+            '{"height": 20, "balance": 3000}',
+            '{"height": 10, "balance": 5000}',
+        ]
+
+    def test_csv(self, client):
+        url = self.url + f"?format=csv&desc=false&timestamps=true&token_id={TOKEN_A}"
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.text.splitlines() == [
+            "height,timestamp,balance",
+            "10,1567123456789,500",
+            "20,1568123456789,300",
+            "30,1569123456789,400",
+        ]
+
+    def test_limit_offset(self, client):
+        response = client.get(self.url + "?format=csv&limit=1&offset=1")
+        assert response.status_code == 200
+        assert response.text.splitlines() == ["height,balance", "20,3000"]
+
+    def test_no_history_limit(self, client):
+        response = client.get(self.url + "?format=ndjson&limit=10001")
+        assert response.status_code == 200
+        response = client.get(self.url + "?limit=10001")
+        assert response.status_code == 422
+
+    def test_unknown_address(self, client):
+        response = client.get("/addresses/unknownaddress/balance/history?format=csv")
+        assert response.status_code == 404
+
+    def test_cursor_not_allowed(self, client):
+        response = client.get(self.url + "?format=csv&cursor=")
+        assert response.status_code == 422
+
+    def test_invalid_format(self, client):
+        response = client.get(self.url + "?format=xml")
+        assert response.status_code == 422
+
+
+class TestBalanceHistoryColumnar:
+    url = "/addresses/addr1/balance/history"
+
+    def test_arrow(self, client):
+        headers = {"Accept": "application/vnd.apache.arrow.stream"}
+        response = client.get(self.url + "?timestamps=true", headers=headers)
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column_names == ["heights", "timestamps", "balances"]
+        assert table.to_pydict() == {
+            "heights": [30, 20, 10],
+            "timestamps": [1569123456789, 1568123456789, 1567123456789],
+            "balances": [4000, 3000, 5000],
+        }
+
+    def test_msgpack(self, client):
+        headers = {"Accept": "application/msgpack"}
+        url = self.url + f"?desc=false&token_id={TOKEN_A}"
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert msgpack.unpackb(response.content) == {
+            "heights": [10, 20, 30],
+            "balances": [500, 300, 400],
+        }
+
+    def test_unknown_address(self, client):
+        headers = {"Accept": "application/msgpack"}
+        response = client.get(
+            "/addresses/unknownaddress/balance/history", headers=headers
+        )
+        assert response.status_code == 404
+
+
+class TestBatchBalancesAt:
+    def test_at_height(self, client):
+        body = {"addresses": ["addr1", "addr2", "unknownaddress", "addr1"]}
+        response = client.post("/addresses/balances/at/height/25", json=body)
+        assert response.status_code == 200
+        assert response.json() == {"addr1": 3000, "addr2": 2000, "unknownaddress": 0}
+
+        response = client.post(
+            f"/addresses/balances/at/height/100?token_id={TOKEN_A}", json=body
+        )
+        assert response.status_code == 200
+        assert response.json() == {"addr1": 400, "addr2": 200, "unknownaddress": 0}
+
+    def test_at_height_before_checkpoint(self, client):
+        body = {"addresses": ["addr1", "addr2"]}
+        response = client.post("/addresses/balances/at/height/10", json=body)
+        assert response.status_code == 200
+        assert response.json() == {"addr1": 5000, "addr2": 0}
+
+    def test_at_timestamp(self, client):
+        body = {"addresses": ["addr1", "addr2"]}
+        response = client.post(
+            f"/addresses/balances/at/timestamp/{1568123456789 + 1}", json=body
+        )
+        assert response.status_code == 200
+        assert response.json() == {"addr1": 3000, "addr2": 2000}
+
+        response = client.post(
+            f"/addresses/balances/at/timestamp/{1567123456789}?token_id={TOKEN_A}",
+            json=body,
+        )
+        assert response.status_code == 200
+        assert response.json() == {"addr1": 500, "addr2": 0}
+
+    def test_empty_list(self, client):
+        response = client.post("/addresses/balances/at/height/10", json={"addresses": []})
+        assert response.status_code == 422
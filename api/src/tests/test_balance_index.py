@@ -0,0 +1,114 @@
+import time
+import pytest
+
+import psycopg as pg
+from fastapi.testclient import TestClient
+
+from ..main import app
+from .db import MockDB
+from .db import conn_str
+
+ADDR_1 = "9addr1xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+ADDR_2 = "9addr2xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+ADDR_3 = "9addr3xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+CONTRACT = "4contractxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+
+
+@pytest.fixture(scope="module")
+def db_name():
+    sql = f"""
+        insert into core.headers (height, id, parent_id, timestamp) values
+        (10, 'header10', 'header09', 1567123456789);
+
+        insert into bal.erg_diffs (address, height, tx_id, value) values
+        ('{ADDR_1}', 10, 'tx_1', 3000),
+        ('{ADDR_2}', 10, 'tx_1', 2000),
+        ('{CONTRACT}', 10, 'tx_1', 9000);
+
+        insert into bal.erg (address, value) values
+        ('{ADDR_1}', 3000),
+        ('{ADDR_2}', 2000),
+        ('{CONTRACT}', 9000);
+    """
+    with MockDB(sql=sql) as db_name:
+        yield db_name
+
+
+@pytest.fixture(scope="module")
+def client(db_name):
+    with TestClient(app) as client:
+        wait_for_index(10)
+        yield client
+
+
+def wait_for_index(height: int, timeout: float = 2):
+    start = time.time()
+    index = app.state.p2pk_index
+    while index.head is None or index.head.height != height:
+        assert time.time() - start < timeout
+        time.sleep(0.01)
+
+
+def execute(db_name: str, sql: str, notification: str):
+    with pg.connect(conn_str(db_name), autocommit=True) as conn:
+        conn.execute(sql)
+        conn.execute("select pg_notify('ew_blocks', %s);", [notification])
+
+
+def rank(client, address: str) -> int:
+    response = client.get(f"/ranking/{address}")
+    assert response.status_code == 200
+    return response.json()["target"]["rank"]
+
+
+def test_contracts_are_not_indexed(client):
+    assert len(app.state.p2pk_index) == 2
+    assert app.state.p2pk_index.rank(CONTRACT) is None
+
+
+def test_new_block_and_rollback(client, db_name):
+    assert rank(client, ADDR_1) == 1
+    assert rank(client, ADDR_2) == 2
+
+    # New block: addr2 overtakes addr1, addr3 receives funds
+    execute(
+        db_name,
+        f"""
+        insert into core.headers (height, id, parent_id, timestamp) values
+        (11, 'header11', 'header10', 1567123556789);
+        insert into bal.erg_diffs (address, height, tx_id, value) values
+        ('{ADDR_1}', 11, 'tx_2', -1000),
+        ('{ADDR_2}', 11, 'tx_2', 2000),
+        ('{ADDR_3}', 11, 'tx_2', 1000);
+        update bal.erg set value = 2000 where address = '{ADDR_1}';
+        update bal.erg set value = 4000 where address = '{ADDR_2}';
+        insert into bal.erg (address, value) values ('{ADDR_3}', 1000);
+        """,
+        '{"event": "include", "height": 11, "header_id": "header11", "parent_id": "header10"}',
+    )
+    wait_for_index(11)
+    assert len(app.state.p2pk_index) == 3
+    assert app.state.p2pk_index.rank(ADDR_2) == {
+        "above": None,
+        "target": {"rank": 1, "address": ADDR_2, "balance": 4000},
+        "under": {"rank": 2, "address": ADDR_1, "balance": 2000},
+    }
+    assert rank(client, ADDR_3) == 3
+
+    # Rolling back block 11 restores previous ranking
+    execute(
+        db_name,
+        f"""
+        delete from core.headers where height = 11;
+        delete from bal.erg_diffs where height = 11;
+        update bal.erg set value = 3000 where address = '{ADDR_1}';
+        update bal.erg set value = 2000 where address = '{ADDR_2}';
+        delete from bal.erg where address = '{ADDR_3}';
+        """,
+        '{"event": "rollback", "height": 11, "header_id": "header11", "parent_id": "header10"}',
+    )
+    wait_for_index(10)
+    assert len(app.state.p2pk_index) == 2
+    assert rank(client, ADDR_1) == 1
+    assert rank(client, ADDR_2) == 2
+    assert client.get(f"/ranking/{ADDR_3}").status_code == 404
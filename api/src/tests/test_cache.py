@@ -0,0 +1,181 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import psycopg as pg
+from fastapi.testclient import TestClient
+
+from ..main import app
+from ..api.cache import ResponseCache
+from ..api.cache import cached
+from ..api.head import Head
+from .db import MockDB
+from .db import conn_str
+
+P2PK_1 = "9addr1xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+P2PK_2 = "9addr2xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+
+
+@pytest.fixture(scope="module")
+def db_name():
+    sql = f"""
+        insert into core.headers (height, id, parent_id, timestamp) values
+        (10, 'header10', 'header09', 1567123456789);
+
+        insert into bal.erg (address, value) values
+        ('{P2PK_1}', 1000000);
+    """
+    with MockDB(sql=sql) as db_name:
+        yield db_name
+
+
+@pytest.fixture(scope="module")
+def client(db_name):
+    with TestClient(app) as client:
+        yield client
+
+
+def wait_for_height(height: int, timeout: float = 2):
+    start = time.time()
+    while app.state.head.height != height:
+        assert time.time() - start < timeout
+        time.sleep(0.01)
+
+
+def test_served_from_cache_until_new_block(client, db_name):
+    url = "/p2pk/count"
+    assert client.get(url).json() == 1
+
+    # Change data without changing the head
+    with pg.connect(conn_str(db_name)) as conn:
+        conn.execute(f"insert into bal.erg (address, value) values ('{P2PK_2}', 5);")
+    assert client.get(url).json() == 1
+
+    # New block invalidates the cache
+    with pg.connect(conn_str(db_name)) as conn:
+        conn.execute(
+            "insert into core.headers (height, id, parent_id, timestamp) values "
+            "(11, 'header11', 'header10', 1567123556789);"
+        )
+        conn.execute(
+            "select pg_notify('ew_blocks', %s);",
+            [
+                '{"event": "include", "height": 11, "header_id": "header11", "parent_id": "header10"}'
+            ],
+        )
+    wait_for_height(11)
+    assert client.get(url).json() == 2
+
+
+def test_params_are_normalized(client):
+    cache = app.state.cache
+    client.get("/p2pk/count?bal_ge=1&bal_lt=2000000")
+    hits = cache.hits
+    client.get("/p2pk/count?bal_lt=2000000&bal_ge=1")
+    assert cache.hits == hits + 1
+
+
+def test_errors_are_not_cached(client):
+    cache = app.state.cache
+    size = len(cache)
+    response = client.get("/addresses/unknownaddress/balance")
+    assert response.status_code == 404
+    assert len(cache) == size
+
+
+def test_cached_raw_json_responses(client):
+    url = "/metrics/utxos?fr=1567123456789&to=1567123456789"
+    first = client.get(url)
+    second = client.get(url)
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert first.json() == second.json() == []
+
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def make_request(cache: ResponseCache):
+    state = SimpleNamespace(head=SimpleNamespace(head=Head(1, "header1")), cache=cache)
+    return SimpleNamespace(app=SimpleNamespace(state=state))
+
+
+def test_concurrent_calls_are_coalesced():
+    calls = []
+
+    @cached
+    async def route(request, x: int):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def main():
+        cache = ResponseCache()
+        request = make_request(cache)
+        results = await asyncio.gather(
+            *[route(request=request, x=1) for _ in range(5)],
+            route(request=request, x=2),
+        )
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert results == [2, 2, 2, 2, 2, 4]
+    assert calls == [1, 2]
+    assert cache.coalesced == 4
+    assert cache.inflight == {}
+
+
+def test_coalesced_errors_are_shared():
+    calls = []
+
+    @cached
+    async def route(request, x: int):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        raise ValueError(x)
+
+    async def main():
+        cache = ResponseCache()
+        request = make_request(cache)
+        results = await asyncio.gather(
+            *[route(request=request, x=1) for _ in range(3)],
+            return_exceptions=True,
+        )
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert calls == [1]
+    assert len(cache) == 0
+
+
+def test_coalesced_call_survives_cancellation():
+    calls = []
+
+    @cached
+    async def route(request, x: int):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x
+
+    async def main():
+        request = make_request(ResponseCache())
+        first = asyncio.create_task(route(request=request, x=1))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(route(request=request, x=1))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 1
+    assert calls == [1]
@@ -0,0 +1,48 @@
+import msgpack
+import pyarrow as pa
+import pytest
+from starlette.requests import Request
+
+from ..api.columnar import ColumnarFormat
+from ..api.columnar import columnar_response
+from ..api.columnar import negotiate
+
+
+def make_request(accept: str | None) -> Request:
+    headers = [] if accept is None else [(b"accept", accept.encode())]
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.mark.parametrize(
+    "accept,expected",
+    [
+        (None, None),
+        ("*/*", None),
+        ("application/json", None),
+        ("application/vnd.apache.arrow.stream", ColumnarFormat.arrow),
+        ("application/msgpack", ColumnarFormat.msgpack),
+        ("application/x-msgpack", ColumnarFormat.msgpack),
+        ("application/json, application/msgpack", None),
+        ("application/msgpack, application/json", ColumnarFormat.msgpack),
+        ("application/json;q=0.5, application/msgpack", ColumnarFormat.msgpack),
+        ("application/msgpack;q=0, */*", None),
+        ("text/html", None),
+    ],
+)
+def test_negotiate(accept, expected):
+    assert negotiate(make_request(accept)) == expected
+
+
+def test_arrow_response():
+    columns = {"t": [1, 2, 3], "v": [10, 20, 30]}
+    response = columnar_response(columns, ColumnarFormat.arrow)
+    assert response.media_type == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.body).read_all()
+    assert table.schema.field("t").type == pa.int64()
+    assert table.to_pydict() == columns
+
+
+def test_msgpack_response():
+    response = columnar_response({"t": None, "v": None}, ColumnarFormat.msgpack)
+    assert response.media_type == "application/msgpack"
+    assert msgpack.unpackb(response.body) == {"t": [], "v": []}
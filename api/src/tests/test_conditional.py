@@ -0,0 +1,138 @@
+import time
+import pytest
+
+import psycopg as pg
+from fastapi.testclient import TestClient
+
+from ..main import app
+from .db import MockDB
+from .db import conn_str
+
+TOKEN_A = "tokenaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+
+
+@pytest.fixture(scope="module")
+def db_name():
+    sql = f"""
+        insert into bal.erg_diffs (address, height, tx_id, value) values
+        ('addr1', 10, 'tx_1',   5000),
+        ('addr1', 20, 'tx_2',  -2000),
+        ('addr1', 990, 'tx_3',  1000);
+
+        insert into bal.erg (address, value) values
+        ('addr1', 4000);
+
+        insert into bal.tokens (address, token_id, value) values
+        ('addr1', '{TOKEN_A}', 400);
+
+        insert into core.headers (height, id, parent_id, timestamp) values 
+        (10, 'header10', 'header09', 1567123456789),
+        (20, 'header20', 'header19', 1568123456789),
+        (990, 'header990', 'header989', 1569123456789),
+        (1000, 'header1000', 'header999', 1570123456789);
+    """
+    with MockDB(sql=sql) as db_name:
+        yield db_name
+
+
+@pytest.fixture(scope="module")
+def client(db_name):
+    with TestClient(app) as client:
+        yield client
+
+
+def notify_include(db_name: str, height: int):
+    payload = f'{{"event": "include", "height": {height}, "header_id": "header{height}", "parent_id": "header{height-1}"}}'
+    with pg.connect(conn_str(db_name), autocommit=True) as conn:
+        conn.execute("select pg_notify('ew_blocks', %s);", [payload])
+    start = time.time()
+    while app.state.head.height != height:
+        assert time.time() - start < 2
+        time.sleep(0.01)
+
+
+def test_etag_and_304(client):
+    url = "/addresses/addr1/balance"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('"1000-')
+    assert "cache-control" not in response.headers
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    # Weak comparison and lists of tags
+    response = client.get(url, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+
+
+def test_etag_depends_on_params(client):
+    url = "/addresses/addr1/balance"
+    etag = client.get(url).headers["etag"]
+    response = client.get(f"{url}?token_id={TOKEN_A}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == 400
+    assert response.headers["etag"] != etag
+
+
+def test_param_order_does_not_matter(client):
+    url = "/addresses/addr1/balance/history"
+    etag = client.get(f"{url}?limit=1&desc=false").headers["etag"]
+    response = client.get(f"{url}?desc=false&limit=1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_no_etag_on_errors(client):
+    response = client.get("/addresses/unknownaddress/balance")
+    assert response.status_code == 404
+    assert "etag" not in response.headers
+
+
+def test_historical_query_past_finality_is_immutable(client):
+    url = "/addresses/addr1/balance/at/height/20"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json() == 3000
+    etag = response.headers["etag"]
+    assert not etag.startswith('"1000-')
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_historical_query_within_finality_is_not_immutable(client):
+    url = "/addresses/addr1/balance/at/height/990"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json() == 4000
+    assert response.headers["etag"].startswith('"1000-')
+    assert "cache-control" not in response.headers
+
+
+def test_new_block_changes_etag(client, db_name):
+    url = "/addresses/addr1/balance"
+    etag = client.get(url).headers["etag"]
+    immutable_url = "/addresses/addr1/balance/at/height/20"
+    immutable_etag = client.get(immutable_url).headers["etag"]
+
+    notify_include(db_name, 1001)
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"1001-')
+
+    response = client.get(immutable_url, headers={"If-None-Match": immutable_etag})
+    assert response.status_code == 304
+
+
+def test_etag_depends_on_format(client):
+    url = "/addresses/addr1/balance/history"
+    json_etag = client.get(url).headers["etag"]
+    response = client.get(url, headers={"Accept": "application/msgpack"})
+    assert response.headers["etag"] != json_etag
+    assert response.headers["vary"] == "Accept"
+    response = client.get(
+        url, headers={"Accept": "application/msgpack", "If-None-Match": json_etag}
+    )
+    assert response.status_code == 200
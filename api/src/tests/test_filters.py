@@ -0,0 +1,44 @@
+import pytest
+
+from ..api.filters import ADDRESS_CLASSES
+from ..api.filters import BAL_GE
+from ..api.filters import BAL_LT
+from ..api.filters import CONTRACTS
+from ..api.filters import P2PK
+from ..api.filters import compile_predicate
+
+
+def test_erg():
+    predicate = compile_predicate([P2PK], False, [BAL_GE, BAL_LT])
+    assert predicate.sql == (
+        f"(({ADDRESS_CLASSES[P2PK]}))"
+        " and ($1::bigint is null or value >= $1::bigint)"
+        " and ($2::bigint is null or value < $2::bigint)"
+    )
+    assert predicate.params == ["bal_ge", "bal_lt"]
+    assert predicate.args(bal_lt=5) == [None, 5]
+    assert predicate.args(token_id=None, bal_ge=1) == [1, None]
+
+
+def test_token_comes_first():
+    predicate = compile_predicate([CONTRACTS], True, [BAL_LT])
+    assert predicate.sql == (
+        f"(({ADDRESS_CLASSES[CONTRACTS]}))"
+        " and token_id = $1"
+        " and ($2::bigint is null or value < $2::bigint)"
+    )
+    assert predicate.args(token_id="tokenid", bal_lt=5) == ["tokenid", 5]
+
+
+def test_address_class_sets():
+    predicate = compile_predicate([P2PK, CONTRACTS], False)
+    assert predicate.sql == (
+        f"(({ADDRESS_CLASSES[CONTRACTS]}) or ({ADDRESS_CLASSES[P2PK]}))"
+    )
+    assert predicate.params == []
+
+
+def test_unknown_param():
+    predicate = compile_predicate([P2PK], False, [BAL_GE])
+    with pytest.raises(AssertionError):
+        predicate.args(bal_lt=5)
@@ -1,3 +1,5 @@
+import msgpack
+import pyarrow as pa
 import pytest
 
 from fastapi.testclient import TestClient
@@ -93,6 +95,28 @@ def client():
         (27, 270), -- d5
         (28, 280), -- d5
         (29, 290); -- d6
+
+        -- rollups, as generated by the watcher
+        insert into mtr.utxos_1h (timestamp, height, value) values
+        (1561978800000,  0,   3),
+        (1561982400000,  6,  60), -- h1
+        (1561986000000,  8,  70), -- h2
+        (1561989600000, 11, 100), -- h3
+        (1561993200000, 13, 130), -- h4
+        (1561996800000, 15, 140), -- h5
+        (1562000400000, 17, 160), -- h6
+        (1562025600000, 18, 180), -- d1
+        (1562112000000, 20, 190), -- d2
+        (1562198400000, 23, 220), -- d3
+        (1562284800000, 25, 250); -- d4
+
+        insert into mtr.utxos_24h (timestamp, height, value) values
+        (1562025600000, 18, 180), -- d1
+        (1562112000000, 20, 190), -- d2
+        (1562198400000, 23, 220), -- d3
+        (1562284800000, 25, 250), -- d4
+        (1562371200000, 27, 260), -- d5
+        (1562457600000, 29, 280); -- d6
     """
     with MockDB(sql=sql) as _:
         with TestClient(app) as client:
@@ -378,3 +402,82 @@ def test_default_r_is_block(client):
     response = client.get(url)
     assert response.status_code == 200
     assert response.json() == [{"t": 1562457600000 + 100000, "v": 290}]
+
+
+class TestCountStream:
+    def test_ndjson_without_window_limit(self, client):
+        # Spans more than the daily time window limit
+        response = client.get("/metrics/utxos?r=24h&format=ndjson")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.text.splitlines() == [
+            '{"t": 1562025600000, "v": 180}',
+            '{"t": 1562112000000, "v": 190}',
+            '{"t": 1562198400000, "v": 220}',
+            '{"t": 1562284800000, "v": 250}',
+            '{"t": 1562371200000, "v": 260}',
+            '{"t": 1562457600000, "v": 280}',
+        ]
+
+    def test_csv_from_to(self, client):
+        url = f"/metrics/utxos?r=block&fr={1561979000000}&to={1561979300000}&format=csv"
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.text.splitlines() == [
+            "t,v",
+            "1561979000000,5",
+            "1561979100000,6",
+            "1561979200000,7",
+            "1561979300000,9",
+        ]
+
+    def test_from_gt_to(self, client):
+        url = f"/metrics/utxos?fr={1561979300000}&to={1561979000000}&format=csv"
+        response = client.get(url)
+        assert response.status_code == 422
+
+
+class TestCountColumnar:
+    def test_arrow(self, client):
+        url = f"/metrics/utxos?r=block&fr={1561979000000}&to={1561979200000}"
+        response = client.get(
+            url, headers={"Accept": "application/vnd.apache.arrow.stream"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.to_pydict() == {
+            "t": [1561979000000, 1561979100000, 1561979200000],
+            "v": [5, 6, 7],
+        }
+
+    def test_msgpack(self, client):
+        url = f"/metrics/utxos?r=1h&fr={1561982400000}&to={1561989600000}"
+        response = client.get(url, headers={"Accept": "application/msgpack"})
+        assert response.status_code == 200
+        assert msgpack.unpackb(response.content) == {
+            "t": [1561982400000, 1561986000000, 1561989600000],
+            "v": [60, 70, 100],
+        }
+
+    def test_last(self, client):
+        response = client.get("/metrics/utxos", headers={"Accept": "application/msgpack"})
+        assert response.status_code == 200
+        assert msgpack.unpackb(response.content) == {
+            "t": [1562457600000 + 100000],
+            "v": [290],
+        }
+
+    def test_json_is_cached_separately(self, client):
+        url = f"/metrics/utxos?r=block&fr={1561979000000}&to={1561979000000}"
+        response = client.get(url, headers={"Accept": "application/msgpack"})
+        assert response.headers["content-type"] == "application/msgpack"
+        response = client.get(url)
+        assert response.json() == [{"t": 1561979000000, "v": 5}]
+
+
+def test_rollup_window_limits():
+    limits = metrics.generate_time_window_limits(1000, rollup_limit=10_000)
+    assert limits[metrics.TimeResolution.block] == 120_000 * 1000
+    assert limits[metrics.TimeResolution.hourly] == 3_600_000 * 10_000
+    assert limits[metrics.TimeResolution.daily] == 86_400_000 * 10_000
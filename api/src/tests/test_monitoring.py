@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+from ..main import app
+from ..api.monitoring import InstrumentedPool
+from ..api.monitoring import query_name
+from ..api.queries import REGISTRY
+from .db import MockDB
+
+P2PK_1 = "9addr1xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+
+
+@pytest.fixture(scope="module")
+def db_name():
+    sql = f"""
+        insert into core.headers (height, id, parent_id, timestamp) values
+        (10, 'header10', 'header09', 1567123456789);
+
+        insert into bal.erg (address, value) values
+        ('{P2PK_1}', 1000000);
+
+        insert into bal.erg_diffs (address, height, tx_id, value) values
+        ('{P2PK_1}', 10, 'tx_1', 1000000);
+    """
+    with MockDB(sql=sql) as db_name:
+        yield db_name
+
+
+@pytest.fixture(scope="module")
+def client(db_name):
+    with TestClient(app) as client:
+        yield client
+
+
+def scrape(client) -> dict:
+    """
+    Returns exposed sample values, keyed by name and labels.
+    """
+    response = client.get("/internal/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def value(samples: dict, name: str, **labels) -> float:
+    return samples[(name, tuple(sorted(labels.items())))]
+
+
+def test_not_in_schema(client):
+    assert "/internal/metrics" not in client.get("/openapi.json").json()["paths"]
+
+
+def test_request_metrics_use_route_templates(client):
+    client.get(f"/addresses/{P2PK_1}/balance")
+    client.get("/addresses/9unknown/balance")
+    samples = scrape(client)
+    route = "/addresses/{address}/balance"
+    name = "ew_api_requests_total"
+    assert value(samples, name, route=route, method="GET", status="200") >= 1
+    assert value(samples, name, route=route, method="GET", status="404") >= 1
+    name = "ew_api_request_duration_seconds_count"
+    assert value(samples, name, route=route) >= 2
+
+
+def test_unmatched_requests(client):
+    client.get("/not/a/route")
+    samples = scrape(client)
+    name = "ew_api_requests_total"
+    assert value(samples, name, route="unmatched", method="GET", status="404") >= 1
+
+
+def test_query_metrics(client):
+    client.get(f"/addresses/{P2PK_1}/balance")
+    samples = scrape(client)
+    name = "ew_api_query_duration_seconds_count"
+    assert value(samples, name, query="address_balance") >= 1
+
+
+def test_state_metrics(client):
+    client.get("/p2pk/count")
+    client.get("/p2pk/count")
+    samples = scrape(client)
+    assert value(samples, "ew_api_pool_size") >= 1
+    assert value(samples, "ew_api_pool_in_use") == 0
+    assert value(samples, "ew_api_pool_waiting") == 0
+    assert value(samples, "ew_api_pool_acquire_duration_seconds_count") >= 1
+    assert value(samples, "ew_api_cache_hits_total") >= 1
+    assert 0 < value(samples, "ew_api_cache_hit_ratio") <= 1
+    assert value(samples, "ew_api_head_height") == 10
+    assert value(samples, "ew_api_last_served_height") == 10
+
+
+def test_server_timing(client):
+    response = client.get(f"/addresses/{P2PK_1}/balance/history")
+    assert response.status_code == 200
+    timings = {}
+    for metric in response.headers["server-timing"].split(","):
+        name, dur = metric.strip().split(";dur=")
+        timings[name] = float(dur)
+    assert list(timings) == ["acquire", "db", "serialize", "total"]
+    assert timings["db"] > 0
+    assert timings["total"] >= timings["acquire"] + timings["db"]
+
+
+def test_slow_requests_are_logged(client, caplog):
+    app.state.slow_request_threshold = 0
+    app.state.explain_slow_requests = True
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.api.monitoring"):
+            client.get(f"/addresses/{P2PK_1}/balance/at/height/10")
+            start = time.time()
+            while not any("Plan of slow query" in m for m in caplog.messages):
+                assert time.time() - start < 2
+                time.sleep(0.01)
+    finally:
+        app.state.slow_request_threshold = None
+        app.state.explain_slow_requests = False
+    slow = [m for m in caplog.messages if m.startswith("Slow request")]
+    assert "GET /addresses/{address}/balance/at/height/{height}" in slow[0]
+    assert P2PK_1 in slow[0]
+    plan = next(m for m in caplog.messages if "Plan of slow query" in m)
+    assert "Buffers:" in plan or "Execution Time" in plan
+
+
+def test_query_names():
+    key, sql = next(iter(REGISTRY.items()))
+    assert query_name(sql) == key[0]
+    assert query_name("select 1;") == "other"
+
+
+def test_pool_counts_waiting_acquisitions():
+    class FakePool:
+        def __init__(self):
+            self.released = []
+            self.gate = asyncio.Event()
+
+        async def acquire(self, timeout=None):
+            await self.gate.wait()
+            return "conn"
+
+        async def release(self, conn):
+            self.released.append(conn)
+
+    async def main():
+        fake = FakePool()
+        pool = InstrumentedPool(fake)
+
+        async def use():
+            async with pool.acquire() as conn:
+                return conn
+
+        tasks = [asyncio.create_task(use()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert pool.waiting == 3
+        fake.gate.set()
+        assert await asyncio.gather(*tasks) == ["conn"] * 3
+        assert pool.waiting == 0
+        assert fake.released == ["conn"] * 3
+        assert await pool.acquire() == "conn"
+
+    asyncio.run(main())
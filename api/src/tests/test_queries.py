@@ -0,0 +1,65 @@
+import asyncio
+
+import asyncpg
+import pytest
+
+from ..api import queries
+from .db import MockDB
+from .db import DB_HOST
+from .db import DB_PORT
+from .db import DB_USER
+from .db import DB_PASS
+from .db import TEST_DB_NAME
+
+COUNT_PREPARED = "select count(*) from pg_prepared_statements;"
+
+
+@pytest.fixture(scope="module")
+def db_name():
+    sql = """
+        insert into bal.erg (address, value) values
+        ('addr1', 1000);
+    """
+    with MockDB(sql=sql) as db_name:
+        yield db_name
+
+
+async def with_pool(func):
+    dsn = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{TEST_DB_NAME}"
+    pool = await asyncpg.create_pool(
+        dsn,
+        min_size=1,
+        max_size=1,
+        connection_class=queries.Connection,
+        init=queries.init_connection,
+        statement_cache_size=queries.statement_cache_size(),
+    )
+    try:
+        return await func(pool)
+    finally:
+        await pool.close()
+
+
+def test_registered_statements_are_prepared_on_init(db_name):
+    async def func(pool):
+        async with pool.acquire() as conn:
+            return await conn.fetchval(COUNT_PREPARED)
+
+    assert asyncio.run(with_pool(func)) >= len(queries.REGISTRY)
+
+
+def test_registered_statements_are_reused(db_name):
+    async def func(pool):
+        async with pool.acquire() as conn:
+            before = await conn.fetchval(COUNT_PREPARED)
+        # Statements survive connections being released to the pool
+        async with pool.acquire() as conn:
+            value = await queries.address_balance(conn, "addr1", None)
+            count = await queries.address_count(conn, queries.P2PK, None, 1, None)
+            after = await conn.fetchval(COUNT_PREPARED)
+        return before, after, value, count
+
+    before, after, value, count = asyncio.run(with_pool(func))
+    assert value == 1000
+    assert count == 0
+    assert after == before
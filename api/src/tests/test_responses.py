@@ -0,0 +1,27 @@
+import asyncio
+from decimal import Decimal
+
+import orjson
+from fastapi import Response
+
+from ..api.responses import FastJSONResponse
+from ..api.responses import trusted
+
+
+def test_decimals():
+    response = FastJSONResponse({"a": Decimal(12), "b": Decimal("0.5"), 3: [1, 2]})
+    assert orjson.loads(response.body) == {"a": 12, "b": 0.5, "3": [1, 2]}
+    assert response.body.startswith(b'{"a":12,')
+
+
+def test_trusted():
+    @trusted
+    async def route(value):
+        return value
+
+    response = asyncio.run(route(value=[{"t": 1, "v": 2}]))
+    assert isinstance(response, FastJSONResponse)
+    assert response.body == b'[{"t":1,"v":2}]'
+
+    passthrough = Response(content=b"[]")
+    assert asyncio.run(route(value=passthrough)) is passthrough
@@ -1,22 +1,42 @@
+import time
 import pytest
 
+import psycopg as pg
 from fastapi.testclient import TestClient
 
 from ..main import app
 from .db import MockDB
+from .db import conn_str
 
 
 @pytest.fixture(scope="module")
-def client():
+def db_name():
     sql = f"""
         insert into core.headers (height, id, parent_id, timestamp) values 
         (10, 'header10', 'header09', 1567123456789),
         (20, 'header20', 'header19', 1568123456789),
         (30, 'header30', 'header29', 1569123456789);
     """
-    with MockDB(sql=sql) as _:
-        with TestClient(app) as client:
-            yield client
+    with MockDB(sql=sql) as db_name:
+        yield db_name
+
+
+@pytest.fixture(scope="module")
+def client(db_name):
+    with TestClient(app) as client:
+        yield client
+
+
+def notify(db_name: str, payload: str):
+    with pg.connect(conn_str(db_name), autocommit=True) as conn:
+        conn.execute("select pg_notify('ew_blocks', %s);", [payload])
+
+
+def wait_for_height(height: int, timeout: float = 2):
+    start = time.time()
+    while app.state.head.height != height:
+        assert time.time() - start < timeout
+        time.sleep(0.01)
 
 
 def test_status(client):
@@ -26,3 +46,30 @@ def test_status(client):
     assert response.json() == {
         "height": 30,
     }
+
+
+def test_status_follows_notifications(client, db_name):
+    url = "/sync_height"
+    notify(
+        db_name,
+        '{"event": "include", "height": 31, "header_id": "header31", "parent_id": "header30"}',
+    )
+    wait_for_height(31)
+    assert client.get(url).json() == {"height": 31}
+
+    notify(
+        db_name,
+        '{"event": "rollback", "height": 31, "header_id": "header31", "parent_id": "header30"}',
+    )
+    wait_for_height(30)
+    assert client.get(url).json() == {"height": 30}
+    assert app.state.head.head.header_id == "header30"
+
+
+def test_invalid_notifications_are_ignored(client, db_name):
+    notify(db_name, "not json")
+    notify(
+        db_name,
+        '{"event": "include", "height": 32, "header_id": "header32", "parent_id": "header31"}',
+    )
+    wait_for_height(32)
@@ -7,6 +7,7 @@ from .db import MockDB
 
 TOKEN_A = "tokenaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
 TOKEN_B = "tokenbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbeip4"
+TOKEN_C = "tokenccccccccccccccccccccccccccccccccccccccccccccccccccccccccccc"
 TOKEN_X = "validxtokenxidxofxnonxexistingxtokenxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
 
 
@@ -31,6 +32,8 @@ def client():
         ('{TOKEN_A}', 'box-1', 900);
         insert into core.tokens (id, box_id, emission_amount, name, description, decimals, standard) values
         ('{TOKEN_B}', 'box-2', 800, 'token_b', 'description of token b', 2, 'EIP-4');
+        insert into core.tokens (id, box_id, emission_amount) values
+        ('{TOKEN_C}', 'box-2', 100);
 
         insert into bal.tokens_diffs (address, token_id, height, tx_id, value) values
         ('addr1', '{TOKEN_A}', 10, 'tx_1',   900),
@@ -38,13 +41,15 @@ def client():
         ('addr1', '{TOKEN_A}', 20, 'tx_2',  -200),
         ('addr2', '{TOKEN_A}', 20, 'tx_2',   150),
         ('addr1', '{TOKEN_A}', 30, 'tx_3',  -300),
-        ('{P2PK}', '{TOKEN_A}', 30, 'tx_3',   300);
+        ('{P2PK}', '{TOKEN_A}', 30, 'tx_3',   300),
+        ('{P2PK}', '{TOKEN_C}', 20, 'tx_2',   100);
 
         insert into bal.tokens (address, token_id, value) values
         ('addr1', '{TOKEN_A}', 400),
         ('addr1', '{TOKEN_B}', 800),
         ('addr2', '{TOKEN_A}', 150),
-        ('{P2PK}', '{TOKEN_A}', 300);
+        ('{P2PK}', '{TOKEN_A}', 300),
+        ('{P2PK}', '{TOKEN_C}', 100);
     """
     with MockDB(sql=sql) as _:
         with TestClient(app) as client:
@@ -96,6 +101,17 @@ class TestSupply:
             "burned": 50,
         }
 
+    def test_supply_without_contracts(self, client):
+        url = f"/tokens/{TOKEN_C}/supply"
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.json() == {
+            "emitted": 100,
+            "in_p2pks": 100,
+            "in_contracts": 0,
+            "burned": 0,
+        }
+
     def test_unknown_token(self, client):
         url = f"/tokens/{TOKEN_X}/supply"
         response = client.get(url)
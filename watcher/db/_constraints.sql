@@ -118,11 +118,19 @@ create index on bal.tokens(value);
 alter table bal.tokens_diffs add primary key(address, token_id, height, tx_id);
 create index on bal.tokens_diffs(height);
 
+alter table bal.erg_checkpoints add primary key(address, height);
+create index on bal.erg_checkpoints(height);
+
+alter table bal.tokens_checkpoints add primary key(address, token_id, height);
+create index on bal.tokens_checkpoints(height);
+
 
 -------------------------------------------------------------------------------
 -- Metrics
 -------------------------------------------------------------------------------
 alter table mtr.utxos add primary key(height);
+alter table mtr.utxos_1h add primary key(timestamp);
+alter table mtr.utxos_24h add primary key(timestamp);
 
 
 -------------------------------------------------------------------------------
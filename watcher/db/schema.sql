@@ -7,7 +7,7 @@ create table ew.revision (
 	version integer not null,
 	check(singleton = 1)
 );
-insert into ew.revision (version) values (3);
+insert into ew.revision (version) values (5);
 
 create table ew.constraints (
 	singleton int primary key default 1,
@@ -133,6 +133,21 @@ create table bal.tokens_diffs (
 	value bigint
 );
 
+-- ERG balances every n blocks, for addresses that changed since previous checkpoint
+create table bal.erg_checkpoints (
+	address text,
+	height int,
+	value bigint
+);
+
+-- Token balances every n blocks, for addresses that changed since previous checkpoint
+create table bal.tokens_checkpoints (
+	address text,
+	token_id text,
+	height int,
+	value bigint
+);
+
 
 -------------------------------------------------------------------------------
 -- Metrics
@@ -144,3 +159,17 @@ create table mtr.utxos (
 	height int,
 	value bigint
 );
+
+-- UTxO counts at round hours and days.
+-- Height is that of the block that added the record.
+create table mtr.utxos_1h (
+	timestamp bigint,
+	height int,
+	value bigint
+);
+
+create table mtr.utxos_24h (
+	timestamp bigint,
+	height int,
+	value bigint
+);
@@ -2,6 +2,7 @@ pub mod balances;
 pub mod core;
 pub mod metrics;
 mod migrations;
+pub mod notifications;
 pub mod unspent;
 
 use crate::session::cache;
@@ -36,9 +37,13 @@ impl DB {
         }
     }
 
-    pub fn check_migrations(&self, allow_migrations: bool) -> anyhow::Result<()> {
+    pub fn check_migrations(
+        &self,
+        allow_migrations: bool,
+        checkpoint_interval: i32,
+    ) -> anyhow::Result<()> {
         let mut client = Client::connect(&self.conn_str, NoTls)?;
-        migrations::check(&mut client, allow_migrations)
+        migrations::check(&mut client, allow_migrations, checkpoint_interval)
     }
 
     /// Returns true if db is empty
@@ -150,6 +155,12 @@ impl DB {
             // Both PK and index needed by erg.bal bootstrap queries
             balances::tokens_diffs::constraints::ADD_PK,
             balances::tokens_diffs::constraints::IDX_HEIGHT,
+            // Balance checkpoints
+            // Height index needed by rollbacks
+            balances::erg_checkpoints::constraints::ADD_PK,
+            balances::erg_checkpoints::constraints::IDX_HEIGHT,
+            balances::tokens_checkpoints::constraints::ADD_PK,
+            balances::tokens_checkpoints::constraints::IDX_HEIGHT,
             // Finally
             "update ew.constraints set tier_1 = true;",
         ];
@@ -169,6 +180,8 @@ impl DB {
         let statements: Vec<&'static str> = vec![
             // Metrics
             metrics::utxos::constraints::ADD_PK,
+            metrics::utxos::constraints::ADD_PK_1H,
+            metrics::utxos::constraints::ADD_PK_24H,
             // Finally
             "update ew.constraints set tier_2 = true;",
         ];
@@ -3,14 +3,21 @@
 //! Process blocks into balance tables data.
 
 pub(super) mod erg;
+pub(super) mod erg_checkpoints;
 pub(super) mod erg_diffs;
 pub(super) mod tokens;
+pub(super) mod tokens_checkpoints;
 pub(super) mod tokens_diffs;
 
 use super::SQLStatement;
 use crate::parsing::BlockData;
 
-pub fn prep(block: &BlockData) -> Vec<SQLStatement> {
+/// Balances are checkpointed every `checkpoint_interval` blocks
+fn is_checkpoint(height: i32, checkpoint_interval: i32) -> bool {
+    height % checkpoint_interval == 0
+}
+
+pub fn prep(block: &BlockData, checkpoint_interval: i32) -> Vec<SQLStatement> {
     let tx_ids: Vec<&str> = block.transactions.iter().map(|tx| tx.id).collect();
     let mut sql_statements: Vec<SQLStatement> = Vec::new();
     // Erg
@@ -33,12 +40,28 @@ pub fn prep(block: &BlockData) -> Vec<SQLStatement> {
     sql_statements.push(tokens::update_statement(block.height));
     sql_statements.push(tokens::insert_statement(block.height));
     sql_statements.push(tokens::delete_zero_balances_statement());
+    // Checkpoints
+    if is_checkpoint(block.height, checkpoint_interval) {
+        sql_statements.push(erg_checkpoints::insert_statement(
+            block.height,
+            checkpoint_interval,
+        ));
+        sql_statements.push(tokens_checkpoints::insert_statement(
+            block.height,
+            checkpoint_interval,
+        ));
+    }
 
     sql_statements
 }
 
-pub fn prep_rollback(block: &BlockData) -> Vec<SQLStatement> {
+pub fn prep_rollback(block: &BlockData, checkpoint_interval: i32) -> Vec<SQLStatement> {
     let mut sql_statements: Vec<SQLStatement> = vec![];
+    // Checkpoints
+    if is_checkpoint(block.height, checkpoint_interval) {
+        sql_statements.push(tokens_checkpoints::rollback_statement(block.height));
+        sql_statements.push(erg_checkpoints::rollback_statement(block.height));
+    }
     // Tokens
     sql_statements.push(tokens::rollback_delete_zero_balances_statement(
         block.height,
@@ -66,8 +89,8 @@ pub fn prep_rollback(block: &BlockData) -> Vec<SQLStatement> {
     sql_statements
 }
 
-pub fn prep_bootstrap(height: i32) -> Vec<SQLStatement> {
-    vec![
+pub fn prep_bootstrap(height: i32, checkpoint_interval: i32) -> Vec<SQLStatement> {
+    let mut sql_statements = vec![
         erg_diffs::bootstrapping::insert_diffs_statement(height),
         erg::update_statement(height),
         erg::insert_statement(height),
@@ -76,14 +99,27 @@ pub fn prep_bootstrap(height: i32) -> Vec<SQLStatement> {
         tokens::update_statement(height),
         tokens::insert_statement(height),
         tokens::delete_zero_balances_statement(),
-    ]
+    ];
+    if is_checkpoint(height, checkpoint_interval) {
+        sql_statements.push(erg_checkpoints::insert_statement(
+            height,
+            checkpoint_interval,
+        ));
+        sql_statements.push(tokens_checkpoints::insert_statement(
+            height,
+            checkpoint_interval,
+        ));
+    }
+    sql_statements
 }
 
 #[cfg(test)]
 mod tests {
     use super::erg;
+    use super::erg_checkpoints;
     use super::erg_diffs;
     use super::tokens;
+    use super::tokens_checkpoints;
     use super::tokens_diffs;
     use crate::db::SQLArg;
     use crate::parsing::testing::block_600k;
@@ -91,7 +127,7 @@ mod tests {
 
     #[test]
     fn check_prep_statements() -> () {
-        let statements = super::prep(&block_600k());
+        let statements = super::prep(&block_600k(), 7);
         assert_eq!(statements.len(), 12);
         assert_eq!(statements[0].sql, erg_diffs::INSERT_DIFFS);
         assert_eq!(statements[1].sql, erg_diffs::INSERT_DIFFS);
@@ -110,7 +146,7 @@ mod tests {
 
     #[test]
     fn check_rollback_statements() -> () {
-        let statements = super::prep_rollback(&block_600k());
+        let statements = super::prep_rollback(&block_600k(), 7);
         assert_eq!(statements.len(), 12);
         assert_eq!(statements[0].sql, tokens::ROLLBACK_DELETE_ZERO_BALANCES);
         assert_eq!(statements[1].sql, tokens::ROLLBACK_BALANCE_UPDATES);
@@ -129,7 +165,7 @@ mod tests {
 
     #[test]
     fn check_bootstrap_statements() -> () {
-        let statements = super::prep_bootstrap(600000);
+        let statements = super::prep_bootstrap(600000, 7);
         assert_eq!(statements.len(), 8);
         // Erg
         assert_eq!(
@@ -154,4 +190,28 @@ mod tests {
         assert_eq!(statements[6].sql, tokens::INSERT_BALANCES);
         assert_eq!(statements[7].sql, tokens::DELETE_ZERO_BALANCES);
     }
+
+    #[test]
+    fn check_checkpoint_statements() -> () {
+        // Block 600k is a multiple of 1000
+        let statements = super::prep(&block_600k(), 1000);
+        assert_eq!(statements.len(), 14);
+        assert_eq!(statements[12].sql, erg_checkpoints::INSERT_CHECKPOINTS);
+        assert_eq!(
+            statements[12].args,
+            vec![SQLArg::Integer(600000), SQLArg::Integer(1000)]
+        );
+        assert_eq!(statements[13].sql, tokens_checkpoints::INSERT_CHECKPOINTS);
+
+        let statements = super::prep_rollback(&block_600k(), 1000);
+        assert_eq!(statements.len(), 14);
+        assert_eq!(statements[0].sql, tokens_checkpoints::DELETE_CHECKPOINTS);
+        assert_eq!(statements[1].sql, erg_checkpoints::DELETE_CHECKPOINTS);
+        assert_eq!(statements[1].args, vec![SQLArg::Integer(600000)]);
+
+        let statements = super::prep_bootstrap(600000, 1000);
+        assert_eq!(statements.len(), 10);
+        assert_eq!(statements[8].sql, erg_checkpoints::INSERT_CHECKPOINTS);
+        assert_eq!(statements[9].sql, tokens_checkpoints::INSERT_CHECKPOINTS);
+    }
 }
@@ -0,0 +1,39 @@
+use crate::db::SQLArg;
+use crate::db::SQLStatement;
+
+// Snapshot balance of addresses having changed since previous checkpoint.
+// Addresses with a zero balance get a checkpoint too, so that earlier
+// diffs are never needed once a checkpoint exists.
+pub const INSERT_CHECKPOINTS: &str = "
+    insert into bal.erg_checkpoints (address, height, value)
+    select d.address
+        , $1
+        , coalesce(b.value, 0)
+    from (
+        select distinct address
+        from bal.erg_diffs
+        where height > $1 - $2
+            and height <= $1
+    ) d
+    left join bal.erg b on b.address = d.address;";
+
+pub fn insert_statement(height: i32, interval: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(INSERT_CHECKPOINTS),
+        args: vec![SQLArg::Integer(height), SQLArg::Integer(interval)],
+    }
+}
+
+pub const DELETE_CHECKPOINTS: &str = "delete from bal.erg_checkpoints where height = $1;";
+
+pub fn rollback_statement(height: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(DELETE_CHECKPOINTS),
+        args: vec![SQLArg::Integer(height)],
+    }
+}
+
+pub mod constraints {
+    pub const ADD_PK: &str = "alter table bal.erg_checkpoints add primary key(address, height);";
+    pub const IDX_HEIGHT: &str = "create index on bal.erg_checkpoints(height);";
+}
@@ -0,0 +1,41 @@
+use crate::db::SQLArg;
+use crate::db::SQLStatement;
+
+// Snapshot token balance of addresses having changed since previous checkpoint.
+// Zero balances get a checkpoint too, see erg_checkpoints.
+pub const INSERT_CHECKPOINTS: &str = "
+    insert into bal.tokens_checkpoints (address, token_id, height, value)
+    select d.address
+        , d.token_id
+        , $1
+        , coalesce(b.value, 0)
+    from (
+        select distinct address
+            , token_id
+        from bal.tokens_diffs
+        where height > $1 - $2
+            and height <= $1
+    ) d
+    left join bal.tokens b on b.address = d.address and b.token_id = d.token_id;";
+
+pub fn insert_statement(height: i32, interval: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(INSERT_CHECKPOINTS),
+        args: vec![SQLArg::Integer(height), SQLArg::Integer(interval)],
+    }
+}
+
+pub const DELETE_CHECKPOINTS: &str = "delete from bal.tokens_checkpoints where height = $1;";
+
+pub fn rollback_statement(height: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(DELETE_CHECKPOINTS),
+        args: vec![SQLArg::Integer(height)],
+    }
+}
+
+pub mod constraints {
+    pub const ADD_PK: &str =
+        "alter table bal.tokens_checkpoints add primary key(address, token_id, height);";
+    pub const IDX_HEIGHT: &str = "create index on bal.tokens_checkpoints(height);";
+}
@@ -15,7 +15,11 @@ pub fn prep(block: &BlockData, cache: &mut cache::Metrics) -> Vec<SQLStatement>
     // New value is cached value plus diff
     cache.utxos += block_utxo_diff(block);
 
-    vec![utxos::insert_snapshot(height, cache.utxos)]
+    vec![
+        utxos::insert_snapshot(height, cache.utxos),
+        utxos::insert_hourly_rollup(height),
+        utxos::insert_daily_rollup(height),
+    ]
 }
 
 pub fn prep_rollback(block: &BlockData, cache: &mut cache::Metrics) -> Vec<SQLStatement> {
@@ -25,15 +29,27 @@ pub fn prep_rollback(block: &BlockData, cache: &mut cache::Metrics) -> Vec<SQLSt
     // Old value is cached value minus diff
     cache.utxos -= block_utxo_diff(block);
 
-    vec![utxos::delete_snapshot(height)]
+    vec![
+        utxos::delete_snapshot(height),
+        utxos::delete_hourly_rollup(height),
+        utxos::delete_daily_rollup(height),
+    ]
 }
 
 pub fn prep_bootstrap(height: i32) -> Vec<SQLStatement> {
-    vec![utxos::append_snapshot_from_height(height)]
+    vec![
+        utxos::append_snapshot_from_height(height),
+        utxos::insert_hourly_rollup(height),
+        utxos::insert_daily_rollup(height),
+    ]
 }
 
 pub fn prep_genesis() -> Vec<SQLStatement> {
-    vec![utxos::insert_genesis_snapshot()]
+    vec![
+        utxos::insert_genesis_snapshot(),
+        utxos::insert_hourly_rollup(0),
+        utxos::insert_daily_rollup(0),
+    ]
 }
 
 pub fn load_cache(client: &mut postgres::Client) -> cache::Metrics {
@@ -83,7 +99,7 @@ mod tests {
     fn check_prep() -> () {
         let mut cache = cache::Metrics { utxos: 100 };
         let statements = super::prep(&block_600k(), &mut cache);
-        assert_eq!(statements.len(), 1);
+        assert_eq!(statements.len(), 3);
 
         // UTxO count - block 600k has 4 inputs and 6 outputs
         assert_eq!(statements[0].sql, super::utxos::INSERT_SNAPSHOT);
@@ -92,37 +108,61 @@ mod tests {
             vec![SQLArg::Integer(600000), SQLArg::BigInt(100 + 2),]
         );
         assert_eq!(cache.utxos, 100 + 2);
+
+        // Rollups
+        assert_eq!(statements[1].sql, super::utxos::INSERT_HOURLY_ROLLUP);
+        assert_eq!(statements[1].args, vec![SQLArg::Integer(600000)]);
+        assert_eq!(statements[2].sql, super::utxos::INSERT_DAILY_ROLLUP);
+        assert_eq!(statements[2].args, vec![SQLArg::Integer(600000)]);
     }
 
     #[test]
     fn check_rollback() -> () {
         let mut cache = cache::Metrics { utxos: 100 };
         let statements = super::prep_rollback(&block_600k(), &mut cache);
-        assert_eq!(statements.len(), 1);
+        assert_eq!(statements.len(), 3);
 
         // UTxO count - block 600k has 4 inputs and 6 outputs
         assert_eq!(statements[0].sql, super::utxos::DELETE_SNAPSHOT);
         assert_eq!(statements[0].args, vec![SQLArg::Integer(600000),]);
         assert_eq!(cache.utxos, 98);
+
+        // Rollups
+        assert_eq!(statements[1].sql, super::utxos::DELETE_HOURLY_ROLLUP);
+        assert_eq!(statements[1].args, vec![SQLArg::Integer(600000)]);
+        assert_eq!(statements[2].sql, super::utxos::DELETE_DAILY_ROLLUP);
+        assert_eq!(statements[2].args, vec![SQLArg::Integer(600000)]);
     }
 
     #[test]
     fn check_bootstrap() -> () {
         let statements = super::prep_bootstrap(600000);
-        assert_eq!(statements.len(), 1);
+        assert_eq!(statements.len(), 3);
 
         // UTxO count
         assert_eq!(statements[0].sql, super::utxos::APPEND_SNAPSHOT_FROM_HEIGHT);
         assert_eq!(statements[0].args[0], SQLArg::Integer(600000));
+
+        // Rollups
+        assert_eq!(statements[1].sql, super::utxos::INSERT_HOURLY_ROLLUP);
+        assert_eq!(statements[1].args[0], SQLArg::Integer(600000));
+        assert_eq!(statements[2].sql, super::utxos::INSERT_DAILY_ROLLUP);
+        assert_eq!(statements[2].args[0], SQLArg::Integer(600000));
     }
 
     #[test]
     fn check_genesis() -> () {
         let statements = super::prep_genesis();
-        assert_eq!(statements.len(), 1);
+        assert_eq!(statements.len(), 3);
 
         // UTxO count
         assert_eq!(statements[0].sql, super::utxos::INSERT_GENESIS_SNAPSHOT);
         assert_eq!(statements[0].args, &[]);
+
+        // Rollups
+        assert_eq!(statements[1].sql, super::utxos::INSERT_HOURLY_ROLLUP);
+        assert_eq!(statements[1].args, vec![SQLArg::Integer(0)]);
+        assert_eq!(statements[2].sql, super::utxos::INSERT_DAILY_ROLLUP);
+        assert_eq!(statements[2].args, vec![SQLArg::Integer(0)]);
     }
 }
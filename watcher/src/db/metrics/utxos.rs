@@ -69,10 +69,102 @@ pub fn insert_genesis_snapshot() -> SQLStatement {
     }
 }
 
+// Hourly rollup record, if block at given height is the first of a new hour
+// or has a timestamp that is a round hour.
+// Value is that of the last block prior to the round timestamp.
+// Relies on snapshots of given and previous heights.
+pub const INSERT_HOURLY_ROLLUP: &str = "
+    insert into mtr.utxos_1h (timestamp, height, value)
+    select hs.timestamp / 3600000 * 3600000
+        , hs.height
+        , case
+            when hs.timestamp % 3600000 = 0 then sn.value
+            else ps.value
+        end
+    from core.headers hs
+    join mtr.utxos sn on sn.height = hs.height
+    left join core.headers ph on ph.height = hs.height - 1
+    left join mtr.utxos ps on ps.height = hs.height - 1
+    where hs.height = $1
+        and (
+            hs.timestamp % 3600000 = 0
+            or hs.timestamp / 3600000 - ph.timestamp / 3600000 = 1
+        )
+        and not exists (
+            select *
+            from mtr.utxos_1h
+            where timestamp = hs.timestamp / 3600000 * 3600000
+        );
+";
+
+pub fn insert_hourly_rollup(height: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(INSERT_HOURLY_ROLLUP),
+        args: vec![SQLArg::Integer(height)],
+    }
+}
+
+// Delete hourly rollup record added by block at given height, if any
+pub const DELETE_HOURLY_ROLLUP: &str = "delete from mtr.utxos_1h where height = $1;";
+
+pub fn delete_hourly_rollup(height: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(DELETE_HOURLY_ROLLUP),
+        args: vec![SQLArg::Integer(height)],
+    }
+}
+
+// Daily rollup record, if block at given height is the first of a new day
+// or has a timestamp that is a round day.
+// Value is that of the last block prior to the round timestamp.
+// Relies on snapshots of given and previous heights.
+pub const INSERT_DAILY_ROLLUP: &str = "
+    insert into mtr.utxos_24h (timestamp, height, value)
+    select hs.timestamp / 86400000 * 86400000
+        , hs.height
+        , case
+            when hs.timestamp % 86400000 = 0 then sn.value
+            else ps.value
+        end
+    from core.headers hs
+    join mtr.utxos sn on sn.height = hs.height
+    left join core.headers ph on ph.height = hs.height - 1
+    left join mtr.utxos ps on ps.height = hs.height - 1
+    where hs.height = $1
+        and (
+            hs.timestamp % 86400000 = 0
+            or hs.timestamp / 86400000 - ph.timestamp / 86400000 = 1
+        )
+        and not exists (
+            select *
+            from mtr.utxos_24h
+            where timestamp = hs.timestamp / 86400000 * 86400000
+        );
+";
+
+pub fn insert_daily_rollup(height: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(INSERT_DAILY_ROLLUP),
+        args: vec![SQLArg::Integer(height)],
+    }
+}
+
+// Delete daily rollup record added by block at given height, if any
+pub const DELETE_DAILY_ROLLUP: &str = "delete from mtr.utxos_24h where height = $1;";
+
+pub fn delete_daily_rollup(height: i32) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(DELETE_DAILY_ROLLUP),
+        args: vec![SQLArg::Integer(height)],
+    }
+}
+
 // Cache loading
 pub const SELECT_LAST_SNAPSHOT_VALUE: &str =
     "select value from mtr.utxos order by height desc limit 1";
 
 pub mod constraints {
     pub const ADD_PK: &str = "alter table mtr.utxos add primary key(height);";
+    pub const ADD_PK_1H: &str = "alter table mtr.utxos_1h add primary key(timestamp);";
+    pub const ADD_PK_24H: &str = "alter table mtr.utxos_24h add primary key(timestamp);";
 }
@@ -4,10 +4,14 @@ use anyhow::anyhow;
 use log::info;
 use postgres::Client;
 
-const CURRENT_VERSION: i32 = 3;
+const CURRENT_VERSION: i32 = 5;
 
 /// Check db version and apply migrations if needed.
-pub fn check(client: &mut Client, allow_migrations: bool) -> anyhow::Result<()> {
+pub fn check(
+    client: &mut Client,
+    allow_migrations: bool,
+    checkpoint_interval: i32,
+) -> anyhow::Result<()> {
     let db_version = get_db_version(client)?;
     info!("Current db version is: {}", db_version);
 
@@ -26,7 +30,7 @@ pub fn check(client: &mut Client, allow_migrations: bool) -> anyhow::Result<()>
     }
     // Migration ID = revision - 1 (i.e. migration 1 results in revision 2)
     for mig_id in db_version..(CURRENT_VERSION) {
-        apply_migration(client, mig_id)?;
+        apply_migration(client, mig_id, checkpoint_interval)?;
     }
     Ok(())
 }
@@ -38,7 +42,11 @@ fn get_db_version(client: &mut Client) -> Result<i32, postgres::Error> {
 }
 
 /// Retrieves current schema version.
-fn apply_migration(client: &mut Client, migration_id: i32) -> Result<(), postgres::Error> {
+fn apply_migration(
+    client: &mut Client,
+    migration_id: i32,
+    checkpoint_interval: i32,
+) -> Result<(), postgres::Error> {
     info!(
         "Applying migration {} (revision {})",
         migration_id,
@@ -47,6 +55,8 @@ fn apply_migration(client: &mut Client, migration_id: i32) -> Result<(), postgre
     match migration_id {
         1 => mig_001(client),
         2 => mig_002(client),
+        3 => mig_003(client),
+        4 => mig_004(client, checkpoint_interval),
         _ => panic!("Attempted to apply migration with unknown ID"),
     }
 }
@@ -140,3 +150,152 @@ fn mig_002(client: &mut Client) -> Result<(), postgres::Error> {
     transaction.commit()?;
     Ok(())
 }
+
+/// Migration 3
+///
+/// Adds hourly and daily utxo count rollups.
+fn mig_003(client: &mut Client) -> Result<(), postgres::Error> {
+    info!("Generating hourly and daily utxo counts");
+    let statements = vec![
+        SQLStatement::from("set local work_mem = '32MB';"),
+        SQLStatement::from(
+            "create table mtr.utxos_1h(timestamp bigint, height int, value bigint);",
+        ),
+        SQLStatement::from(
+            "create table mtr.utxos_24h(timestamp bigint, height int, value bigint);",
+        ),
+        // Backfill, keeping first record of any duplicated timestamp
+        SQLStatement::from(
+            "
+            insert into mtr.utxos_1h (timestamp, height, value)
+            select distinct on (timestamp) timestamp
+                , height
+                , value
+            from (
+                select hs.timestamp / 3600000 * 3600000 as timestamp
+                    , hs.height
+                    , case
+                        when hs.timestamp % 3600000 = 0 then sn.value
+                        else ps.value
+                    end as value
+                    , hs.timestamp % 3600000 = 0
+                        or hs.timestamp / 3600000 - ph.timestamp / 3600000 = 1 as is_rollup
+                from core.headers hs
+                join mtr.utxos sn on sn.height = hs.height
+                left join core.headers ph on ph.height = hs.height - 1
+                left join mtr.utxos ps on ps.height = hs.height - 1
+            ) sq
+            where is_rollup
+            order by timestamp, height;",
+        ),
+        SQLStatement::from(
+            "
+            insert into mtr.utxos_24h (timestamp, height, value)
+            select distinct on (timestamp) timestamp
+                , height
+                , value
+            from (
+                select hs.timestamp / 86400000 * 86400000 as timestamp
+                    , hs.height
+                    , case
+                        when hs.timestamp % 86400000 = 0 then sn.value
+                        else ps.value
+                    end as value
+                    , hs.timestamp % 86400000 = 0
+                        or hs.timestamp / 86400000 - ph.timestamp / 86400000 = 1 as is_rollup
+                from core.headers hs
+                join mtr.utxos sn on sn.height = hs.height
+                left join core.headers ph on ph.height = hs.height - 1
+                left join mtr.utxos ps on ps.height = hs.height - 1
+            ) sq
+            where is_rollup
+            order by timestamp, height;",
+        ),
+        // Add constraints
+        SQLStatement::from("alter table mtr.utxos_1h add primary key(timestamp);"),
+        SQLStatement::from("alter table mtr.utxos_24h add primary key(timestamp);"),
+        // Update revision
+        SQLStatement::from("update ew.revision set version = version + 1;"),
+    ];
+    let mut transaction = client.transaction()?;
+    for stmt in statements {
+        stmt.execute(&mut transaction)?;
+    }
+    transaction.commit()?;
+    Ok(())
+}
+
+/// Migration 4
+///
+/// Adds balance checkpoints.
+fn mig_004(client: &mut Client, checkpoint_interval: i32) -> Result<(), postgres::Error> {
+    info!(
+        "Generating balance checkpoints every {} blocks",
+        checkpoint_interval
+    );
+    // Diffs are grouped by the checkpoint following them. Running sums then
+    // give the balance at each checkpoint an address changed before.
+    // Checkpoints beyond last processed height are left out.
+    let statements = vec![
+        SQLStatement::from("set local work_mem = '32MB';"),
+        SQLStatement::from(
+            "create table bal.erg_checkpoints(address text, height int, value bigint);",
+        ),
+        SQLStatement::from(
+            "create table bal.tokens_checkpoints(address text, token_id text, height int, value bigint);",
+        ),
+        SQLStatement {
+            sql: String::from(
+                "
+                insert into bal.erg_checkpoints (address, height, value)
+                select address
+                    , height
+                    , sum(value) over (partition by address order by height)
+                from (
+                    select address
+                        , (height + $1 - 1) / $1 * $1 as height
+                        , sum(value) as value
+                    from bal.erg_diffs
+                    group by 1, 2
+                ) sq
+                where height <= (select max(height) from bal.erg_diffs);",
+            ),
+            args: vec![SQLArg::Integer(checkpoint_interval)],
+        },
+        SQLStatement {
+            sql: String::from(
+                "
+                insert into bal.tokens_checkpoints (address, token_id, height, value)
+                select address
+                    , token_id
+                    , height
+                    , sum(value) over (partition by address, token_id order by height)
+                from (
+                    select address
+                        , token_id
+                        , (height + $1 - 1) / $1 * $1 as height
+                        , sum(value) as value
+                    from bal.tokens_diffs
+                    group by 1, 2, 3
+                ) sq
+                where height <= (select max(height) from bal.erg_diffs);",
+            ),
+            args: vec![SQLArg::Integer(checkpoint_interval)],
+        },
+        // Add constraints
+        SQLStatement::from("alter table bal.erg_checkpoints add primary key(address, height);"),
+        SQLStatement::from("create index on bal.erg_checkpoints(height);"),
+        SQLStatement::from(
+            "alter table bal.tokens_checkpoints add primary key(address, token_id, height);",
+        ),
+        SQLStatement::from("create index on bal.tokens_checkpoints(height);"),
+        // Update revision
+        SQLStatement::from("update ew.revision set version = version + 1;"),
+    ];
+    let mut transaction = client.transaction()?;
+    for stmt in statements {
+        stmt.execute(&mut transaction)?;
+    }
+    transaction.commit()?;
+    Ok(())
+}
@@ -0,0 +1,84 @@
+//! # notifications
+//!
+//! Let database listeners (i.e. the API) know the sync head changed.
+//!
+//! Notifications are sent from within the block's transaction, so Postgres
+//! only delivers them once the block has been committed.
+use super::SQLArg;
+use super::SQLStatement;
+use crate::parsing::BlockData;
+use serde_json::json;
+
+// Channel listened to by the API
+pub const CHANNEL: &str = "ew_blocks";
+
+pub const NOTIFY: &str = "select pg_notify($1, $2);";
+
+/// Notify inclusion of given block
+pub fn include_statement(block: &BlockData) -> SQLStatement {
+    let payload = json!({
+        "event": "include",
+        "height": block.height,
+        "header_id": block.header_id,
+        "parent_id": block.parent_header_id,
+    });
+    notify_statement(payload.to_string())
+}
+
+/// Notify rollback of given block
+pub fn rollback_statement(block: &BlockData) -> SQLStatement {
+    let payload = json!({
+        "event": "rollback",
+        "height": block.height,
+        "header_id": block.header_id,
+        "parent_id": block.parent_header_id,
+    });
+    notify_statement(payload.to_string())
+}
+
+fn notify_statement(payload: String) -> SQLStatement {
+    SQLStatement {
+        sql: String::from(NOTIFY),
+        args: vec![SQLArg::Text(String::from(CHANNEL)), SQLArg::Text(payload)],
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use crate::db::SQLArg;
+    use crate::parsing::testing::block_600k;
+    use pretty_assertions::assert_eq;
+
+    #[test]
+    fn check_include_statement() -> () {
+        let block = block_600k();
+        let statement = super::include_statement(&block);
+        assert_eq!(statement.sql, super::NOTIFY);
+        assert_eq!(statement.args[0], SQLArg::Text(String::from("ew_blocks")));
+        match &statement.args[1] {
+            SQLArg::Text(payload) => {
+                let payload: serde_json::Value = serde_json::from_str(payload).unwrap();
+                assert_eq!(payload["event"], "include");
+                assert_eq!(payload["height"], 600000);
+                assert_eq!(payload["header_id"], block.header_id);
+                assert_eq!(payload["parent_id"], block.parent_header_id);
+            }
+            _ => panic!("Expected text payload"),
+        }
+    }
+
+    #[test]
+    fn check_rollback_statement() -> () {
+        let block = block_600k();
+        let statement = super::rollback_statement(&block);
+        assert_eq!(statement.sql, super::NOTIFY);
+        match &statement.args[1] {
+            SQLArg::Text(payload) => {
+                let payload: serde_json::Value = serde_json::from_str(payload).unwrap();
+                assert_eq!(payload["event"], "rollback");
+                assert_eq!(payload["height"], 600000);
+            }
+            _ => panic!("Expected text payload"),
+        }
+    }
+}
@@ -41,6 +41,7 @@ pub struct Session {
     pub db_is_empty: bool,
     pub node: node::Node,
     pub poll_interval: u64,
+    pub checkpoint_interval: i32,
     pub allow_bootstrap: bool,
     pub exit_when_synced: bool,
     pub head: crate::types::Head,
@@ -91,6 +92,11 @@ impl Session {
             None => false,
         };
 
+        // Check settings
+        if cfg.balances.checkpoint_interval <= 0 {
+            return Err("Balance checkpoint interval must be a positive number of blocks");
+        }
+
         // Check cli args and db state
         if db_is_empty && db_constraints_status.tier_1 {
             return Err(
@@ -111,7 +117,8 @@ impl Session {
         }
 
         // Check db version and migrations if allowed
-        db.check_migrations(cli.allow_migrations).unwrap();
+        db.check_migrations(cli.allow_migrations, cfg.balances.checkpoint_interval)
+            .unwrap();
 
         // Fill cache from db
         let cache = if db_is_empty {
@@ -125,6 +132,7 @@ impl Session {
             db_is_empty,
             node: node,
             poll_interval: cfg.node.poll_interval,
+            checkpoint_interval: cfg.balances.checkpoint_interval,
             allow_bootstrap: !cli.no_bootstrap,
             exit_when_synced: cli.exit,
             head: db_core_head,
@@ -21,11 +21,28 @@ pub struct Node {
     pub poll_interval: u64,
 }
 
+#[derive(Debug, Deserialize)]
+#[allow(unused)]
+pub struct Balances {
+    // Number of blocks between two balance checkpoints
+    pub checkpoint_interval: i32,
+}
+
+impl Default for Balances {
+    fn default() -> Self {
+        Balances {
+            checkpoint_interval: 1000,
+        }
+    }
+}
+
 #[derive(Debug, Deserialize)]
 #[allow(unused)]
 pub struct Settings {
     pub database: Database,
     pub node: Node,
+    #[serde(default)]
+    pub balances: Balances,
 }
 
 impl Settings {
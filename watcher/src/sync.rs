@@ -99,7 +99,10 @@ fn include_genesis_boxes(session: &mut Session) -> Result<(), &'static str> {
     sql_statements.append(&mut db::core::genesis::prep(boxes));
     // TODO: replace prep_bootstrap(0) with prep_genesis
     sql_statements.append(&mut db::unspent::prep_bootstrap(0));
-    sql_statements.append(&mut db::balances::prep_bootstrap(0));
+    sql_statements.append(&mut db::balances::prep_bootstrap(
+        0,
+        session.checkpoint_interval,
+    ));
     sql_statements.append(&mut db::metrics::prep_genesis());
     session.db.execute_in_transaction(sql_statements).unwrap();
 
@@ -116,8 +119,9 @@ fn include_block(session: &mut Session, block: &BlockData) {
     // Prepare statements
     let mut sql_statements = db::core::prep(block);
     sql_statements.append(&mut db::unspent::prep(block));
-    sql_statements.append(&mut db::balances::prep(block));
+    sql_statements.append(&mut db::balances::prep(block, session.checkpoint_interval));
     sql_statements.append(&mut db::metrics::prep(block, &mut session.cache.metrics));
+    sql_statements.push(db::notifications::include_statement(block));
 
     // Execute statements in single transaction
     session.db.execute_in_transaction(sql_statements).unwrap();
@@ -131,9 +135,13 @@ fn rollback_block(session: &mut Session, block: &BlockData) {
         block,
         &mut session.cache.metrics,
     ));
-    sql_statements.append(&mut db::balances::prep_rollback(block));
+    sql_statements.append(&mut db::balances::prep_rollback(
+        block,
+        session.checkpoint_interval,
+    ));
     sql_statements.append(&mut db::unspent::prep_rollback(block));
     sql_statements.append(&mut db::core::prep_rollback(block));
+    sql_statements.push(db::notifications::rollback_statement(block));
 
     // Execute statements in single transaction
     session.db.execute_in_transaction(sql_statements).unwrap();
@@ -229,7 +237,10 @@ pub mod bootstrap {
             // Collect statements
             let mut sql_statements: Vec<db::SQLStatement> = vec![];
             sql_statements.append(&mut db::unspent::prep_bootstrap(h));
-            sql_statements.append(&mut db::balances::prep_bootstrap(h));
+            sql_statements.append(&mut db::balances::prep_bootstrap(
+                h,
+                session.checkpoint_interval,
+            ));
             // TODO: utxo counts can be sped up using cache
             sql_statements.append(&mut db::metrics::prep_bootstrap(h));
 
@@ -1,20 +1,32 @@
 # """
 # Node API mockup.
 # """
-import shlex
+import argparse
 import subprocess
 import sys
-import os
+import time
 from pathlib import Path
 import json
-from typing import List
+from socketserver import ThreadingMixIn
+from typing import Dict, List
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
 
 import pytest
 import bottle
 import requests
 
+from fixtures.recording import Recording
+from fixtures.workers import worker_index
 
-MOCK_NODE_HOST = "localhost:9053"
+# Each xdist worker runs its own mock node
+MOCK_NODE_PORT = 9053 + worker_index()
+MOCK_NODE_HOST = f"localhost:{MOCK_NODE_PORT}"
+
+# Seconds to wait for the mock node to accept requests
+STARTUP_TIMEOUT = 10
+
+# Allow large /set_blocks payloads
+bottle.BaseRequest.MEMFILE_MAX = 2**31
 
 # Genesis header and tx id.
 # This value is hard coded in Watcher, so has to match.
@@ -26,11 +38,22 @@ class API(bottle.Bottle):
     Configurable mock node API.
 
     Pass collections of blocks to be returned by block request.
+
+    Blocks are indexed on arrival and kept json encoded only, so requests
+    are served in constant time, even for long chains.
+
+    Alternatively, blocks can be replayed from a recording (see `replay`).
     """
 
     def __init__(self) -> None:
         super().__init__()
-        self._blocks = []
+        # Header ids by height, in order of arrival
+        self._ids_at: Dict[int, List[str]] = {}
+        # Encoded blocks by header id
+        self._encoded: Dict[str, bytes] = {}
+        self._last_height: int = None
+        # Recording being replayed, if any
+        self._recording: Recording = None
 
         # Backdoor routes
         self.add_route(bottle.Route(self, "/check", "GET", self._check))
@@ -49,25 +72,33 @@ class API(bottle.Bottle):
 
     @property
     def height(self):
-        return self._blocks[-1]["header"]["height"] if self._blocks else 0
+        if self._recording is not None:
+            return self._recording.height
+        return self._last_height if self._last_height is not None else 0
+
+    def replay(self, path: Path):
+        """
+        Serve blocks from given recording instead of posted ones.
+
+        Posting blocks with /set_blocks ends the replay.
+        """
+        self._recording = Recording(path)
 
     def _check(self):
         return "working"
 
-    def _enable_stepping(self):
-        # Make sure this doesn't get called while stepping half way through blocks.
-        # Index should be set to last block when this is called.
-        assert self.index == len(self._blocks) - 1
-        self.index = 0
-
     def _set_blocks(self):
         """
         Set the mock node's block list.
         Used to configure a mock api before usage.
         """
         blocks = bottle.request.json
-        self._blocks = blocks
-        self._validate_blocks()
+        self._recording = None
+        self._ids_at = {}
+        self._encoded = {}
+        self._last_height = None
+        for block in blocks:
+            self._index_block(block)
 
     def _add_block(self):
         """
@@ -75,8 +106,8 @@ class API(bottle.Bottle):
         Used to configure a mock api during usage.
         """
         block = bottle.request.json
-        self._blocks.append(block)
-        self._validate_blocks()
+        assert self._recording is None, "cannot add blocks to a recording"
+        self._index_block(block)
 
     def get_info(self):
         """
@@ -124,24 +155,23 @@ class API(bottle.Bottle):
         """
         Returns headers of blocks at given height.
         """
-        res = [
-            b["header"]["id"]
-            for b in self._blocks
-            if b["header"]["height"] == int(height)
-        ]
         bottle.response.content_type = "application/json"
-        return json.dumps(res)
+        if self._recording is not None:
+            return json.dumps(self._recording.ids_at(int(height)))
+        return json.dumps(self._ids_at.get(int(height), []))
 
     def get_blocks(self, header):
         """
         Returns block with given header.
         """
         bottle.response.content_type = "application/json"
-        blocks = [b for b in self._blocks if b["header"]["id"] == header]
-        assert len(blocks) <= 1
-        if len(blocks) == 0:
+        if self._recording is not None:
+            encoded = self._recording.block(header)
+        else:
+            encoded = self._encoded.get(header)
+        if encoded is None:
             return bottle.HTTPError(status=404, body="not found")
-        return json.dumps(blocks[0])
+        return encoded
 
     def get_genesis_boxes(self):
         """
@@ -164,20 +194,43 @@ class API(bottle.Bottle):
         ]
         return json.dumps(boxes)
 
-    def _validate_blocks(self):
-        # Ensure heights are continuous (allowing for duplicates)
-        heights = [b["header"]["height"] for b in self._blocks]
-        if heights:
-            assert heights[-1] - heights[0] == len(set(heights)) - 1
-        # Check ordering
-        sorted_heights = [h for h in heights]
-        sorted_heights.sort()
-        assert sorted_heights == heights
+    def _index_block(self, block: Dict):
+        """
+        Validate and index a block following previous ones.
+        """
+        height = block["header"]["height"]
+        header_id = block["header"]["id"]
+        # Ensure heights are continuous and ordered (allowing for duplicates)
+        if self._last_height is not None:
+            assert height in (self._last_height, self._last_height + 1)
+        assert header_id not in self._encoded
+        self._ids_at.setdefault(height, []).append(header_id)
+        self._encoded[header_id] = json.dumps(block).encode()
+        self._last_height = height
+
+
+class ThreadingServer(bottle.ServerAdapter):
+    """
+    Stdlib wsgi server handling each request in its own thread.
+
+    Bottle's default server handles one request at a time.
+    """
+
+    def run(self, handler):
+        class Server(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+
+        class Handler(WSGIRequestHandler):
+            def log_request(*args, **kwargs):
+                pass
+
+        server = make_server(self.host, self.port, handler, Server, Handler)
+        server.serve_forever()
 
 
 class ApiUtil:
     def __init__(self):
-        self.url = "http://localhost:9053"
+        self.url = f"http://{MOCK_NODE_HOST}"
 
     def check(self):
         res = requests.get(f"{self.url}/check")
@@ -208,27 +261,50 @@ _api = API()
 class MockApi:
     """
     Utility class turning API's into context managers.
+
+    *recording*: optional path of a recording to replay
     """
 
-    def __init__(self):
-        self._api: str = "_api"
+    def __init__(self, recording: Path = None):
+        self._recording = recording
         self._p: subprocess.Popen = None
 
     def __enter__(self):
-        os.chdir(Path(__file__).parent.absolute())
-        args = [sys.executable]
-        args.extend(shlex.split(f"-m bottle -b {MOCK_NODE_HOST} api:{self._api}"))
+        args = [sys.executable, "-m", "fixtures.api"]
+        if self._recording is not None:
+            args.extend(["--recording", str(Path(self._recording).absolute())])
         print(f"Subprocess args: {args}")
-        self._p = subprocess.Popen(args)
-        # Give it some time to start up before allowing tests to query the api
-        try:
-            self._p.wait(0.3)
-        except subprocess.TimeoutExpired:
-            pass
-        # If another api is still running, this one won't be able to bind and will fail.
-        # Here we check it has indeed started.
-        # If this fails, an orphaned api is likely still running
-        assert self._p.returncode is None
+        # Run from testbench root, without changing the cwd of the current process
+        self._p = subprocess.Popen(args, cwd=Path(__file__).parent.parent.absolute())
+        # Wait for it to start up before allowing tests to query the api.
+        # Startup time varies with load, e.g. when running with many xdist workers.
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            # If another api is still running, this one won't be able to bind and will fail.
+            # Here we check it has indeed started.
+            # If this fails, an orphaned api is likely still running
+            assert self._p.poll() is None
+            try:
+                requests.get(f"http://{MOCK_NODE_HOST}/check", timeout=1)
+                break
+            except requests.ConnectionError:
+                assert time.monotonic() < deadline, "mock api did not start in time"
+                time.sleep(0.05)
 
     def __exit__(self, exception_type, exception_value, traceback):
         self._p.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mock node")
+    parser.add_argument("--recording", type=Path, help="recording to replay")
+    args = parser.parse_args()
+    if args.recording is not None:
+        _api.replay(args.recording)
+    bottle.run(
+        _api,
+        server=ThreadingServer,
+        host="localhost",
+        port=MOCK_NODE_PORT,
+        quiet=True,
+    )
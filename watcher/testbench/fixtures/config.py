@@ -6,6 +6,8 @@ from fixtures.api import MOCK_NODE_HOST
 from local import DB_HOST, DB_PORT, DB_USER, DB_PASS
 from .db import TEST_DB_NAME
 
+# Short interval to get checkpoints within test blocks
+CHECKPOINT_INTERVAL = 2
 
 CONFIG = textwrap.dedent(
     f"""
@@ -21,6 +23,9 @@ CONFIG = textwrap.dedent(
     [node]
     url = "http://{MOCK_NODE_HOST}"
     poll_interval = 5
+
+    [balances]
+    checkpoint_interval = {CHECKPOINT_INTERVAL}
     """
 )
 
@@ -1,14 +1,20 @@
+import hashlib
 from pathlib import Path
 from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Tuple
 
 import psycopg as pg
 from psycopg.sql import Identifier, SQL
 import pytest
 
 from local import DB_HOST, DB_PORT, DB_USER, DB_PASS
-from .sql import generate_bootstrap_sql
-from .sql import generate_rev1_sql
+from fixtures.workers import worker_name
+from .sql import COLUMNS
+from .sql import generate_bootstrap_rows
+from .sql import generate_rev1_rows
+from .sql import generate_rev1_sql_derived
 
 # Latest schema
 SCHEMA_PATH = (
@@ -29,7 +35,11 @@ CONSTRAINTS_PATH_REV1 = (
 ).absolute()
 
 
-TEST_DB_NAME = "ew_pytest"
+# Each xdist worker uses its own db (and templates)
+TEST_DB_NAME = worker_name("ew_pytest")
+
+# Template dbs known to exist
+_templates = set()
 
 
 @pytest.fixture
@@ -82,11 +92,72 @@ def conn_str(dbname: str) -> str:
     return f"host={DB_HOST} port={DB_PORT} dbname={dbname} user={DB_USER} password={DB_PASS}"
 
 
+def drop_db(dbname: str):
+    with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                SQL("drop database if exists {} with (force);").format(
+                    Identifier(dbname)
+                )
+            )
+
+
+def create_template(prefix: str, sql: str) -> str:
+    """
+    Return name of a template db initialized with given sql.
+
+    Templates are named after a hash of their sql and kept between sessions,
+    so they only get created again when the sql changes. Stale templates
+    with the same prefix are dropped then.
+    """
+    digest = hashlib.sha1(sql.encode()).hexdigest()[:12]
+    dbname = f"{prefix}_{digest}"
+    if dbname in _templates:
+        return dbname
+    with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "select datname from pg_database where datname ~ %s;",
+                [f"^{prefix}_[0-9a-f]{{12}}(_init)?$"],
+            )
+            existing = [row[0] for row in cur.fetchall()]
+    for name in existing:
+        if name != dbname:
+            drop_db(name)
+    if dbname not in existing:
+        # Initialize under another name first, so an interrupted session
+        # does not leave a partially initialized template behind.
+        init_dbname = f"{dbname}_init"
+        with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(SQL("create database {};").format(Identifier(init_dbname)))
+        with pg.connect(conn_str(init_dbname)) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+        with pg.connect(conn_str("postgres"), autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    SQL("alter database {} rename to {};").format(
+                        Identifier(init_dbname), Identifier(dbname)
+                    )
+                )
+    _templates.add(dbname)
+    return dbname
+
+
 class TempDB:
+    """
+    Creates a test db as a copy of a template db, one per schema variant.
+    """
+
     # Most mocks will represent a db with some data in it already,
     # so have constraints set as default.
     def __init__(self, set_constraints=True, rev1=False):
         self._dbname: str = TEST_DB_NAME
+        variant = "rev1" if rev1 else "latest"
+        if not set_constraints:
+            variant += "_unconstrained"
+        self._template_prefix: str = f"{TEST_DB_NAME}_template_{variant}"
         schema_path = SCHEMA_PATH_REV1 if rev1 else SCHEMA_PATH
         constraints_path = CONSTRAINTS_PATH_REV1 if rev1 else CONSTRAINTS_PATH
         with open(schema_path) as f:
@@ -96,32 +167,21 @@ class TempDB:
                 self._sql += f.read()
 
     def _create_db(self):
-        with pg.connect(conn_str("postgres"), autocommit=True) as conn:
-            with conn.cursor() as cur:
-                cur.execute(SQL("create database {};").format(Identifier(self._dbname)))
-
-    def _drop_db(self):
+        template = create_template(self._template_prefix, self._sql)
         with pg.connect(conn_str("postgres"), autocommit=True) as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    SQL("drop database {} with (force);").format(
-                        Identifier(self._dbname)
+                    SQL("create database {} template {};").format(
+                        Identifier(self._dbname), Identifier(template)
                     )
                 )
 
-    def _init_db(self):
-        with pg.connect(conn_str(self._dbname)) as conn:
-            with conn.cursor() as cur:
-                cur.execute(self._sql)
-
     def __enter__(self) -> str:
         self._create_db()
-        self._init_db()
         return self._dbname
 
     def __exit__(self, exception_type, exception_value, traceback):
-        self._drop_db()
-        pass
+        drop_db(self._dbname)
 
 
 def load_sql(conn: pg.Connection, sql: str):
@@ -133,15 +193,34 @@ def load_sql(conn: pg.Connection, sql: str):
     conn.commit()
 
 
+def copy_rows(conn: pg.Connection, rows: Dict[str, Iterable[Tuple]]):
+    """
+    Convenience function to COPY and commit rows, by table.
+
+    Tables are loaded in dict order, so referenced tables should come first.
+    """
+    with conn.cursor() as cur:
+        for table, table_rows in rows.items():
+            qry = SQL("copy {} ({}) from stdin;").format(
+                Identifier(*table.split(".")),
+                SQL(", ").join(map(Identifier, COLUMNS[table])),
+            )
+            with cur.copy(qry) as copy:
+                for row in table_rows:
+                    copy.write_row(row)
+    conn.commit()
+
+
 def bootstrap_db(conn: pg.Connection, blocks: List[Dict]):
     """
     Initialize db data to satisfy any constraints for incoming blocks.
     """
-    load_sql(conn, generate_bootstrap_sql(blocks))
+    copy_rows(conn, generate_bootstrap_rows(blocks))
 
 
 def fill_rev1_db(conn: pg.Connection, blocks: List[Dict]):
     """
     Initialize db data to satisfy any constraints for incoming blocks.
     """
-    load_sql(conn, generate_rev1_sql(blocks))
+    copy_rows(conn, generate_rev1_rows(blocks))
+    load_sql(conn, generate_rev1_sql_derived())
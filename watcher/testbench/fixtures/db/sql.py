@@ -12,7 +12,7 @@ DB should contain headers and txs references by any outputs present at bootstrap
 
 from textwrap import dedent
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import Iterable, List, Dict, Tuple
 from copy import deepcopy
 
 from fixtures.addresses import AddressCatalogue as AC
@@ -137,6 +137,15 @@ def generate_rev1_sql(blocks: List[Dict]) -> str:
     for register in registers:
         sql += format_register_sql(register)
 
+    sql += generate_rev1_sql_derived()
+    return sql
+
+
+def generate_rev1_sql_derived() -> str:
+    """
+    Generate sql statements filling non-core tables of a v0.1 db from its core tables.
+    """
+    sql = ""
     # Unspent
     sql += """
         insert into usp.boxes (box_id)
@@ -343,13 +352,143 @@ def generate_bootstrap_sql_mtr(header: Header, outputs: List[Output]) -> str:
         values ({header.height}, {len(outputs)});\n
     """
     )
+    # Bootstrapped block has no parent, so only round timestamps get a rollup
+    qry_rollups = [
+        dedent(
+            f"""
+            insert into mtr.utxos_{table}(timestamp, height, value)
+            values ({header.timestamp}, {header.height}, {len(outputs)});\n
+        """
+        )
+        for table, ms in [("1h", 3_600_000), ("24h", 86_400_000)]
+        if header.timestamp % ms == 0
+    ]
     return "".join(
         [
             qry_utxos,
+            *qry_rollups,
         ]
     )
 
 
+# Columns of tables filled with COPY, in loading order.
+# Row values are read from the dataclass attributes of the same name.
+COLUMNS = {
+    "core.headers": ("height", "id", "parent_id", "timestamp"),
+    "core.transactions": ("id", "header_id", "height", "index"),
+    "core.outputs": (
+        "box_id",
+        "tx_id",
+        "header_id",
+        "creation_height",
+        "address",
+        "index",
+        "value",
+    ),
+    "core.inputs": ("box_id", "tx_id", "header_id", "index"),
+    "core.data_inputs": ("box_id", "tx_id", "header_id", "index"),
+    "core.tokens": (
+        "id",
+        "box_id",
+        "emission_amount",
+        "name",
+        "description",
+        "decimals",
+        "standard",
+    ),
+    "core.box_assets": ("token_id", "box_id", "amount"),
+    "core.box_registers": (
+        "id",
+        "box_id",
+        "value_type",
+        "serialized_value",
+        "rendered_value",
+    ),
+    "usp.boxes": ("box_id",),
+    "bal.erg_diffs": ("address", "height", "tx_id", "value"),
+    "bal.erg": ("address", "value"),
+    "mtr.utxos": ("height", "value"),
+    "mtr.utxos_1h": ("timestamp", "height", "value"),
+    "mtr.utxos_24h": ("timestamp", "height", "value"),
+}
+
+
+def as_rows(table: str, records: Iterable) -> Iterable[Tuple]:
+    """
+    Lazily convert dataclass instances to row tuples of given table.
+    """
+    columns = COLUMNS[table]
+    return (tuple(getattr(r, c) for c in columns) for r in records)
+
+
+def generate_rev1_rows(blocks: List[Dict]) -> Dict[str, Iterable[Tuple]]:
+    """
+    Rows of core tables of a db as it would be by v0.1, by table.
+
+    COPY counterpart of `generate_rev1_sql`. Non-core tables are to be
+    filled afterwards with `generate_rev1_sql_derived`.
+    """
+    blocks = filter_main_chain_blocks(blocks)
+    heights = [b["header"]["height"] for b in blocks]
+    if len(heights) != len(set(heights)):
+        raise ValueError(
+            "generate_rev1_rows does not handle forks. Ensure 1 block per height only."
+        )
+    if heights[0] == 1:
+        raise ValueError("Test DB should be empty when simulating start from 1st block")
+    return {
+        "core.headers": as_rows("core.headers", extract_headers(blocks)),
+        "core.transactions": as_rows(
+            "core.transactions", extract_transactions(blocks)
+        ),
+        "core.outputs": as_rows("core.outputs", extract_outputs(blocks)),
+        "core.inputs": as_rows("core.inputs", extract_inputs(blocks)),
+        "core.data_inputs": as_rows("core.data_inputs", extract_data_inputs(blocks)),
+        "core.tokens": as_rows("core.tokens", extract_tokens(blocks)),
+        "core.box_assets": as_rows("core.box_assets", extract_assets(blocks)),
+        "core.box_registers": as_rows(
+            "core.box_registers", extract_registers(blocks)
+        ),
+    }
+
+
+def generate_bootstrap_rows(blocks: List[Dict]) -> Dict[str, Iterable[Tuple]]:
+    """
+    Rows to prepare a db to accept listed blocks, by table.
+
+    COPY counterpart of `generate_bootstrap_sql`.
+    """
+    if blocks[0]["header"]["height"] == 1:
+        raise ValueError("Test DB should be empty when simulating start from 1st block")
+    header = extract_existing_header(blocks)
+    tx = extract_existing_transaction(blocks)
+    outputs = extract_existing_outputs(blocks)
+    tokens = extract_existing_tokens(blocks)
+
+    balances: Dict[str, int] = {}
+    for box in outputs:
+        balances[box.address] = balances.get(box.address, 0) + box.value
+
+    # All outputs are still unspent.
+    # Bootstrapped block has no parent, so only round timestamps get a rollup.
+    utxos = (header.timestamp, header.height, len(outputs))
+    return {
+        "core.headers": as_rows("core.headers", [header]),
+        "core.transactions": as_rows("core.transactions", [tx]),
+        "core.outputs": as_rows("core.outputs", outputs),
+        "core.tokens": as_rows("core.tokens", tokens),
+        "usp.boxes": as_rows("usp.boxes", outputs),
+        "bal.erg_diffs": [
+            (address, header.height, tx.id, value)
+            for address, value in balances.items()
+        ],
+        "bal.erg": list(balances.items()),
+        "mtr.utxos": [(header.height, len(outputs))],
+        "mtr.utxos_1h": [utxos] if header.timestamp % 3_600_000 == 0 else [],
+        "mtr.utxos_24h": [utxos] if header.timestamp % 86_400_000 == 0 else [],
+    }
+
+
 def filter_main_chain_blocks(blocks: List[Dict]) -> List[Dict]:
     """
     Filter out blocks not part of main chain
@@ -571,7 +710,7 @@ def extract_assets(blocks: List[Dict]) -> List[BoxAsset]:
     """
     All box assets
     """
-    return extract_existing_tokens(blocks) + [
+    return [
         BoxAsset(
             token_id=tk["tokenId"],
             box_id=op["boxId"],
@@ -0,0 +1,133 @@
+"""
+Compressed block recordings, to replay long chain segments with the mock node.
+
+File layout:
+    magic
+    records:    4-byte length + zlib compressed block json, for each block
+    index:      zlib compressed json list of [height, header_id, offset]
+    footer:     8-byte offset of index
+
+Recordings are memory mapped when replayed, so only the index is held in RAM
+and blocks get decompressed on request.
+
+Record a segment from a node with:
+
+    python -m fixtures.recording <node-url> <first-height> <last-height> <path>
+"""
+import argparse
+import json
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+import requests
+
+MAGIC = b"EWREC1\n"
+RECORD_HEADER = struct.Struct(">I")
+FOOTER = struct.Struct(">Q")
+
+
+def write_recording(path: Path, blocks: Iterable[Dict]) -> int:
+    """
+    Write blocks to a recording, returning the number of blocks written.
+
+    Blocks must be ordered by height, without gaps (forks are allowed).
+    """
+    index = []
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for block in blocks:
+            height = block["header"]["height"]
+            if index:
+                assert height in (index[-1][0], index[-1][0] + 1)
+            data = zlib.compress(json.dumps(block).encode())
+            f.write(RECORD_HEADER.pack(len(data)))
+            f.write(data)
+            index.append([height, block["header"]["id"], offset])
+            offset += RECORD_HEADER.size + len(data)
+        f.write(zlib.compress(json.dumps(index).encode()))
+        f.write(FOOTER.pack(offset))
+    return len(index)
+
+
+class Recording:
+    """
+    Read only, memory mapped recording.
+    """
+
+    def __init__(self, path: Path):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a block recording: {path}")
+        footer_offset = len(self._mmap) - FOOTER.size
+        (index_offset,) = FOOTER.unpack_from(self._mmap, footer_offset)
+        index = json.loads(zlib.decompress(self._mmap[index_offset:footer_offset]))
+        # Header ids by height, in recorded order
+        self._ids_at: Dict[int, List[str]] = {}
+        # Record offsets by header id
+        self._offsets: Dict[str, int] = {}
+        for height, header_id, offset in index:
+            self._ids_at.setdefault(height, []).append(header_id)
+            self._offsets[header_id] = offset
+        self.height: int = index[-1][0] if index else 0
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def ids_at(self, height: int) -> List[str]:
+        """
+        Returns header ids of blocks at given height.
+        """
+        return self._ids_at.get(height, [])
+
+    def block(self, header_id: str) -> bytes:
+        """
+        Returns json encoded block with given header id, None if not recorded.
+        """
+        offset = self._offsets.get(header_id)
+        if offset is None:
+            return None
+        (size,) = RECORD_HEADER.unpack_from(self._mmap, offset)
+        start = offset + RECORD_HEADER.size
+        return zlib.decompress(self._mmap[start : start + size])
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "Recording":
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def fetch_blocks(node_url: str, first_height: int, last_height: int) -> Iterator[Dict]:
+    """
+    Yields blocks of given height range from a node.
+    """
+    session = requests.Session()
+    for height in range(first_height, last_height + 1):
+        r = session.get(f"{node_url}/blocks/at/{height}")
+        r.raise_for_status()
+        for header_id in r.json():
+            r = session.get(f"{node_url}/blocks/{header_id}")
+            r.raise_for_status()
+            yield r.json()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record blocks from a node")
+    parser.add_argument("node_url")
+    parser.add_argument("first_height", type=int)
+    parser.add_argument("last_height", type=int)
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args()
+    blocks = fetch_blocks(args.node_url, args.first_height, args.last_height)
+    n = write_recording(args.path, blocks)
+    print(f"Recorded {n} blocks to {args.path}")
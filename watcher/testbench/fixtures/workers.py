@@ -0,0 +1,28 @@
+"""
+Isolation of pytest-xdist workers.
+
+Each worker gets its own db and mock node port, derived from its id.
+Without xdist, defaults are used.
+"""
+import os
+
+# Id of current xdist worker ("gw0", "gw1", ...), None when not distributed
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER")
+
+
+def worker_index() -> int:
+    """
+    Return index of current worker, 0 when not distributed.
+    """
+    if WORKER_ID is None:
+        return 0
+    return int(WORKER_ID.removeprefix("gw"))
+
+
+def worker_name(name: str) -> str:
+    """
+    Return given name suffixed with current worker id, if any.
+    """
+    if WORKER_ID is None:
+        return name
+    return f"{name}_{WORKER_ID}"
@@ -1,8 +1,10 @@
 import pytest
 import psycopg as pg
+from typing import List
 
 from fixtures.api import MockApi, ApiUtil, GENESIS_ID
 from fixtures.config import temp_cfg
+from fixtures.config import CHECKPOINT_INTERVAL
 from fixtures.db import bootstrap_db
 from fixtures.db import temp_db_class_scoped
 from fixtures.db import unconstrained_db_class_scoped
@@ -550,6 +552,8 @@ def _test_db_state(conn: pg.Connection, start_height: int):
         assert_erg_diffs(cur, start_height)
         assert_tokens_balances(cur)
         assert_tokens_diffs(cur, start_height)
+        assert_erg_checkpoints(cur, start_height)
+        assert_tokens_checkpoints(cur, start_height)
 
 
 def assert_db_constraints(conn: pg.Connection):
@@ -571,6 +575,14 @@ def assert_db_constraints(conn: pg.Connection):
     assert_pk(conn, "bal", "tokens_diffs", ["address", "token_id", "height", "tx_id"])
     assert_index(conn, "bal", "tokens_diffs", "tokens_diffs_height_idx")
 
+    # Erg checkpoints
+    assert_pk(conn, "bal", "erg_checkpoints", ["address", "height"])
+    assert_index(conn, "bal", "erg_checkpoints", "erg_checkpoints_height_idx")
+
+    # Tokens checkpoints
+    assert_pk(conn, "bal", "tokens_checkpoints", ["address", "token_id", "height"])
+    assert_index(conn, "bal", "tokens_checkpoints", "tokens_checkpoints_height_idx")
+
 
 def assert_erg_balances(cur: pg.Cursor):
     base = AC.coinbase
@@ -652,3 +664,49 @@ def assert_tokens_diffs(cur: pg.Cursor, start_height: int):
     assert rows[2] == (h + 3, "tx-c1", pub2.address, "con1-box1", 500)
     assert rows[3] == (h + 3, "tx-c3", pub1.address, "con1-box1", 100)
     assert rows[4] == (h + 3, "tx-c3", pub2.address, "con1-box1", -100)
+
+
+def checkpoint_heights(start_height: int) -> List[int]:
+    """
+    Heights at which watcher should have made checkpoints.
+
+    Bootstrapped start height isn't processed by the watcher, genesis is.
+    """
+    first = start_height if start_height == 0 else start_height + 1
+    return [h for h in range(first, start_height + 4) if h % CHECKPOINT_INTERVAL == 0]
+
+
+def assert_erg_checkpoints(cur: pg.Cursor, start_height: int):
+    cur.execute("select address, height, value from bal.erg_diffs;")
+    diffs = cur.fetchall()
+    expected = []
+    for cp in checkpoint_heights(start_height):
+        # Balance of addresses that changed since previous checkpoint
+        active = {a for a, h, _ in diffs if cp - CHECKPOINT_INTERVAL < h <= cp}
+        for address in active:
+            value = sum([v for a, h, v in diffs if a == address and h <= cp])
+            expected.append((address, cp, value))
+    assert len(expected) > 0
+    cur.execute("select address, height, value from bal.erg_checkpoints;")
+    assert sorted(cur.fetchall()) == sorted(expected)
+
+
+def assert_tokens_checkpoints(cur: pg.Cursor, start_height: int):
+    cur.execute("select address, token_id, height, value from bal.tokens_diffs;")
+    diffs = cur.fetchall()
+    expected = []
+    for cp in checkpoint_heights(start_height):
+        active = {(a, t) for a, t, h, _ in diffs if cp - CHECKPOINT_INTERVAL < h <= cp}
+        for address, token_id in active:
+            value = sum(
+                [
+                    v
+                    for a, t, h, v in diffs
+                    if (a, t) == (address, token_id) and h <= cp
+                ]
+            )
+            expected.append((address, token_id, cp, value))
+    cur.execute(
+        "select address, token_id, height, value from bal.tokens_checkpoints;"
+    )
+    assert sorted(cur.fetchall()) == sorted(expected)
@@ -122,3 +122,23 @@ class TestPopulatedApi:
         next_block["header"]["height"] = 599_999
         with pytest.raises(AssertionError):
             api.add_block(next_block)
+        # Rejected blocks are not included
+        r = requests.get(f"{api.url}/info")
+        assert r.json()["fullHeight"] == 600_000
+        r = requests.get(f"{api.url}/blocks/dummy-header-for-block-599999")
+        assert r.status_code == 404
+
+    def test_add_fork_block(self, api):
+        fork_block = copy.deepcopy(block_600k)
+        fork_block["header"]["id"] = "dummy-header-for-fork-600000"
+        api.add_block(fork_block)
+        r = requests.get(f"{api.url}/blocks/at/600000")
+        assert r.status_code == 200
+        assert r.json() == [block_600k["header"]["id"], "dummy-header-for-fork-600000"]
+        r = requests.get(f"{api.url}/blocks/dummy-header-for-fork-600000")
+        assert r.status_code == 200
+        assert r.json()["header"]["id"] == "dummy-header-for-fork-600000"
+
+    def test_add_duplicate_block(self, api):
+        with pytest.raises(AssertionError):
+            api.add_block(block_600k)
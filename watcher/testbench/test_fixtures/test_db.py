@@ -12,6 +12,8 @@ from fixtures.db.sql import extract_existing_header
 from fixtures.db.sql import extract_existing_transaction
 from fixtures.db.sql import extract_existing_outputs
 from fixtures.db.sql import extract_existing_tokens
+from fixtures.db.sql import generate_bootstrap_rows
+from fixtures.db.sql import COLUMNS
 from fixtures.addresses import AddressCatalogue as AC
 from fixtures.registers import RegisterCatalogue as RC
 
@@ -1035,3 +1037,19 @@ class TestHelpers:
         assert box.address == "dummy-token-minting-address"
         assert box.index == 4
         assert box.value == 1000
+
+    def test_bootstrap_rows(self, blocks):
+        rows = {t: list(r) for t, r in generate_bootstrap_rows(blocks).items()}
+        # Tables follow loading order
+        assert list(rows) == [t for t in COLUMNS if t in rows]
+        for table, table_rows in rows.items():
+            assert all(len(row) == len(COLUMNS[table]) for row in table_rows)
+        assert rows["core.headers"] == [
+            (599_999, "parent-of-block-a", "bootstrap-parent-header-id", 1234560000000)
+        ]
+        assert rows["core.tokens"] == [
+            ("token-1", "dummy-token-box-id-1", 5000, None, None, None, None)
+        ]
+        assert len(rows["usp.boxes"]) == 5
+        assert ("dummy-token-minting-address", 1000) in rows["bal.erg"]
+        assert rows["mtr.utxos"] == [(599_999, 5)]
@@ -0,0 +1,103 @@
+import pytest
+import requests
+import copy
+import json
+
+from fixtures.api import MockApi, ApiUtil
+from fixtures.blocks import block_600k
+from fixtures.recording import Recording, write_recording
+
+
+def make_block(header_id: str, height: int):
+    block = copy.deepcopy(block_600k)
+    block["header"]["id"] = header_id
+    block["header"]["height"] = height
+    return block
+
+
+@pytest.fixture(scope="module")
+def blocks():
+    return [
+        make_block("header-600000", 600_000),
+        make_block("header-600001", 600_001),
+        make_block("fork-600001", 600_001),
+        make_block("header-600002", 600_002),
+    ]
+
+
+@pytest.fixture(scope="module")
+def recording_path(tmp_path_factory, blocks):
+    path = tmp_path_factory.mktemp("recordings") / "blocks.ewrec"
+    assert write_recording(path, blocks) == 4
+    return path
+
+
+@pytest.mark.order(1)
+class TestRecording:
+    def test_index(self, recording_path):
+        with Recording(recording_path) as rec:
+            assert len(rec) == 4
+            assert rec.height == 600_002
+            assert rec.ids_at(600_000) == ["header-600000"]
+            assert rec.ids_at(600_001) == ["header-600001", "fork-600001"]
+            assert rec.ids_at(600_003) == []
+
+    def test_blocks(self, recording_path, blocks):
+        with Recording(recording_path) as rec:
+            for block in blocks:
+                assert json.loads(rec.block(block["header"]["id"])) == block
+            assert rec.block("unknown-header") is None
+
+    def test_empty_recording(self, tmp_path):
+        path = tmp_path / "empty.ewrec"
+        assert write_recording(path, []) == 0
+        with Recording(path) as rec:
+            assert len(rec) == 0
+            assert rec.height == 0
+
+    def test_non_contiguous_blocks(self, tmp_path):
+        blocks = [make_block("a", 1), make_block("c", 3)]
+        with pytest.raises(AssertionError):
+            write_recording(tmp_path / "gap.ewrec", blocks)
+
+    def test_not_a_recording(self, tmp_path):
+        path = tmp_path / "other.ewrec"
+        path.write_bytes(b"something else entirely")
+        with pytest.raises(ValueError):
+            Recording(path)
+
+
+@pytest.mark.order(1)
+class TestReplayApi:
+    @pytest.fixture
+    def api(self, recording_path):
+        with MockApi(recording=recording_path):
+            yield ApiUtil()
+
+    def test_info_height(self, api):
+        r = requests.get(f"{api.url}/info")
+        assert r.status_code == 200
+        assert r.json()["fullHeight"] == 600_002
+
+    def test_blocks_at(self, api):
+        r = requests.get(f"{api.url}/blocks/at/600001")
+        assert r.status_code == 200
+        assert r.json() == ["header-600001", "fork-600001"]
+
+    def test_blocks(self, api):
+        r = requests.get(f"{api.url}/blocks/fork-600001")
+        assert r.status_code == 200
+        block = r.json()
+        assert block["header"]["height"] == 600_001
+        assert block["header"]["id"] == "fork-600001"
+
+    def test_unknown_block(self, api):
+        r = requests.get(f"{api.url}/blocks/unknown-header")
+        assert r.status_code == 404
+
+    def test_set_blocks_ends_replay(self, api):
+        api.set_blocks([block_600k])
+        r = requests.get(f"{api.url}/info")
+        assert r.json()["fullHeight"] == 600_000
+        r = requests.get(f"{api.url}/blocks/at/600001")
+        assert r.json() == []
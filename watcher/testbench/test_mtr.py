@@ -258,7 +258,7 @@ def make_blocks(height: int):
     block_x = {
         "header": {
             "votes": "000000",
-            "timestamp": 1234560200000,
+            "timestamp": 1234562400000,
             "size": 123,
             "height": height + 2,
             "id": "block-x",
@@ -294,7 +294,7 @@ def make_blocks(height: int):
     block_c = {
         "header": {
             "votes": "000000",
-            "timestamp": 1234560300000,
+            "timestamp": 1234562500000,
             "size": 123,
             "height": height + 3,
             "id": "block-c",
@@ -541,11 +541,14 @@ def _test_db_state(conn: pg.Connection, start_height: int):
     assert_db_constraints(conn)
     with conn.cursor() as cur:
         assert_utxos(cur, start_height)
+        assert_utxos_rollups(cur, start_height)
 
 
 def assert_db_constraints(conn: pg.Connection):
     # Utxos
     assert_pk(conn, "mtr", "utxos", ["height"])
+    assert_pk(conn, "mtr", "utxos_1h", ["timestamp"])
+    assert_pk(conn, "mtr", "utxos_24h", ["timestamp"])
 
 
 def assert_utxos(cur: pg.Cursor, start_height: int):
@@ -556,3 +559,14 @@ def assert_utxos(cur: pg.Cursor, start_height: int):
     assert rows[1] == (start_height + 1, 2)  # spend 1 create 2 (+1)
     assert rows[2] == (start_height + 2, 3)  # spend 1 create 2 (+1)
     assert rows[3] == (start_height + 3, 5)  # spend 2 create 4 (+2)
+
+
+def assert_utxos_rollups(cur: pg.Cursor, start_height: int):
+    # Block c is the first of a new hour, value is that of block b.
+    # Block x has a round timestamp but gets rolled back, when included.
+    cur.execute("select timestamp, height, value from mtr.utxos_1h order by 1;")
+    rows = cur.fetchall()
+    assert rows == [(1234562400000, start_height + 3, 3)]
+
+    cur.execute("select timestamp, height, value from mtr.utxos_24h order by 1;")
+    assert cur.fetchall() == []